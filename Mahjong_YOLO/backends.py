@@ -0,0 +1,347 @@
+"""
+推理后端：
+- torch    —— ultralytics + PyTorch，直接加载 .pt（默认，依赖已在 requirements.txt 中）
+- onnx     —— ONNX Runtime，需要额外安装 onnxruntime
+- openvino —— OpenVINO，需要额外安装 openvino
+
+ONNX / OpenVINO 后端第一次使用时由 .pt 导出，产物缓存在权重文件旁边
+（如 trained_models_v2/yolo11m_best.onnx、trained_models_v2/yolo11m_best_openvino_model/），
+权重更新后会自动重新导出。
+
+所有后端都提供与 ultralytics YOLO 相同的最小接口：names 属性和 predict(source, imgsz) 方法，
+返回的结果对象带有 boxes.data（每行 x1, y1, x2, y2, conf, cls）和 plot()，
+因此 perceive() 无需区分具体后端。
+"""
+import importlib.util
+import os
+import time
+
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "openvino")
+# 各后端运行时依赖的模块
+_RUNTIME_MODULES = {"torch": "torch", "onnx": "onnxruntime", "openvino": "openvino"}
+
+
+def backend_available(backend):
+    """当前环境是否安装了该后端的运行时"""
+    module = _RUNTIME_MODULES.get(backend)
+    return module is not None and importlib.util.find_spec(module) is not None
+
+
+def exported_path(weights, backend, int8=False):
+    """导出产物的路径（与权重文件放在同一目录）"""
+    root, _ = os.path.splitext(weights)
+    suffix = "_int8" if int8 else ""
+    if backend == "onnx":
+        return root + suffix + ".onnx"
+    if backend == "openvino":
+        return root + suffix + "_openvino_model"
+    return weights
+
+
+def _is_fresh(target, weights):
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(weights)
+
+
+def export_model(weights, backend, imgsz=640, int8=False, calib_data=None):
+    """
+    把 .pt 权重导出为指定后端的格式；产物已存在且不比权重旧时直接复用
+
+    Args:
+        int8: 是否导出 INT8 量化模型
+            - onnx: 在 FP32 ONNX 的基础上用 onnxruntime 做动态量化，不需要校准数据
+            - openvino: 由 ultralytics 调用 NNCF 做训练后量化，需要 calib_data
+        calib_data: OpenVINO INT8 量化用的数据集 yaml（与训练时的格式相同）
+
+    Returns:
+        str: 导出产物路径
+    """
+    target = exported_path(weights, backend, int8)
+    if backend == "torch":
+        if int8:
+            raise ValueError("torch 后端不支持 INT8，请使用 onnx 或 openvino")
+        return target
+    if _is_fresh(target, weights):
+        return target
+
+    if backend == "onnx" and int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        fp32 = export_model(weights, "onnx", imgsz)
+        quantize_dynamic(fp32, target, weight_type=QuantType.QUInt8)
+        return target
+
+    from ultralytics import YOLO
+
+    if backend == "openvino" and int8 and not calib_data:
+        raise ValueError("OpenVINO INT8 量化需要提供 calib_data 数据集配置")
+
+    # dynamic=True 使导出的模型接受任意（32 的倍数）输入尺寸，roi 模式的细长输入也能直接推理
+    fmt = "onnx" if backend == "onnx" else "openvino"
+    options = {"int8": True, "data": calib_data} if int8 else {}
+    exported = YOLO(weights).export(format=fmt, imgsz=imgsz, dynamic=True, **options)
+    if os.path.abspath(str(exported)) != os.path.abspath(target) and os.path.exists(str(exported)):
+        os.replace(str(exported), target)
+    return target
+
+
+class RawBoxes:
+    """与 ultralytics Boxes 对齐的最小结构"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class RawResult:
+    """与 ultralytics Results 对齐的最小结构：boxes / names / orig_img / plot()"""
+
+    def __init__(self, data, names, orig_img, class_scores=None):
+        self.boxes = RawBoxes(data)
+        self.names = names
+        self.orig_img = orig_img
+        # 每个框在所有类别上的分数（N, 类别数）
+        self.class_scores = class_scores
+
+    def __getitem__(self, idx):
+        """按下标取部分框（同 ultralytics Results）"""
+        scores = None if self.class_scores is None else self.class_scores[idx]
+        return RawResult(self.boxes.data[idx], self.names, self.orig_img, scores)
+
+    def plot(self):
+        canvas = self.orig_img.copy()
+        for x1, y1, x2, y2, conf, cls in self.boxes.data:
+            p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+            cv2.rectangle(canvas, p1, p2, (0, 200, 0), 2)
+            cv2.putText(canvas, f"{self.names[int(cls)]} {conf:.2f}", (p1[0], max(p1[1] - 4, 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 200, 0), 1, cv2.LINE_AA)
+        return canvas
+
+
+class RawYoloBackend:
+    """
+    直接运行导出模型的后端基类：负责预处理、YOLO 原始输出解码和 NMS，
+    子类只需实现 _run(blob) -> 原始输出数组 (1, 4 + 类别数, 候选框数)
+    """
+
+    name = "raw"
+
+    def __init__(self, names, conf=0.25, iou=0.7, max_det=300):
+        self.names = names
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    @staticmethod
+    def _prepare(source, imgsz):
+        """调用方通常已传入 32 对齐的图像；否则在这里等比补边。返回 (图像, 缩放比例, 左/上补边)"""
+        size = max(imgsz) if isinstance(imgsz, (list, tuple)) else imgsz
+        h, w = source.shape[:2]
+        if h % 32 or w % 32 or max(h, w) > size:
+            from Mahjong_YOLO.test import letterbox
+
+            img, ratio, pad = letterbox(source, size)
+            return img, ratio, pad
+        return source, 1.0, (0, 0)
+
+    def _result(self, raw, source, ratio, pad, conf, iou):
+        data, scores = self.decode(raw, conf or self.conf, iou or self.iou)
+        pad_x, pad_y = pad
+        if ratio != 1.0 or pad_x or pad_y:
+            data[:, [0, 2]] = (data[:, [0, 2]] - pad_x) / ratio
+            data[:, [1, 3]] = (data[:, [1, 3]] - pad_y) / ratio
+        return RawResult(data, self.names, source, scores)
+
+    def predict(self, source, imgsz=640, conf=None, iou=None, **kwargs):
+        """
+        source 为单张图像或图像列表；列表中预处理后尺寸相同的图像拼成一个 batch 一次推理
+        （导出时使用了 dynamic=True，batch 维度可变）
+        """
+        sources = list(source) if isinstance(source, (list, tuple)) else [source]
+        prepared = [self._prepare(s, imgsz) for s in sources]
+
+        results = [None] * len(sources)
+        groups = {}
+        for i, (img, _, _) in enumerate(prepared):
+            groups.setdefault(img.shape, []).append(i)
+        for idx in groups.values():
+            blob = cv2.dnn.blobFromImages([prepared[i][0] for i in idx], 1 / 255.0, swapRB=True)
+            raw = np.asarray(self._run(blob))
+            for j, i in enumerate(idx):
+                _, ratio, pad = prepared[i]
+                results[i] = self._result(raw[j:j + 1], sources[i], ratio, pad, conf, iou)
+        return results
+
+    def decode(self, raw, conf_thres, iou_thres):
+        """
+        YOLO 原始输出 -> (N, 6) 检测结果（x1, y1, x2, y2, conf, cls）和对应的类别分数矩阵
+        """
+        preds = np.asarray(raw, dtype=np.float32)[0].T  # (候选框数, 4 + 类别数)
+        scores = preds[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf >= conf_thres
+        preds, scores, cls, conf = preds[keep], scores[keep], cls[keep], conf[keep]
+        if len(preds) == 0:
+            return np.zeros((0, 6), dtype=np.float32), np.zeros((0, scores.shape[1]), dtype=np.float32)
+
+        xyxy = np.empty((len(preds), 4), dtype=np.float32)
+        xyxy[:, :2] = preds[:, :2] - preds[:, 2:4] / 2
+        xyxy[:, 2:] = preds[:, :2] + preds[:, 2:4] / 2
+
+        # 按类别偏移坐标后做一次 NMS，相当于逐类别 NMS
+        offset = cls[:, None].astype(np.float32) * 4096
+        shifted = xyxy + offset
+        rects = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+        idx = cv2.dnn.NMSBoxes(rects.tolist(), conf.tolist(), conf_thres, iou_thres)
+        idx = np.asarray(idx, dtype=np.intp).reshape(-1)[:self.max_det]
+
+        data = np.concatenate([xyxy[idx], conf[idx, None], cls[idx, None].astype(np.float32)], axis=1)
+        return data, scores[idx]
+
+
+class OnnxBackend(RawYoloBackend):
+    name = "onnx"
+
+    def __init__(self, model_path, names, **kwargs):
+        super().__init__(names, **kwargs)
+        import onnxruntime as ort
+
+        self.model_path = model_path
+
+        self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(RawYoloBackend):
+    name = "openvino"
+
+    def __init__(self, model_dir, names, **kwargs):
+        super().__init__(names, **kwargs)
+        import openvino as ov
+
+        self.model_path = model_dir
+
+        core = ov.Core()
+        xml = next(f for f in os.listdir(model_dir) if f.endswith(".xml"))
+        model = core.read_model(os.path.join(model_dir, xml))
+        self.compiled = core.compile_model(model, "CPU")
+
+    def _run(self, blob):
+        return self.compiled(blob)[0]
+
+
+def load_backend(weights, backend, names=None, imgsz=640, int8=False, calib_data=None):
+    """
+    加载指定后端。torch 后端直接返回 ultralytics YOLO 实例
+
+    Args:
+        names: 类别名；ONNX / OpenVINO 需要，为 None 时从 torch 模型读取
+        int8 / calib_data: 见 export_model
+    """
+    if backend == "torch" and not int8:
+        from ultralytics import YOLO
+        return YOLO(weights)
+
+    path = export_model(weights, backend, imgsz, int8, calib_data)
+    if names is None:
+        from Mahjong_YOLO.model_registry import get_model
+        names = get_model(weights).names
+    if backend == "onnx":
+        return OnnxBackend(path, names)
+    if backend == "openvino":
+        return OpenVinoBackend(path, names)
+    raise ValueError(f"未知的推理后端: {backend}")
+
+
+def _box_iou(a, b):
+    """两组框的 IoU 矩阵"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def outputs_equivalent(ref, other, iou_thres=0.9, conf_tol=0.05):
+    """
+    判断两个后端对同一张图的检测结果是否等价：
+    数量一致，且每个参考框都能找到类别相同、IoU >= iou_thres、置信度差 <= conf_tol 的框
+    """
+    from Mahjong_YOLO.test import boxes_to_arrays
+
+    ref_xyxy, ref_conf, ref_cls = boxes_to_arrays(ref.boxes)
+    xyxy, conf, cls = boxes_to_arrays(other.boxes)
+    if len(ref_cls) != len(cls):
+        return False
+    if len(cls) == 0:
+        return True
+    iou = _box_iou(ref_xyxy, xyxy)
+    same = (ref_cls[:, None] == cls[None, :]) & (np.abs(ref_conf[:, None] - conf[None, :]) <= conf_tol)
+    return bool(np.all(np.max(np.where(same, iou, 0), axis=1) >= iou_thres))
+
+
+def benchmark_backend(backend, images, imgsz=640, repeat=5):
+    """对一组图片测量平均单次推理耗时（秒），先空跑一次预热"""
+    backend.predict(source=images[0], imgsz=imgsz, verbose=False)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for img in images:
+            backend.predict(source=img, imgsz=imgsz, verbose=False)
+    return (time.perf_counter() - start) / (repeat * len(images))
+
+
+def select_fastest_backend(weights, candidates=BACKENDS, images=None, imgsz=640, repeat=5):
+    """
+    依次加载可用的后端，先与 torch 结果核对等价性，再测速，返回最快的一个
+
+    Args:
+        images: 用于核对和测速的 BGR 图片列表；为空时使用 Mahjong_YOLO/test.png（存在的话）
+            和一张全黑图
+
+    Returns:
+        (backend_name, backend, timings)：timings 为 {后端名: 平均耗时秒数或失败原因}
+    """
+    from Mahjong_YOLO.model_registry import get_model
+    from Mahjong_YOLO.test import DEFAULT_IMAGE_PATH
+
+    if not images:
+        images = [np.zeros((imgsz, imgsz, 3), dtype=np.uint8)]
+        sample = cv2.imread(DEFAULT_IMAGE_PATH)
+        if sample is not None:
+            images.insert(0, cv2.resize(sample, (imgsz, imgsz)))
+
+    reference = get_model(weights)
+    ref_results = [reference.predict(source=img, imgsz=imgsz, verbose=False)[0] for img in images]
+
+    timings = {}
+    best = ("torch", reference, None)
+    for name in candidates:
+        if not backend_available(name):
+            timings[name] = "不可用: 未安装运行时"
+            continue
+        try:
+            backend = reference if name == "torch" else load_backend(weights, name, reference.names, imgsz)
+            if name != "torch":
+                for img, ref in zip(images, ref_results):
+                    if not outputs_equivalent(ref, backend.predict(source=img, imgsz=imgsz)[0]):
+                        raise ValueError("输出与 torch 后端不一致")
+            cost = benchmark_backend(backend, images, imgsz, repeat)
+        except Exception as e:
+            timings[name] = f"不可用: {e}"
+            continue
+        timings[name] = cost
+        if best[2] is None or cost < best[2]:
+            best = (name, backend, cost)
+    return best[0], best[1], timings
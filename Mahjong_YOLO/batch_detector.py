@@ -0,0 +1,184 @@
+"""
+动态批处理识别服务：多桌监控、回放文件夹等场景下同时有很多帧等待识别，
+把短时间内到达的请求攒成一个 batch 调用一次 predict，每个请求通过 Future 拿回自己的结果。
+
+    detector = BatchDetector(max_batch=8, max_wait_ms=5)
+    future = detector.submit(frame)
+    hand_tiles, hand_string = future.result()
+
+攒批最多等待 max_wait_ms（从该批第一个请求到达开始计），所以单帧增加的延迟有上界
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from Mahjong_YOLO.model_registry import DEFAULT_BACKEND, DEFAULT_WEIGHTS
+from Mahjong_YOLO.model_tiers import DEFAULT_TIER, resolve_model
+from Mahjong_YOLO.test import (MODEL_INPUT_SIZE, boxes_to_arrays, collect_hand, resolve_hand_region,
+                               to_bgr_array)
+
+
+class _Request:
+    __slots__ = ("image", "size", "hand_region", "future", "arrived")
+
+    def __init__(self, image, size, hand_region):
+        self.image = image
+        self.size = size
+        self.hand_region = hand_region
+        self.future = Future()
+        self.arrived = time.perf_counter()
+
+
+class BatchDetector:
+    """
+    后台线程从请求队列中取帧：拿到第一帧后最多再等 max_wait_ms 或凑满 max_batch 帧，
+    然后整批推理（与 perceive() 的整帧模式相同：缩放到 imgsz x imgsz），逐帧取出手牌
+
+    计数：
+        frames   —— 完成识别的帧数
+        batches  —— predict 调用次数（frames / batches 即平均 batch 大小）
+        wait_ms  —— 请求在队列中等待的累计时间
+    """
+
+    def __init__(self, model=None, max_batch=8, max_wait_ms=5.0, imgsz=MODEL_INPUT_SIZE, min_conf=0.0,
+                 weights=DEFAULT_WEIGHTS, backend=DEFAULT_BACKEND, tier=DEFAULT_TIER):
+        """
+        :param model: 已加载好的模型，为 None 时与 perceive() 一样按 weights/backend/tier 获取
+        :param max_batch: 每批最多的帧数
+        :param max_wait_ms: 攒批的最长等待时间（毫秒）
+        :param imgsz: 推理输入尺寸
+        :param min_conf: 手牌框的最低置信度
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch 至少为 1")
+        self.model = model if model is not None else resolve_model(weights, backend, tier)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.imgsz = imgsz
+        self.min_conf = min_conf
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        # submit 入队与 close 设置关闭标志互斥，关闭之后不会再有请求进入队列
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.frames = 0
+        self.batches = 0
+        self.errors = 0
+        self.wait_ms = 0.0
+        self.infer_ms = 0.0
+        self._thread = threading.Thread(target=self._serve, name="batch-detector", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, layout=None):
+        """
+        提交一帧（任意 perceive 支持的图像类型）
+
+        Returns:
+            concurrent.futures.Future，结果为 (hand_tiles, hand_string)
+        """
+        img = to_bgr_array(image)
+        h, w = img.shape[:2]
+        # 缩放放在调用方线程里做，服务线程只负责推理
+        resized = cv2.resize(img, (self.imgsz, self.imgsz))
+        request = _Request(resized, (w, h), resolve_hand_region(w, h, layout))
+        with self._submit_lock:
+            if self._stop.is_set():
+                raise RuntimeError("BatchDetector 已关闭")
+            self._queue.put(request)
+        return request.future
+
+    def detect_many(self, images, layout=None):
+        """一次提交多帧并等待全部结果"""
+        futures = [self.submit(img, layout) for img in images]
+        return [f.result() for f in futures]
+
+    def _collect(self):
+        """阻塞等到第一帧，然后在 max_wait 内尽量凑满一批"""
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = first.arrived + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _serve(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect()
+            if not batch:
+                continue
+            batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = self.model.predict(source=[r.image for r in batch], imgsz=self.imgsz)
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            done = time.perf_counter()
+
+            for r, result in zip(batch, results):
+                try:
+                    w, h = r.size
+                    xyxy, conf, cls = boxes_to_arrays(result.boxes)
+                    xyxy = xyxy * (np.array([w, h, w, h], dtype=np.float32) / self.imgsz)
+                    r.future.set_result(collect_hand(self.model, (xyxy, conf, cls), w, h,
+                                                     r.hand_region, self.min_conf))
+                except Exception as e:
+                    r.future.set_exception(e)
+
+            with self._stats_lock:
+                self.frames += len(batch)
+                self.batches += 1
+                self.wait_ms += sum(start - r.arrived for r in batch) * 1000
+                self.infer_ms += (done - start) * 1000
+
+    def close(self, timeout=2.0):
+        """
+        停止接收新请求，处理完队列中剩余的帧后退出；
+        timeout 内没处理完时，仍在队列中的请求以 RuntimeError 结束，不会有永远等不到结果的 Future
+        """
+        with self._submit_lock:
+            self._stop.set()
+        self._thread.join(timeout)
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(RuntimeError("BatchDetector 已关闭，请求未被处理"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "frames": self.frames,
+                "batches": self.batches,
+                "errors": self.errors,
+                "avg_batch": self.frames / self.batches if self.batches else 0.0,
+                "avg_wait_ms": self.wait_ms / self.frames if self.frames else 0.0,
+                "avg_infer_ms_per_frame": self.infer_ms / self.frames if self.frames else 0.0,
+                "pending": self._queue.qsize(),
+            }
@@ -0,0 +1,84 @@
+import threading
+
+import cv2
+import numpy as np
+
+from Mahjong_YOLO.test import MODEL_INPUT_SIZE, resolve_hand_region, scale_region, to_bgr_array
+
+
+class HandChangeGate:
+    """
+    手牌区域变化检测门：
+    把手牌区域缩成一张很小的灰度缩略图作为指纹，与上一次真正做过识别的帧比较，
+    只有足够多的像素发生明显变化时才放行完整的 YOLO 推理
+
+    计数：
+        hits  —— 判定为变化、放行推理的次数
+        skips —— 判定为未变化、跳过推理的次数
+    """
+
+    def __init__(self, region=None, ref_size=MODEL_INPUT_SIZE, thumb_size=(108, 16),
+                 pixel_threshold=24, min_changed_pixels=8):
+        """
+        :param region: 手牌区域 (x1, y1, x2, y2)，ref_size x ref_size 坐标系；
+                       为 None 时使用布局标定结果（没有标定过时为 HAND_REGION）
+        :param ref_size: region 所在坐标系的边长（perceive 中缩放后的 640）
+        :param thumb_size: 指纹缩略图尺寸 (宽, 高)
+        :param pixel_threshold: 单个缩略图像素灰度差超过该值才算“变化”
+        :param min_changed_pixels: 变化像素数达到该值才认为手牌区域发生了变化
+        """
+        self.region = region
+        self.ref_size = ref_size
+        self.thumb_size = thumb_size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_pixels = min_changed_pixels
+        self.hits = 0
+        self.skips = 0
+        self._reference = None
+        self._lock = threading.Lock()
+
+    def fingerprint(self, image):
+        """计算图像手牌区域的灰度缩略图指纹"""
+        img = to_bgr_array(image)
+        h, w = img.shape[:2]
+        region = self.region if self.region is not None else resolve_hand_region(w, h)
+        x1, y1, x2, y2 = scale_region(region, w, h, self.ref_size)
+        roi = img[y1:y2, x1:x2]
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        # INTER_AREA 相当于区域平均，顺带抑制了噪点和细小的动画
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA)
+
+    def changed_pixels(self, thumb_a, thumb_b):
+        """两个指纹之间明显变化的像素数"""
+        diff = cv2.absdiff(thumb_a, thumb_b)
+        return int(np.count_nonzero(diff > self.pixel_threshold))
+
+    def check(self, image):
+        """
+        判断手牌区域相对上一次放行的帧是否发生了变化
+
+        Returns:
+            bool: True 表示需要重新识别（此时该帧成为新的参照帧），False 表示可以复用上次结果
+        """
+        thumb = self.fingerprint(image)
+        with self._lock:
+            if self._reference is not None and self._reference.shape == thumb.shape \
+                    and self.changed_pixels(self._reference, thumb) < self.min_changed_pixels:
+                self.skips += 1
+                return False
+            self._reference = thumb
+            self.hits += 1
+            return True
+
+    def reset(self):
+        """清除参照帧，下一帧必定放行"""
+        with self._lock:
+            self._reference = None
+
+    def stats(self):
+        total = self.hits + self.skips
+        return {
+            "hits": self.hits,
+            "skips": self.skips,
+            "skip_rate": self.skips / total if total else 0.0,
+        }
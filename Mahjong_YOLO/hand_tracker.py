@@ -0,0 +1,203 @@
+"""
+手牌时序平滑：单帧识别结果会闪烁（某张牌偶尔被认错、漏检），每次闪烁都会产生新的 hand_str，
+触发一次重新分析和大模型调用。
+
+HandTracker 按手牌条带中的 x 位置把连续帧的检测框对应到同一个“槽位”，
+每个槽位按置信度对类别投票（指数衰减），只有投票结果连续若干帧保持不变时才输出新的手牌状态。
+
+    tracker = HandTracker()
+    hand_tiles, _ = perceive(frame, plot=False)
+    state = tracker.update(hand_tiles)
+    if state is not None:   # 手牌稳定地变成了新的状态
+        analyze(state.hand_string)
+"""
+import numpy as np
+
+from Mahjong_YOLO.tile_lookup import counts_to_hand_string, tile_name_to_34
+
+
+class _Slot:
+    __slots__ = ("center", "width", "votes", "hits", "missing")
+
+    def __init__(self, center, width):
+        self.center = center
+        self.width = width
+        self.votes = {}
+        self.hits = 0
+        self.missing = 0
+
+    def best(self):
+        """(得票最多的类别名, 得票占比)"""
+        name = max(self.votes, key=self.votes.get)
+        total = sum(self.votes.values())
+        return name, self.votes[name] / total if total else 0.0
+
+
+class HandState:
+    """一次稳定输出的手牌：tiles 为从左到右的类别名，confidences 为各槽位的得票占比"""
+
+    def __init__(self, tiles, confidences, frame):
+        self.tiles = tiles
+        self.confidences = confidences
+        self.frame = frame
+
+    @property
+    def hand_string(self):
+        counts = np.zeros(34, dtype=np.int64)
+        for name in self.tiles:
+            idx, _ = tile_name_to_34(name)
+            if idx >= 0:
+                counts[idx] += 1
+        return counts_to_hand_string(counts)
+
+    def __repr__(self):
+        return f"HandState({self.hand_string}, frame={self.frame})"
+
+
+class HandTracker:
+    """
+    逐槽位投票的手牌跟踪器
+
+    计数：
+        frames     —— 输入的帧数
+        emitted    —— 输出新状态的次数
+        raw_changes —— 单帧识别结果（未平滑）与上一帧不同的次数；与 emitted 之差即被抑制的重算次数
+    """
+
+    def __init__(self, decay=0.6, stable_frames=3, min_share=0.6, min_hits=2, max_missing=2,
+                 match_tolerance=0.5):
+        """
+        :param decay: 每帧对历史票数乘的衰减系数，越小越跟手、越大越平滑
+        :param stable_frames: 候选状态需要连续保持的帧数
+        :param min_share: 每个槽位得票最多的类别占比不低于该值，才认为该槽位已确定
+        :param min_hits: 槽位至少被检测到的次数（过滤只出现一两帧的误检）
+        :param max_missing: 槽位连续多少帧没有检测框后被移除（摸切、副露后手牌变短）
+        :param match_tolerance: 检测框中心与槽位中心的距离不超过 牌宽 * 该值 时视为同一槽位
+        """
+        self.decay = decay
+        self.stable_frames = stable_frames
+        self.min_share = min_share
+        self.min_hits = min_hits
+        self.max_missing = max_missing
+        self.match_tolerance = match_tolerance
+        self.state = None
+        self._slots = []
+        self._candidate = None
+        self._candidate_frames = 0
+        self._last_raw = None
+        self.frames = 0
+        self.emitted = 0
+        self.raw_changes = 0
+
+    def _match(self, centers, widths):
+        """
+        贪心地按距离把检测框分配给槽位
+
+        Returns:
+            list: 每个检测框对应的槽位下标，没有对应槽位时为 -1
+        """
+        assigned = [-1] * len(centers)
+        if not self._slots or not len(centers):
+            return assigned
+        slot_centers = np.array([s.center for s in self._slots])
+        dist = np.abs(centers[:, None] - slot_centers[None, :])
+        limit = widths[:, None] * self.match_tolerance
+        pairs = np.argwhere(dist <= limit)
+        used_slots = set()
+        for i, j in sorted(pairs.tolist(), key=lambda p: dist[p[0], p[1]]):
+            if assigned[i] < 0 and j not in used_slots:
+                assigned[i] = j
+                used_slots.add(j)
+        return assigned
+
+    def _observe(self, hand_tiles):
+        boxes = np.array([t[3] for t in hand_tiles], dtype=np.float32).reshape(-1, 4)
+        centers = (boxes[:, 0] + boxes[:, 2]) / 2
+        widths = boxes[:, 2] - boxes[:, 0]
+
+        for slot in self._slots:
+            for name in slot.votes:
+                slot.votes[name] *= self.decay
+
+        assigned = self._match(centers, widths)
+        seen = set()
+        for (_, name, conf, _), center, width, j in zip(hand_tiles, centers, widths, assigned):
+            if j < 0:
+                self._slots.append(_Slot(float(center), float(width)))
+                j = len(self._slots) - 1
+            slot = self._slots[j]
+            # 槽位中心跟随检测框缓慢移动
+            slot.center = 0.7 * slot.center + 0.3 * float(center)
+            slot.width = 0.7 * slot.width + 0.3 * float(width)
+            slot.votes[name] = slot.votes.get(name, 0.0) + float(conf)
+            slot.hits += 1
+            slot.missing = 0
+            seen.add(j)
+
+        for j, slot in enumerate(self._slots):
+            if j not in seen:
+                slot.missing += 1
+        self._slots = sorted((s for s in self._slots if s.missing <= self.max_missing),
+                             key=lambda s: s.center)
+
+    def _current(self):
+        """当前投票结果；有槽位还没确定时返回 None"""
+        tiles, shares = [], []
+        for slot in self._slots:
+            # 短暂漏检（不超过 max_missing 帧）的槽位仍保留原来的牌
+            if slot.hits < self.min_hits:
+                continue
+            name, share = slot.best()
+            if share < self.min_share:
+                return None
+            tiles.append(name)
+            shares.append(round(share, 3))
+        return tiles, shares
+
+    def update(self, hand_tiles):
+        """
+        输入一帧 perceive() 的 hand_tiles
+
+        Returns:
+            HandState: 手牌稳定地变为新状态时返回，否则返回 None（当前状态见 self.state）
+        """
+        self.frames += 1
+        raw = tuple(t[1] for t in hand_tiles)
+        if raw != self._last_raw:
+            self.raw_changes += 1
+            self._last_raw = raw
+
+        self._observe(hand_tiles)
+        current = self._current()
+        if current is None:
+            self._candidate, self._candidate_frames = None, 0
+            return None
+
+        tiles, shares = current
+        if tiles == self._candidate:
+            self._candidate_frames += 1
+        else:
+            self._candidate, self._candidate_frames = tiles, 1
+
+        if self._candidate_frames < self.stable_frames:
+            return None
+        if self.state is not None and self.state.tiles == tiles:
+            return None
+        self.state = HandState(tiles, shares, self.frames)
+        self.emitted += 1
+        return self.state
+
+    def reset(self):
+        self._slots = []
+        self._candidate, self._candidate_frames = None, 0
+        self._last_raw = None
+        self.state = None
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "emitted": self.emitted,
+            "raw_changes": self.raw_changes,
+            "suppressed": max(self.raw_changes - self.emitted, 0),
+            "slots": len(self._slots),
+        }
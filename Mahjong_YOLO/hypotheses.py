@@ -0,0 +1,248 @@
+"""
+多假设识别：perceive() 对每个框只保留分数最高的类别，认错一张牌会悄悄改变整个分析结果。
+
+perceive_topk() 为手牌的每个槽位保留前 k 个候选类别及其置信度，
+标记出不确定的槽位，并按联合概率从高到低枚举若干候选手牌，交给分析器一次性评估。
+
+候选类别的来源：
+    - ONNX / OpenVINO 后端：RawResult.class_scores 中每个框在所有类别上的分数
+    - torch 后端：YOLO 按类别做 NMS，同一位置上不同类别的重叠框会同时保留，把它们归为同一槽位的候选；
+      这些框的置信度大多低于默认阈值 PREDICT_CONF，所以预测时把阈值降到 CANDIDATE_CONF，
+      但只有包含置信度不低于 PREDICT_CONF 的框的位置才算一个槽位，低分框只作为候选
+"""
+import heapq
+import math
+
+import numpy as np
+
+from Mahjong_YOLO.model_registry import DEFAULT_BACKEND, DEFAULT_WEIGHTS
+from Mahjong_YOLO.model_tiers import DEFAULT_TIER, resolve_model
+from Mahjong_YOLO.plot_writer import DEFAULT_PLOT_PATH, plot_writer
+from Mahjong_YOLO.test import (MODEL_INPUT_SIZE, PREDICT_CONF, _detect_full_frame, resolve_hand_region,
+                               scale_region, select_in_region, to_bgr_array)
+from Mahjong_YOLO.tile_lookup import counts_to_hand_string, get_class_lookup, tile_name_to_34
+
+# 候选类别的最低分数，也是多假设识别预测时的置信度阈值
+CANDIDATE_CONF = 0.05
+
+
+class SlotCandidates:
+    """
+    一个手牌槽位的候选：candidates 为 [(类别名, 34 编码, 置信度), ...]，按置信度从高到低
+    """
+
+    def __init__(self, box, candidates):
+        self.box = box
+        self.candidates = candidates
+
+    @property
+    def best(self):
+        return self.candidates[0]
+
+    def shares(self):
+        """候选之间归一化后的概率"""
+        confs = np.array([c[2] for c in self.candidates], dtype=np.float64)
+        total = confs.sum()
+        return confs / total if total > 0 else np.full(len(confs), 1.0 / len(confs))
+
+    def is_uncertain(self, ratio=0.5, low_conf=0.5):
+        """第二候选的置信度达到第一候选的 ratio 倍，或第一候选本身低于 low_conf 时视为不确定"""
+        top = self.candidates[0][2]
+        if top < low_conf:
+            return True
+        return len(self.candidates) > 1 and self.candidates[1][2] >= top * ratio
+
+
+class HandHypotheses:
+    """一帧手牌的多假设识别结果，slots 为从左到右的 SlotCandidates"""
+
+    def __init__(self, slots, uncertain_ratio=0.5, low_conf=0.5):
+        self.slots = slots
+        self.uncertain_ratio = uncertain_ratio
+        self.low_conf = low_conf
+
+    @staticmethod
+    def _hand_string(tiles_34):
+        return counts_to_hand_string(np.bincount(np.asarray(tiles_34, dtype=np.intp), minlength=34))
+
+    @property
+    def best_hand_string(self):
+        return self._hand_string([s.best[1] for s in self.slots])
+
+    @property
+    def uncertain(self):
+        """不确定槽位的下标"""
+        return [i for i, s in enumerate(self.slots) if s.is_uncertain(self.uncertain_ratio, self.low_conf)]
+
+    def candidate_hands(self, max_hands=8):
+        """
+        按联合概率从高到低枚举候选手牌（只在不确定的槽位上替换候选，其余槽位固定取第一候选）
+
+        Returns:
+            list[(hand_string, 概率)]，概率为各不确定槽位归一化概率之积；相同手牌只保留概率最高的一次
+        """
+        base = [s.best[1] for s in self.slots]
+        uncertain = [i for i in self.uncertain if len(self.slots[i].candidates) > 1]
+        shares = [self.slots[i].shares() for i in uncertain]
+        logp = [np.log(np.maximum(p, 1e-12)) for p in shares]
+
+        def score(choice):
+            return sum(logp[j][c] for j, c in enumerate(choice))
+
+        start = tuple(0 for _ in uncertain)
+        heap = [(-score(start), start)]
+        visited = {start}
+        hands, seen_hands = [], set()
+        while heap and len(hands) < max_hands:
+            neg, choice = heapq.heappop(heap)
+            tiles = list(base)
+            for j, c in enumerate(choice):
+                tiles[uncertain[j]] = self.slots[uncertain[j]].candidates[c][1]
+            hand = self._hand_string(tiles)
+            if hand not in seen_hands:
+                seen_hands.add(hand)
+                hands.append((hand, math.exp(-neg)))
+            # 每次把某一个槽位换成下一个候选
+            for j in range(len(choice)):
+                if choice[j] + 1 < len(shares[j]):
+                    nxt = choice[:j] + (choice[j] + 1,) + choice[j + 1:]
+                    if nxt not in visited:
+                        visited.add(nxt)
+                        heapq.heappush(heap, (-score(nxt), nxt))
+        return hands
+
+    def describe_uncertain(self):
+        """不确定槽位的文字说明，如 ['第3张: 5p 0.52 / 6p 0.41']"""
+        lines = []
+        for i in self.uncertain:
+            options = " / ".join(f"{name} {conf:.2f}" for name, _, conf in self.slots[i].candidates)
+            lines.append(f"第{i + 1}张: {options}")
+        return lines
+
+
+def group_slots(xyxy, iou_thres=0.6):
+    """
+    把已按 x 排序的手牌框分组：与组内第一个框 IoU 超过 iou_thres 的框视为同一槽位
+
+    Returns:
+        list[list[int]]: 每组框的下标
+    """
+    groups = []
+    for i in range(len(xyxy)):
+        box = xyxy[i]
+        if groups:
+            ref = xyxy[groups[-1][0]]
+            ix = max(0.0, min(box[2], ref[2]) - max(box[0], ref[0]))
+            iy = max(0.0, min(box[3], ref[3]) - max(box[1], ref[1]))
+            inter = ix * iy
+            union = (box[2] - box[0]) * (box[3] - box[1]) + (ref[2] - ref[0]) * (ref[3] - ref[1]) - inter
+            if union > 0 and inter / union >= iou_thres:
+                groups[-1].append(i)
+                continue
+        groups.append([i])
+    return groups
+
+
+def build_slots(xyxy, conf, cls, class_scores, model, k=3, iou_thres=0.6, min_score=CANDIDATE_CONF,
+                slot_conf=PREDICT_CONF):
+    """
+    由手牌区域内（已按 x 排序）的检测结果构造各槽位的前 k 个候选（分数低于 min_score 的类别不作为候选）；
+    组内最高置信度低于 slot_conf 的位置不算槽位
+    """
+    lookup = get_class_lookup(model)
+    names = model.names
+    slots = []
+    for group in group_slots(xyxy, iou_thres):
+        if conf[group].max() < slot_conf:
+            continue
+        scores = {}
+        if class_scores is not None:
+            row = class_scores[group].max(axis=0)
+            for c in np.argsort(row)[::-1][:k]:
+                if row[c] >= min_score:
+                    scores[int(c)] = float(row[c])
+        for i in group:
+            c = int(cls[i])
+            scores[c] = max(scores.get(c, 0.0), float(conf[i]))
+
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        candidates = [(names[c], int(lookup.tile34[c]), s) for c, s in ranked if lookup.tile34[c] >= 0][:k]
+        if candidates:
+            slots.append(SlotCandidates(tuple(xyxy[group[0]].tolist()), candidates))
+    return slots
+
+
+def slots_to_rows(slots):
+    """
+    把槽位展开成识别缓存使用的 hand_tiles 格式：每个候选一行 (槽位序号, 类别名, 置信度, 框)，
+    这样多假设的结果也能存进 PerceptionCache（包括磁盘缓存）
+    """
+    return [(i, name, conf, slot.box) for i, slot in enumerate(slots) for name, _, conf in slot.candidates]
+
+
+def slots_from_rows(rows):
+    """slots_to_rows 的逆过程"""
+    slots = []
+    for i, name, conf, box in rows:
+        if i == len(slots):
+            slots.append(SlotCandidates(tuple(box), []))
+        slots[i].candidates.append((name, tile_name_to_34(name)[0], conf))
+    return slots
+
+
+def hand_slots(model, xyxy, conf, cls, r, hand_region, width, height, k=3, min_conf=0.0, iou_thres=0.6):
+    """
+    从一帧全图检测结果（以 CANDIDATE_CONF 为阈值预测，坐标为原图坐标）中取出手牌区域的槽位候选，
+    perceive_topk 与 perceive_table(topk=...) 共用
+    """
+    region = np.array(hand_region, dtype=np.float32) * np.array([width, height, width, height]) / MODEL_INPUT_SIZE
+    order = select_in_region(xyxy, conf, region, min_conf)
+
+    class_scores = getattr(r, "class_scores", None)
+    if class_scores is not None and len(class_scores) == len(conf):
+        class_scores = class_scores[order]
+    else:
+        class_scores = None
+    return build_slots(xyxy[order], conf[order], cls[order], class_scores, model, k, iou_thres)
+
+
+def confident_result(r, conf):
+    """结果图只画达到默认阈值的框，与 perceive() 的结果图一致"""
+    return r[np.flatnonzero(conf >= PREDICT_CONF).tolist()]
+
+
+def perceive_topk(image=None, model=None, k=3, min_conf=0.0, weights=DEFAULT_WEIGHTS, backend=DEFAULT_BACKEND,
+                  tier=DEFAULT_TIER, imgsz=MODEL_INPUT_SIZE, layout=None, iou_thres=0.6,
+                  uncertain_ratio=0.5, low_conf=0.5, plot=True, plot_path=DEFAULT_PLOT_PATH, cache=None):
+    """
+    识别手牌并为每个槽位保留前 k 个候选类别（参数含义同 perceive，plot / cache 的行为也与 perceive 相同）
+
+    Returns:
+        HandHypotheses
+    """
+    if model is None:
+        model = resolve_model(weights, backend, tier)
+    img = to_bgr_array(image)
+    h, w = img.shape[:2]
+    hand_region = resolve_hand_region(w, h, layout)
+
+    # 同一画面直接返回缓存的结果；键中带上 topk 等参数，不会与 perceive() 的缓存条目混用
+    cache_key = None
+    if cache is not None:
+        x1, y1, x2, y2 = scale_region(hand_region, w, h)
+        cache_key, persistent = cache.key(model, img[y1:y2, x1:x2], frame=(w, h), region=(x1, y1, x2, y2),
+                                          min_conf=min_conf, imgsz=imgsz, topk=k, iou_thres=iou_thres,
+                                          candidate_conf=CANDIDATE_CONF)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return HandHypotheses(slots_from_rows(cached[0]), uncertain_ratio, low_conf)
+
+    (xyxy, conf, cls), r = _detect_full_frame(model, img, imgsz, conf=CANDIDATE_CONF)
+    slots = hand_slots(model, xyxy, conf, cls, r, hand_region, w, h, k, min_conf, iou_thres)
+    hypotheses = HandHypotheses(slots, uncertain_ratio, low_conf)
+
+    if plot and r is not None:
+        plot_writer.submit(confident_result(r, conf), plot_path)
+    if cache_key is not None:
+        cache.put(cache_key, (slots_to_rows(slots), hypotheses.best_hand_string), persistent)
+    return hypotheses
@@ -0,0 +1,199 @@
+"""
+单帧耗时预算：机器繁忙（游戏客户端、浏览器、GUI 同时运行）时固定使用同一个模型会超出帧预算，
+这里根据最近的推理耗时在模型级别 / 输入尺寸之间自动降级，空闲时再升回来：
+
+    perceiver = AdaptivePerceiver(budget_ms=80)
+    hand_tiles, hand_string = perceiver.perceive(frame, plot=False)
+    print(perceiver.metrics())
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from Mahjong_YOLO.model_registry import DEFAULT_WEIGHTS, get_backend
+from Mahjong_YOLO.model_tiers import MODEL_TIERS, available_tiers, load_tier
+
+# 默认单帧耗时预算（毫秒）
+LATENCY_BUDGET_MS = float(os.environ.get("MAHJONG_LATENCY_BUDGET_MS", "80"))
+# 降级时依次尝试的输入尺寸（需为 32 的倍数）
+INPUT_SIZES = (640, 480)
+
+
+def default_levels(tiers=None, sizes=INPUT_SIZES):
+    """
+    生成从“最贵”到“最便宜”排列的档位：每个模型级别依次尝试几种输入尺寸；
+    只使用 available_tiers 给出的级别（权重存在且后端运行时已安装），降级时不会切到加载不了的模型
+
+    Returns:
+        list[dict]: 每个档位为 {"name", "tier", "imgsz"}，tier 为 None 时使用默认权重
+    """
+    tiers = available_tiers(tiers or MODEL_TIERS)
+    levels = []
+    for tier in reversed(tiers):
+        for size in sizes:
+            levels.append({"name": f"{tier['name']}@{size}", "tier": tier, "imgsz": size})
+    if not levels:
+        levels = [{"name": f"default@{size}", "tier": None, "imgsz": size} for size in sizes]
+    return levels
+
+
+class LatencyBudgetController:
+    """
+    单帧耗时预算控制器：
+    记录最近若干帧的推理耗时，平均值连续超出预算时降一档（更小的模型或输入尺寸），
+    连续有足够余量时升回一档；每次切换后清空窗口，避免用旧档位的数据做判断
+    """
+
+    def __init__(self, levels, budget_ms=LATENCY_BUDGET_MS, window=8, headroom=0.6, patience=3, history=50):
+        """
+        :param levels: 档位列表，从最贵到最便宜排列
+        :param budget_ms: 单帧耗时预算（毫秒）
+        :param window: 计算平均耗时的窗口大小（帧）
+        :param headroom: 平均耗时低于 budget_ms * headroom 时才考虑升档
+        :param patience: 连续多少次判断超预算 / 有余量才真正切换
+        :param history: 保留的切换记录条数
+        """
+        if not levels:
+            raise ValueError("levels 不能为空")
+        self.levels = levels
+        self.budget_ms = budget_ms
+        self.headroom = headroom
+        self.patience = patience
+        self.index = 0
+        self._samples = deque(maxlen=window)
+        self._over = 0
+        self._under = 0
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.over_budget_frames = 0
+        self.downgrades = 0
+        self.upgrades = 0
+        self.decisions = deque(maxlen=history)
+
+    @property
+    def current(self):
+        return self.levels[self.index]
+
+    def record(self, elapsed_ms):
+        """
+        记录一帧耗时，必要时切换档位
+
+        Returns:
+            str | None: 发生切换时返回 "down" / "up"，否则 None
+        """
+        with self._lock:
+            self.frames += 1
+            if elapsed_ms > self.budget_ms:
+                self.over_budget_frames += 1
+            self._samples.append(elapsed_ms)
+            if len(self._samples) < self._samples.maxlen:
+                return None
+
+            avg = sum(self._samples) / len(self._samples)
+            if avg > self.budget_ms:
+                self._over += 1
+                self._under = 0
+            elif avg < self.budget_ms * self.headroom:
+                self._under += 1
+                self._over = 0
+            else:
+                self._over = self._under = 0
+
+            if self._over >= self.patience and self.index < len(self.levels) - 1:
+                return self._switch(self.index + 1, "down", avg)
+            if self._under >= self.patience and self.index > 0:
+                return self._switch(self.index - 1, "up", avg)
+            return None
+
+    def _switch(self, new_index, direction, avg_ms):
+        old = self.levels[self.index]["name"]
+        self.index = new_index
+        self._samples.clear()
+        self._over = self._under = 0
+        if direction == "down":
+            self.downgrades += 1
+        else:
+            self.upgrades += 1
+        self.decisions.append({
+            "time": time.time(),
+            "direction": direction,
+            "from": old,
+            "to": self.levels[new_index]["name"],
+            "avg_ms": round(avg_ms, 2),
+        })
+        return direction
+
+    def drop(self, level):
+        """移除一个无法使用的档位（如模型加载失败）；当前档位被移除时顺延到下一个更便宜的档位"""
+        with self._lock:
+            if level not in self.levels or len(self.levels) == 1:
+                raise ValueError(f"无法移除档位 {level['name']}")
+            position = self.levels.index(level)
+            self.levels = self.levels[:position] + self.levels[position + 1:]
+            if position < self.index:
+                self.index -= 1
+            self.index = min(self.index, len(self.levels) - 1)
+            self._samples.clear()
+            self._over = self._under = 0
+            self.decisions.append({
+                "time": time.time(),
+                "direction": "drop",
+                "from": level["name"],
+                "to": self.current["name"],
+                "avg_ms": None,
+            })
+
+    def metrics(self):
+        with self._lock:
+            recent = list(self._samples)
+            return {
+                "level": self.current["name"],
+                "level_index": self.index,
+                "budget_ms": self.budget_ms,
+                "recent_avg_ms": sum(recent) / len(recent) if recent else None,
+                "frames": self.frames,
+                "over_budget_frames": self.over_budget_frames,
+                "downgrades": self.downgrades,
+                "upgrades": self.upgrades,
+                "decisions": list(self.decisions),
+            }
+
+
+class AdaptivePerceiver:
+    """
+    带耗时预算的 perceive()：每帧按控制器当前档位选择模型和输入尺寸，并把耗时反馈给控制器
+    """
+
+    def __init__(self, budget_ms=LATENCY_BUDGET_MS, levels=None, weights=DEFAULT_WEIGHTS, **controller_kwargs):
+        self.weights = weights
+        self.controller = LatencyBudgetController(levels or default_levels(), budget_ms, **controller_kwargs)
+
+    def _model_for(self, level):
+        if level["tier"] is None:
+            return get_backend(self.weights)
+        return load_tier(level["tier"])
+
+    def perceive(self, image=None, **kwargs):
+        """参数同 perceive()（model / imgsz 由当前档位决定）"""
+        from Mahjong_YOLO.test import perceive
+
+        while True:
+            level = self.controller.current
+            try:
+                model = self._model_for(level)
+                break
+            except Exception:
+                # 加载失败的档位直接移除；只剩这一个档位时把异常交给调用方
+                if len(self.controller.levels) == 1:
+                    raise
+                self.controller.drop(level)
+        start = time.perf_counter()
+        result = perceive(image, model=model, imgsz=level["imgsz"], **kwargs)
+        self.controller.record((time.perf_counter() - start) * 1000)
+        return result
+
+    __call__ = perceive
+
+    def metrics(self):
+        return self.controller.metrics()
@@ -0,0 +1,259 @@
+"""
+牌桌布局标定：从几帧截图中找出游戏窗口和手牌区域，按 客户端 + 分辨率 缓存到磁盘，
+之后 perceive() / perceive_table() 等直接使用缓存的区域，不再依赖写死的 HAND_REGION。
+
+    python -m Mahjong_YOLO.layout_calibration --client majsoul 截图1.png 截图2.png 截图3.png
+
+区域坐标沿用 perceive 的约定：整张截图缩放到 640x640 后的坐标系
+"""
+import argparse
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from Mahjong_YOLO.test import MODEL_INPUT_SIZE, _detect_full_frame, scale_region, to_bgr_array
+
+# 标定结果保存位置
+LAYOUT_PATH = os.environ.get("MAHJONG_LAYOUT_PATH", "Mahjong_YOLO/layouts.json")
+# 当前使用的客户端名，不同客户端（雀魂、天凤等）的布局分别缓存
+DEFAULT_CLIENT = os.environ.get("MAHJONG_CLIENT", "default")
+
+_cache = {"mtime": None, "layouts": {}}
+_cache_lock = threading.Lock()
+
+
+def layout_key(client, width, height):
+    return f"{client}@{int(width)}x{int(height)}"
+
+
+class Layout:
+    """
+    某个客户端在某个分辨率下的牌桌布局
+
+    frame_size: 截图尺寸 (宽, 高)
+    window: 游戏窗口在截图中的像素范围 (x1, y1, x2, y2)
+    regions: {区域名: (x1, y1, x2, y2)}，640 坐标系，区域名与 TABLE_REGIONS 一致
+    """
+
+    def __init__(self, frame_size, window, regions, client=DEFAULT_CLIENT, frames=0):
+        self.frame_size = tuple(int(v) for v in frame_size)
+        self.window = tuple(int(v) for v in window)
+        self.regions = {name: tuple(float(v) for v in box) for name, box in regions.items()}
+        self.client = client
+        self.frames = frames
+
+    @property
+    def key(self):
+        return layout_key(self.client, *self.frame_size)
+
+    @property
+    def hand_region(self):
+        return self.regions["hand"]
+
+    def region_px(self, name):
+        """区域在截图中的像素范围"""
+        return scale_region(self.regions[name], *self.frame_size, MODEL_INPUT_SIZE)
+
+    def capture_bbox(self, names=None, margin=8):
+        """
+        截图时只需抓取的像素范围：names 中各区域（默认全部区域）的外接矩形，四周留 margin 像素
+
+        Returns:
+            (left, top, right, bottom)，可直接作为 ImageGrab.grab(bbox=...) 的参数
+        """
+        boxes = np.array([self.region_px(n) for n in (names or self.regions)], dtype=np.int64)
+        w, h = self.frame_size
+        return (max(int(boxes[:, 0].min()) - margin, 0), max(int(boxes[:, 1].min()) - margin, 0),
+                min(int(boxes[:, 2].max()) + margin, w), min(int(boxes[:, 3].max()) + margin, h))
+
+    def cropped(self, bbox):
+        """
+        只截取 bbox 范围（像素）时对应的布局：截图尺寸变为 bbox 大小，各区域换算到裁剪后的 640 坐标系，
+        这样区域截图可以直接交给 perceive(image=..., layout=...)
+        """
+        left, top, right, bottom = (int(v) for v in bbox)
+        w, h = right - left, bottom - top
+        regions = {}
+        for name in self.regions:
+            x1, y1, x2, y2 = self.region_px(name)
+            regions[name] = _to_ref((x1 - left, y1 - top, x2 - left, y2 - top), w, h)
+        wx1, wy1, wx2, wy2 = self.window
+        window = (max(wx1 - left, 0), max(wy1 - top, 0), min(wx2 - left, w), min(wy2 - top, h))
+        return Layout((w, h), window, regions, self.client, self.frames)
+
+    def to_dict(self):
+        return {
+            "client": self.client,
+            "frame_size": list(self.frame_size),
+            "window": list(self.window),
+            "regions": {name: list(box) for name, box in self.regions.items()},
+            "frames": self.frames,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["frame_size"], data["window"], data["regions"],
+                   data.get("client", DEFAULT_CLIENT), data.get("frames", 0))
+
+
+def _read_all(path):
+    """读取全部已缓存布局（文件未变化时复用上次读取的内容）"""
+    if not os.path.exists(path):
+        return {}
+    mtime = os.path.getmtime(path)
+    with _cache_lock:
+        if _cache["mtime"] != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            _cache["layouts"] = {k: Layout.from_dict(v) for k, v in data.items()}
+            _cache["mtime"] = mtime
+        return _cache["layouts"]
+
+
+def load_layout(width, height, client=DEFAULT_CLIENT, path=LAYOUT_PATH):
+    """读取 客户端 + 分辨率 对应的布局，没有标定过时返回 None"""
+    return _read_all(path).get(layout_key(client, width, height))
+
+
+def save_layout(layout, path=LAYOUT_PATH):
+    """写入（覆盖同一 客户端 + 分辨率 的）布局"""
+    layouts = dict(_read_all(path))
+    layouts[layout.key] = layout
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({k: v.to_dict() for k, v in layouts.items()}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return layout
+
+
+def detect_window(frames, std_threshold=6.0):
+    """
+    找出游戏窗口：去掉四周颜色均匀的黑边 / 纯色背景（行、列的灰度标准差都很小）
+
+    Returns:
+        (x1, y1, x2, y2) 像素范围；找不到时返回整张截图
+    """
+    gray = np.median(np.stack([cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in frames]), axis=0)
+    h, w = gray.shape
+    rows = np.flatnonzero(gray.std(axis=1) > std_threshold)
+    cols = np.flatnonzero(gray.std(axis=0) > std_threshold)
+    if len(rows) == 0 or len(cols) == 0:
+        return 0, 0, w, h
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def detect_hand_box(detections, window, bottom_fraction=0.3):
+    """
+    从多帧的检测框中找出手牌：窗口下部 bottom_fraction 内、尺寸最大的一排牌
+
+    Args:
+        detections: [(xyxy, conf, cls), ...]，原图坐标
+        window: 游戏窗口像素范围
+
+    Returns:
+        (x1, y1, x2, y2) 像素范围；没有找到手牌时返回 None
+    """
+    wx1, wy1, wx2, wy2 = window
+    boxes = np.concatenate([d[0] for d in detections]) if detections else np.zeros((0, 4))
+    if len(boxes) == 0:
+        return None
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    heights = boxes[:, 3] - boxes[:, 1]
+    candidates = boxes[(cy >= wy2 - (wy2 - wy1) * bottom_fraction) & (cy <= wy2)]
+    if len(candidates) == 0:
+        return None
+
+    # 手牌是画面中最大的一排牌：只保留高度接近最大值的框
+    cand_h = candidates[:, 3] - candidates[:, 1]
+    hand = candidates[cand_h >= np.percentile(cand_h, 75) * 0.8]
+    # 再去掉纵向上偏离主行的框（其他区域的大牌、特效等）
+    row_y = np.median((hand[:, 1] + hand[:, 3]) / 2)
+    hand = hand[np.abs((hand[:, 1] + hand[:, 3]) / 2 - row_y) < np.median(heights) * 0.5]
+    if len(hand) == 0:
+        return None
+
+    tile_w = float(np.median(hand[:, 2] - hand[:, 0]))
+    tile_h = float(np.median(hand[:, 3] - hand[:, 1]))
+    # 左右各留一张牌宽（摸牌位、手牌数变化），上下留少量余量
+    return (max(hand[:, 0].min() - tile_w, wx1), max(hand[:, 1].min() - tile_h * 0.15, wy1),
+            min(hand[:, 2].max() + tile_w, wx2), min(hand[:, 3].max() + tile_h * 0.15, wy2))
+
+
+def _to_ref(box, width, height):
+    """像素范围 -> 640 坐标系"""
+    x1, y1, x2, y2 = box
+    sx, sy = MODEL_INPUT_SIZE / width, MODEL_INPUT_SIZE / height
+    return x1 * sx, y1 * sy, x2 * sx, y2 * sy
+
+
+def calibrate(frames, model=None, client=DEFAULT_CLIENT, save=True, path=LAYOUT_PATH):
+    """
+    用几帧截图标定布局：
+    1. 去掉黑边 / 纯色背景，得到游戏窗口
+    2. 整帧推理，窗口下部最大的一排牌即手牌，据此得到手牌区域
+    3. 其余区域（牌河、副露、宝牌）按 TABLE_REGIONS 相对游戏窗口换算
+
+    Args:
+        frames: 同一客户端、同一分辨率的若干帧（任意 perceive 支持的图像类型）
+        model: 已加载好的模型，为 None 时与 perceive() 一样从注册表获取
+
+    Returns:
+        Layout
+    """
+    from Mahjong_YOLO.model_tiers import resolve_model
+    from Mahjong_YOLO.table_state import TABLE_REGIONS
+
+    images = [to_bgr_array(f) for f in frames]
+    if not images:
+        raise ValueError("至少需要一帧截图")
+    h, w = images[0].shape[:2]
+    if any(img.shape[:2] != (h, w) for img in images):
+        raise ValueError("标定用的截图分辨率必须一致")
+    if model is None:
+        model = resolve_model()
+
+    window = detect_window(images)
+    wx1, wy1, wx2, wy2 = window
+    sx, sy = (wx2 - wx1) / MODEL_INPUT_SIZE, (wy2 - wy1) / MODEL_INPUT_SIZE
+    regions = {}
+    for name, (x1, y1, x2, y2) in TABLE_REGIONS.items():
+        regions[name] = _to_ref((wx1 + x1 * sx, wy1 + y1 * sy, wx1 + x2 * sx, wy1 + y2 * sy), w, h)
+
+    detections = [_detect_full_frame(model, img)[0] for img in images]
+    hand_box = detect_hand_box(detections, window)
+    if hand_box is not None:
+        regions["hand"] = _to_ref(hand_box, w, h)
+
+    layout = Layout((w, h), window, regions, client, len(images))
+    if save:
+        save_layout(layout, path)
+    return layout
+
+
+def get_layout(width, height, client=DEFAULT_CLIENT, path=LAYOUT_PATH):
+    """perceive 等使用的布局：有标定结果时返回它，否则返回 None（调用方使用默认区域）"""
+    try:
+        return load_layout(width, height, client, path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"读取布局标定失败，使用默认区域: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="牌桌布局标定：检测游戏窗口和手牌区域并缓存")
+    parser.add_argument("frames", nargs="+", help="同一客户端、同一分辨率的截图（建议 3~5 张）")
+    parser.add_argument("--client", default=DEFAULT_CLIENT, help="客户端名")
+    parser.add_argument("--out", default=LAYOUT_PATH, help="标定结果保存路径")
+    args = parser.parse_args()
+
+    layout = calibrate(args.frames, client=args.client, path=args.out)
+    print(f"{layout.key}: 窗口 {layout.window}")
+    for name, box in layout.regions.items():
+        print(f"  {name}: {tuple(round(v, 1) for v in box)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import threading
+
+import numpy as np
+from ultralytics import YOLO
+
+from Mahjong_YOLO.tile_lookup import get_class_lookup
+
+# 默认使用的识别模型权重
+DEFAULT_WEIGHTS = "Mahjong_YOLO/trained_models_v2/yolo11m_best.pt"
+# 默认推理后端：torch / onnx / openvino / auto（核对等价性后自动选择本机最快的后端）；
+# auto 第一次使用时要导出并测速各后端，需要时通过 MAHJONG_BACKEND=auto 显式开启
+DEFAULT_BACKEND = os.environ.get("MAHJONG_BACKEND", "torch")
+
+# 进程内已加载的模型：绝对路径 -> YOLO 实例
+_models = {}
+# 每个权重文件一把锁，保证同一权重在并发调用下也只加载一次
+_load_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _key(weights):
+    return os.path.abspath(weights)
+
+
+def _lock_for(key):
+    with _registry_lock:
+        lock = _load_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _load_locks[key] = lock
+        return lock
+
+
+def get_model(weights=DEFAULT_WEIGHTS):
+    """
+    获取（必要时加载）指定权重对应的模型，同一进程内每个权重文件只反序列化一次
+
+    Args:
+        weights: 权重文件路径
+
+    Returns:
+        YOLO: 可直接 predict 的模型实例
+    """
+    key = _key(weights)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock_for(key):
+        # 双重检查：等锁期间可能已被其他线程加载完成
+        model = _models.get(key)
+        if model is None:
+            model = YOLO(weights)
+            # 加载时就把类别名编译成 类别ID -> 34编码 的查找表
+            get_class_lookup(model)
+            _models[key] = model
+    return model
+
+
+def get_backend(weights=DEFAULT_WEIGHTS, backend=DEFAULT_BACKEND, int8=False, calib_data=None):
+    """
+    获取（必要时加载）指定后端的推理模型，同一进程内每个 (权重, 后端, 是否INT8) 只加载一次
+
+    Args:
+        weights: .pt 权重路径；ONNX / OpenVINO 后端会在旁边导出并缓存对应格式
+        backend: torch / onnx / openvino / auto（auto 不支持 INT8）
+        int8: 是否使用 INT8 量化模型
+        calib_data: OpenVINO INT8 量化所需的数据集配置
+
+    Returns:
+        具有 names 和 predict(source, imgsz) 的模型对象
+    """
+    if backend == "torch" and not int8:
+        return get_model(weights)
+
+    key = (_key(weights), backend, int8)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock_for(key):
+        model = _models.get(key)
+        if model is None:
+            from Mahjong_YOLO import backends
+
+            if backend == "auto":
+                chosen, model, timings = backends.select_fastest_backend(weights)
+                print(f"推理后端测速: {timings}，使用 {chosen}")
+            else:
+                model = backends.load_backend(weights, backend, get_model(weights).names,
+                                              int8=int8, calib_data=calib_data)
+            get_class_lookup(model)
+            _models[key] = model
+    return model
+
+
+def is_loaded(weights=DEFAULT_WEIGHTS):
+    """判断权重是否已经加载到当前进程"""
+    return _key(weights) in _models
+
+
+def warmup(weights=DEFAULT_WEIGHTS, imgsz=640, backend=DEFAULT_BACKEND, tier=None):
+    """
+    加载模型并用一张全黑的 imgsz x imgsz 图片空跑一次推理，
+    让首次 predict 的图构建、内存分配等开销提前发生
+
+    tier 为 None 时与 perceive() 一样使用 model_tiers.DEFAULT_TIER
+    """
+    from Mahjong_YOLO.model_tiers import DEFAULT_TIER, resolve_model
+
+    model = resolve_model(weights, backend, DEFAULT_TIER if tier is None else tier)
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    model.predict(source=dummy, imgsz=imgsz, verbose=False)
+    return model
+
+
+def warmup_async(weights=DEFAULT_WEIGHTS, imgsz=640, backend=DEFAULT_BACKEND, tier=None):
+    """
+    在后台线程中预热模型，不阻塞 GUI 启动
+
+    Returns:
+        threading.Thread: 预热线程（daemon），需要时可 join 等待完成
+    """
+    def _run():
+        try:
+            warmup(weights, imgsz, backend, tier)
+        except Exception as e:
+            # 预热失败不影响后续按需加载
+            print(f"模型预热失败: {e}")
+
+    thread = threading.Thread(target=_run, name="yolo-warmup", daemon=True)
+    thread.start()
+    return thread
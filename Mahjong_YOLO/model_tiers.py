@@ -0,0 +1,240 @@
+"""
+识别模型分级：更小的模型（n / s）和 INT8 量化模型速度更快，但准确率可能下降。
+
+用带标注的截图集测出每一级的单帧耗时和逐牌准确率（结果保存为 JSON），
+perceive() 据此自动选用满足准确率下限的最快一级：
+
+    python -m Mahjong_YOLO.model_tiers --data 标注截图目录 --floor 0.95
+
+标注格式：每张截图旁放一个同名 .txt，内容为手牌字符串，如 123m456p789s1122z
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from Mahjong_YOLO.backends import backend_available
+from Mahjong_YOLO.model_registry import DEFAULT_BACKEND, DEFAULT_WEIGHTS, get_backend
+from Mahjong_YOLO.tile_lookup import hand_string_to_counts
+
+MODELS_DIR = "Mahjong_YOLO/trained_models_v2"
+
+# 按推理开销从低到高排列；权重文件不存在或后端运行时未安装的级别会被自动跳过
+MODEL_TIERS = [
+    {"name": "yolo11n-int8", "weights": f"{MODELS_DIR}/yolo11n_best.pt", "backend": "onnx", "int8": True},
+    {"name": "yolo11n", "weights": f"{MODELS_DIR}/yolo11n_best.pt", "backend": DEFAULT_BACKEND},
+    {"name": "yolo11s-int8", "weights": f"{MODELS_DIR}/yolo11s_best.pt", "backend": "onnx", "int8": True},
+    {"name": "yolo11s", "weights": f"{MODELS_DIR}/yolo11s_best.pt", "backend": DEFAULT_BACKEND},
+    {"name": "yolo11m-int8", "weights": DEFAULT_WEIGHTS, "backend": "onnx", "int8": True},
+    {"name": "yolo11m", "weights": DEFAULT_WEIGHTS, "backend": DEFAULT_BACKEND},
+]
+
+# 测评结果保存位置
+BENCHMARK_PATH = f"{MODELS_DIR}/tier_benchmark.json"
+# 自动选级时要求的最低逐牌准确率
+ACCURACY_FLOOR = float(os.environ.get("MAHJONG_ACCURACY_FLOOR", "0.95"))
+# 默认模型级别：auto 表示按测评结果自动选择，也可以写具体的级别名；留空则只用 weights/backend 参数
+DEFAULT_TIER = os.environ.get("MAHJONG_TIER", "auto")
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+_benchmark_cache = {"mtime": None, "results": None}
+
+
+def available_tiers(tiers=None):
+    """权重文件存在、且后端运行时已安装（如 INT8 级别需要 onnxruntime）的模型级别"""
+    def runnable(tier):
+        backend = tier.get("backend", DEFAULT_BACKEND)
+        return backend == "auto" or backend_available(backend)
+
+    return [t for t in (tiers or MODEL_TIERS) if os.path.exists(t["weights"]) and runnable(t)]
+
+
+def get_tier(name, tiers=None):
+    for tier in tiers or MODEL_TIERS:
+        if tier["name"] == name:
+            return tier
+    raise KeyError(f"未知的模型级别: {name}")
+
+
+def tier_spec(tier):
+    """某一级别的模型配置：weights / backend / int8 / calib_data，可直接传给 get_backend"""
+    return {"weights": tier["weights"], "backend": tier.get("backend", DEFAULT_BACKEND),
+            "int8": tier.get("int8", False), "calib_data": tier.get("calib_data")}
+
+
+def load_tier(tier):
+    """加载（进程内缓存）某一级别的模型"""
+    return get_backend(**tier_spec(tier))
+
+
+def load_labeled_set(data_dir):
+    """
+    读取标注截图集
+
+    Returns:
+        list[(图片路径, 手牌字符串)]
+    """
+    samples = []
+    for name in sorted(os.listdir(data_dir)):
+        stem, ext = os.path.splitext(name)
+        label_path = os.path.join(data_dir, stem + ".txt")
+        if ext.lower() in IMAGE_EXTS and os.path.exists(label_path):
+            with open(label_path, "r", encoding="utf-8") as f:
+                samples.append((os.path.join(data_dir, name), f.read().strip()))
+    return samples
+
+
+def tile_match(pred_hand, true_hand):
+    """
+    逐牌比较两个手牌字符串（按每种牌的数量计，不考虑顺序）
+
+    Returns:
+        (正确张数, 分母)：分母取两者张数的较大值，多识别和漏识别都会计为错误
+    """
+    pred = hand_string_to_counts(pred_hand)
+    true = hand_string_to_counts(true_hand)
+    return int(np.minimum(pred, true).sum()), int(max(pred.sum(), true.sum()))
+
+
+def benchmark_tier(tier, samples, repeat=1):
+    """
+    测量单个级别在标注集上的耗时和准确率（图片先全部解码到内存，不计入耗时）
+
+    Returns:
+        dict: name / latency_ms（中位数）/ p90_ms / accuracy / frames
+    """
+    from Mahjong_YOLO.test import perceive, to_bgr_array
+
+    model = load_tier(tier)
+    images = [(to_bgr_array(path), label) for path, label in samples]
+    # 预热，排除首帧开销
+    perceive(images[0][0], model=model, plot=False)
+
+    latencies = []
+    correct = total = 0
+    for _ in range(repeat):
+        for img, label in images:
+            start = time.perf_counter()
+            _, hand_str = perceive(img, model=model, plot=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+            c, t = tile_match(hand_str, label)
+            correct += c
+            total += t
+
+    return {
+        "name": tier["name"],
+        "latency_ms": float(np.median(latencies)),
+        "p90_ms": float(np.percentile(latencies, 90)),
+        "accuracy": correct / total if total else 0.0,
+        "frames": len(latencies),
+    }
+
+
+def run_benchmark(data_dir, tiers=None, repeat=1, save_path=BENCHMARK_PATH):
+    """对所有可用级别跑一遍测评，结果写入 save_path 并返回"""
+    samples = load_labeled_set(data_dir)
+    if not samples:
+        raise ValueError(f"{data_dir} 中没有找到带 .txt 标注的截图")
+
+    results = []
+    for tier in available_tiers(tiers):
+        try:
+            results.append(benchmark_tier(tier, samples, repeat))
+        except Exception as e:
+            results.append({"name": tier["name"], "error": str(e)})
+
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump({"samples": len(samples), "results": results}, f, ensure_ascii=False, indent=2)
+    return results
+
+
+def load_benchmark(path=BENCHMARK_PATH):
+    """读取测评结果（文件未变化时复用上次读取的内容），不存在时返回 None"""
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _benchmark_cache["mtime"] != mtime:
+        with open(path, "r", encoding="utf-8") as f:
+            _benchmark_cache["results"] = json.load(f)["results"]
+        _benchmark_cache["mtime"] = mtime
+    return _benchmark_cache["results"]
+
+
+def select_tier(accuracy_floor=ACCURACY_FLOOR, results=None, tiers=None):
+    """
+    选出满足准确率下限的最快级别；都不满足时退而选准确率最高的级别
+
+    Returns:
+        dict | None: MODEL_TIERS 中的级别配置；没有测评结果时返回 None
+    """
+    results = results if results is not None else load_benchmark()
+    if not results:
+        return None
+    available = {t["name"]: t for t in available_tiers(tiers)}
+    measured = [r for r in results if "error" not in r and r["name"] in available]
+    if not measured:
+        return None
+
+    qualified = [r for r in measured if r["accuracy"] >= accuracy_floor]
+    if qualified:
+        best = min(qualified, key=lambda r: r["latency_ms"])
+    else:
+        best = max(measured, key=lambda r: (r["accuracy"], -r["latency_ms"]))
+    return available[best["name"]]
+
+
+def resolve_spec(weights=DEFAULT_WEIGHTS, backend=DEFAULT_BACKEND, tier=DEFAULT_TIER,
+                 accuracy_floor=ACCURACY_FLOOR):
+    """
+    按 resolve_model 的规则选出模型配置（不加载模型）：
+    - 显式指定了非默认 weights 或 backend 时，按 weights/backend 加载（tier 为 auto 时不再自动选级）
+    - 否则 tier 为级别名时加载该级别；为 auto 时按测评结果选级
+    - 没有测评结果时回退到 weights/backend
+
+    同时指定级别名和非默认 backend 时无法确定该用哪个后端，抛出 ValueError
+
+    Returns:
+        dict: weights / backend / int8 / calib_data，可直接传给 get_backend
+    """
+    explicit_backend = backend != DEFAULT_BACKEND
+    if tier and tier != "auto" and explicit_backend:
+        raise ValueError(f"模型级别 {tier} 自带后端配置，不能同时指定 backend={backend}")
+    if tier and weights == DEFAULT_WEIGHTS and not explicit_backend:
+        chosen = select_tier(accuracy_floor) if tier == "auto" else get_tier(tier)
+        if chosen is not None:
+            return tier_spec(chosen)
+    return {"weights": weights, "backend": backend, "int8": False, "calib_data": None}
+
+
+def resolve_model(weights=DEFAULT_WEIGHTS, backend=DEFAULT_BACKEND, tier=DEFAULT_TIER,
+                  accuracy_floor=ACCURACY_FLOOR):
+    """perceive() 使用的模型，选择规则见 resolve_spec"""
+    return get_backend(**resolve_spec(weights, backend, tier, accuracy_floor))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型分级测评：测量各级模型的耗时与逐牌准确率")
+    parser.add_argument("--data", required=True, help="标注截图目录（图片 + 同名 .txt 手牌字符串）")
+    parser.add_argument("--floor", type=float, default=ACCURACY_FLOOR, help="准确率下限")
+    parser.add_argument("--repeat", type=int, default=1, help="每张图重复次数")
+    parser.add_argument("--out", default=BENCHMARK_PATH, help="测评结果保存路径")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.data, repeat=args.repeat, save_path=args.out)
+    print(f"{'级别':<16}{'中位耗时':>10}{'P90':>10}{'准确率':>10}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['name']:<16}失败: {r['error']}")
+        else:
+            print(f"{r['name']:<16}{r['latency_ms']:>9.1f}ms{r['p90_ms']:>8.1f}ms{r['accuracy']:>10.2%}")
+
+    chosen = select_tier(args.floor, results)
+    print(f"准确率下限 {args.floor:.0%} 时选用: {chosen['name'] if chosen else '无可用级别'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+离线批量识别：对截图目录或录制的对局视频逐帧识别手牌，结果写入 JSONL，用于复盘。
+
+    python -m Mahjong_YOLO.offline_batch 截图目录/ --out hands.jsonl
+    python -m Mahjong_YOLO.offline_batch 对局录像.mp4 --out hands.jsonl --workers 4 --stride 2
+
+- 手牌区域没有明显变化的帧（HandChangeGate 判定）直接跳过，只识别画面变化后的帧
+- 识别分散到进程池中，每个工作进程只加载并预热一次模型
+- 结束时输出吞吐量（帧/秒）和各阶段耗时
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from Mahjong_YOLO.change_gate import HandChangeGate
+from Mahjong_YOLO.model_registry import DEFAULT_BACKEND, DEFAULT_WEIGHTS
+from Mahjong_YOLO.model_tiers import ACCURACY_FLOOR, DEFAULT_TIER
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+VIDEO_EXTS = (".mp4", ".mkv", ".avi", ".mov", ".flv", ".webm")
+
+# 工作进程内的模型（每个进程加载一次）
+_worker = {"model": None, "min_conf": 0.0}
+
+
+def iter_frames(path, stride=1):
+    """
+    逐帧读取截图目录或视频
+
+    Args:
+        stride: 视频每隔多少帧取一帧（跳过的帧只 grab 不解码）
+
+    Yields:
+        (来源名, 帧号, 时间戳秒, BGR 帧)
+    """
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTS))
+        for i, name in enumerate(names):
+            img = cv2.imread(os.path.join(path, name))
+            if img is not None:
+                yield name, i, None, img
+        return
+
+    if not path.lower().endswith(VIDEO_EXTS):
+        raise ValueError(f"不支持的输入: {path}（需要图片目录或视频文件）")
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"无法打开视频: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    name = os.path.basename(path)
+    index = 0
+    try:
+        while True:
+            if index % stride:
+                if not cap.grab():
+                    break
+            else:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                yield name, index, index / fps if fps else None, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def resolve_model_spec(weights=DEFAULT_WEIGHTS, backend=DEFAULT_BACKEND, tier=DEFAULT_TIER,
+                       accuracy_floor=ACCURACY_FLOOR):
+    """
+    在父进程中把 weights / backend / tier 解析成具体的模型配置（选择规则与 resolve_model 共用 resolve_spec），
+    backend 为 auto 时在这里测速选定一次，ONNX / OpenVINO 产物也在这里导出好；
+    否则每个工作进程都会同时导出、测速，重复花几分钟并争抢同一个导出文件
+
+    Returns:
+        dict: weights / backend（具体后端名）/ int8 / calib_data，可直接传给 get_backend
+    """
+    from Mahjong_YOLO.backends import export_model, select_fastest_backend
+    from Mahjong_YOLO.model_tiers import resolve_spec
+
+    spec = resolve_spec(weights, backend, tier, accuracy_floor)
+    if spec["backend"] == "auto":
+        spec["backend"], _, timings = select_fastest_backend(spec["weights"])
+        print(f"推理后端测速: {timings}，使用 {spec['backend']}")
+    else:
+        export_model(spec["weights"], spec["backend"], int8=spec["int8"], calib_data=spec["calib_data"])
+    return spec
+
+
+def _init_worker(spec, min_conf, threads):
+    """工作进程初始化：限制线程数、按父进程解析好的配置加载并预热模型"""
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from Mahjong_YOLO.model_registry import get_backend
+
+    model = get_backend(**spec)
+    model.predict(source=np.zeros((640, 640, 3), dtype=np.uint8), imgsz=640, verbose=False)
+    _worker["model"] = model
+    _worker["min_conf"] = min_conf
+
+
+def _perceive_job(frame):
+    """在工作进程中识别一帧，返回手牌和识别耗时"""
+    from Mahjong_YOLO.test import perceive
+
+    start = time.perf_counter()
+    hand_tiles, hand_string = perceive(frame, model=_worker["model"], plot=False,
+                                       min_conf=_worker["min_conf"])
+    infer_ms = (time.perf_counter() - start) * 1000
+    # 每个框：x1, y1, x2, y2, 置信度, 类别名
+    detections = [[round(v, 1) for v in box] + [round(conf, 4), name]
+                  for _, name, conf, box in hand_tiles]
+    return hand_string, detections, infer_ms, os.getpid()
+
+
+class StageTimer:
+    """累计各阶段耗时（毫秒）"""
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, stage, ms):
+        self.totals[stage] = self.totals.get(stage, 0.0) + ms
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def report(self):
+        return {
+            stage: {"total_ms": round(total, 1), "avg_ms": round(total / self.counts[stage], 2),
+                    "count": self.counts[stage]}
+            for stage, total in self.totals.items()
+        }
+
+
+def run(input_path, out_path, workers=None, stride=1, scene_change=True, weights=DEFAULT_WEIGHTS,
+        backend=DEFAULT_BACKEND, tier=DEFAULT_TIER, min_conf=0.0, gate_kwargs=None, accuracy_floor=ACCURACY_FLOOR):
+    """
+    批量识别并写出 JSONL（每行一帧：source / frame / time / hand / detections / infer_ms），
+    按输入顺序输出
+
+    Returns:
+        dict: 帧数、吞吐量和各阶段耗时
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    threads = max(1, (os.cpu_count() or workers) // workers)
+    gate = HandChangeGate(**(gate_kwargs or {})) if scene_change else None
+    timer = StageTimer()
+    read = sampled = written = 0
+    in_flight = deque()
+    max_in_flight = workers * 2
+    # 导出 / 测速只在父进程做一次，不计入吞吐量
+    spec = resolve_model_spec(weights, backend, tier, accuracy_floor)
+
+    start = time.perf_counter()
+    # spawn 与 Windows 行为一致，也避免 fork 时复制主进程中的线程状态
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(spec, min_conf, threads)) as pool, \
+            open(out_path, "w", encoding="utf-8") as out:
+
+        def drain(limit):
+            """按输入顺序写出已完成的结果；在途任务超过 limit 时阻塞等待最早的任务"""
+            nonlocal written
+            while in_flight and (len(in_flight) > limit or in_flight[0][1].done()):
+                meta, future = in_flight.popleft()
+                t = time.perf_counter()
+                hand_string, detections, infer_ms, pid = future.result()
+                timer.add("wait", (time.perf_counter() - t) * 1000)
+                timer.add("infer", infer_ms)
+
+                t = time.perf_counter()
+                record = dict(meta, hand=hand_string, detections=detections,
+                              infer_ms=round(infer_ms, 2), worker=pid)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                timer.add("write", (time.perf_counter() - t) * 1000)
+                written += 1
+
+        t = time.perf_counter()
+        for source, index, timestamp, frame in iter_frames(input_path, stride):
+            timer.add("decode", (time.perf_counter() - t) * 1000)
+            read += 1
+
+            t = time.perf_counter()
+            keep = gate is None or gate.check(frame)
+            timer.add("scene_change", (time.perf_counter() - t) * 1000)
+            if keep:
+                sampled += 1
+                t = time.perf_counter()
+                meta = {"source": source, "frame": index, "time": timestamp}
+                in_flight.append((meta, pool.submit(_perceive_job, frame)))
+                timer.add("submit", (time.perf_counter() - t) * 1000)
+                # 限制在途任务数，避免读帧远快于识别时帧全部堆在内存里
+                drain(max_in_flight)
+            t = time.perf_counter()
+
+        drain(0)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "frames_read": read,
+        "frames_sampled": sampled,
+        "frames_written": written,
+        "workers": workers,
+        "model": {"weights": spec["weights"], "backend": spec["backend"], "int8": spec["int8"]},
+        "elapsed_s": round(elapsed, 2),
+        "read_fps": round(read / elapsed, 2) if elapsed else 0.0,
+        "perceive_fps": round(written / elapsed, 2) if elapsed else 0.0,
+        "stages": timer.report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量识别截图目录 / 对局录像中的手牌")
+    parser.add_argument("input", help="截图目录或视频文件")
+    parser.add_argument("--out", default="hands.jsonl", help="JSONL 输出路径")
+    parser.add_argument("--workers", type=int, default=None, help="识别进程数，默认 CPU 核数的一半")
+    parser.add_argument("--stride", type=int, default=1, help="视频每隔多少帧取一帧")
+    parser.add_argument("--all-frames", action="store_true", help="不做画面变化检测，识别所有帧")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS, help="权重路径")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, help="推理后端")
+    parser.add_argument("--tier", default=DEFAULT_TIER, help="模型级别")
+    parser.add_argument("--min-conf", type=float, default=0.0, help="手牌框的最低置信度")
+    parser.add_argument("--floor", type=float, default=ACCURACY_FLOOR, help="tier 为 auto 时的准确率下限")
+    args = parser.parse_args()
+
+    summary = run(args.input, args.out, args.workers, max(1, args.stride), not args.all_frames,
+                  args.weights, args.backend, args.tier, args.min_conf, accuracy_floor=args.floor)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+识别结果缓存：按（裁剪后的）手牌区域像素内容做哈希，同一画面再次识别时直接返回上次的结果。
+
+两级缓存：
+    内存 —— LRU，按条目数淘汰
+    磁盘 —— 可选，每条结果一个小 JSON 文件，总大小超过上限时淘汰最久未访问的文件
+
+    _, hand_str = perceive(frame, cache=perception_cache)
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 内存缓存条目数
+CACHE_MEMORY_ENTRIES = int(os.environ.get("MAHJONG_CACHE_ENTRIES", "256"))
+# 磁盘缓存目录，为空表示不使用磁盘缓存
+CACHE_DIR = os.environ.get("MAHJONG_CACHE_DIR", "")
+# 磁盘缓存总大小上限（MB）
+CACHE_DISK_MB = float(os.environ.get("MAHJONG_CACHE_DISK_MB", "64"))
+
+
+def model_fingerprint(model):
+    """
+    模型标识：包含权重路径和类别名，换模型 / 换后端不会命中旧结果
+
+    Returns:
+        (标识字符串, 是否可以跨进程持久化)
+    """
+    path = getattr(model, "ckpt_path", None) or getattr(model, "model_path", None)
+    names = getattr(model, "names", None)
+    names = sorted(names.items()) if isinstance(names, dict) else list(names or [])
+    if path:
+        return f"{type(model).__name__}:{os.path.abspath(str(path))}:{names}", True
+    # 没有路径的模型只能在当前进程内区分
+    return f"{type(model).__name__}:{id(model)}:{names}", False
+
+
+def _freeze(value):
+    """缓存内部保存的不可变形式：每张牌为 (id, 类别名, 置信度, 框元组)，整体为元组"""
+    hand_tiles, hand_string = value
+    return tuple((t[0], t[1], t[2], tuple(t[3])) for t in hand_tiles), hand_string
+
+
+def _thaw(value):
+    """返回给调用方的副本：列表由调用方独占，修改它不会影响之后的命中结果"""
+    hand_tiles, hand_string = value
+    return list(hand_tiles), hand_string
+
+
+class PerceptionCache:
+    """
+    perceive() / perceive_topk() / perceive_table() 结果的两级缓存，值为 (hand_tiles, hand_string)；
+    perceive_topk 的槽位见 hypotheses.slots_to_rows，perceive_table 的第二项为 TableState.dumps() 的 JSON
+    内部按不可变形式保存，每次命中都返回新的列表
+
+    计数：memory_hits / disk_hits / misses
+    """
+
+    def __init__(self, max_entries=CACHE_MEMORY_ENTRIES, disk_dir=CACHE_DIR, max_disk_mb=CACHE_DISK_MB):
+        """
+        :param max_entries: 内存中最多保存的条目数
+        :param disk_dir: 磁盘缓存目录，为空时只用内存
+        :param max_disk_mb: 磁盘缓存总大小上限（MB）
+        """
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir or None
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_sizes = {}
+        self._disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    # ---------- 键 ----------
+
+    def key(self, model, crop, **params):
+        """
+        缓存键：模型标识 + 影响结果的参数 + 裁剪图的形状和像素内容
+
+        Returns:
+            (键, 是否可以写入磁盘)
+        """
+        fingerprint, persistent = model_fingerprint(model)
+        # sha256 在有 SHA 指令的 CPU 上比 blake2b 快一倍多
+        h = hashlib.sha256()
+        h.update(fingerprint.encode("utf-8"))
+        h.update(repr(sorted(params.items())).encode("utf-8"))
+        h.update(repr((crop.shape, crop.dtype.str)).encode("utf-8"))
+        h.update(np.ascontiguousarray(crop).data)
+        return h.hexdigest()[:32], persistent
+
+    # ---------- 读写 ----------
+
+    def get(self, key):
+        """命中时返回 (hand_tiles, hand_string)，否则返回 None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return _thaw(value)
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            value = _freeze(value)
+            self._put_memory(key, value)
+            return _thaw(value)
+
+    def put(self, key, value, persistent=True):
+        value = _freeze(value)
+        with self._lock:
+            self._put_memory(key, value)
+        if persistent and self.disk_dir:
+            self._write_disk(key, value)
+
+    def _put_memory(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """清空内存缓存（磁盘文件保留）"""
+        with self._lock:
+            self._memory.clear()
+
+    # ---------- 磁盘 ----------
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key + ".json")
+
+    def _scan_disk(self):
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                size = os.path.getsize(os.path.join(self.disk_dir, name))
+                self._disk_sizes[name[:-5]] = size
+                self._disk_bytes += size
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # 更新访问时间，淘汰时按最久未访问的顺序
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        tiles = [(t[0], t[1], t[2], tuple(t[3])) for t in data["hand_tiles"]]
+        return tiles, data["hand_string"]
+
+    def _write_disk(self, key, value):
+        hand_tiles, hand_string = value
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"hand_tiles": hand_tiles, "hand_string": hand_string}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"写入识别缓存失败: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += size - self._disk_sizes.get(key, 0)
+            self._disk_sizes[key] = size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """按访问时间从旧到新删除，直到总大小降到上限的 90%"""
+        def atime(k):
+            try:
+                return os.path.getmtime(self._path(k))
+            except OSError:
+                return 0.0
+
+        target = self.max_disk_bytes * 0.9
+        for key in sorted(self._disk_sizes, key=atime):
+            if self._disk_bytes <= target:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self._disk_bytes -= self._disk_sizes.pop(key)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_sizes),
+            "disk_bytes": self._disk_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+# 进程内共享的识别缓存
+perception_cache = PerceptionCache()
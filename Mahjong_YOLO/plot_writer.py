@@ -0,0 +1,75 @@
+import os
+import queue
+import threading
+
+import cv2
+
+# 识别可视化结果的默认保存路径
+DEFAULT_PLOT_PATH = "Mahjong_YOLO/prediction_result.jpg"
+
+
+class PlotWriter:
+    """
+    识别可视化的后台写盘线程：
+    perceive() 只把识别结果放进一个有界队列就立即返回，
+    画框（Results.plot）和 JPEG 编码写盘都在后台线程完成；
+    写盘跟不上时直接丢弃新来的结果，不会反过来拖慢识别
+    """
+
+    def __init__(self, maxsize=1):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="plot-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, result, save_path=DEFAULT_PLOT_PATH):
+        """
+        提交一次识别结果（需提供 plot() 方法）等待后台绘制保存
+
+        Returns:
+            bool: 是否成功入队；队列已满时丢弃并返回 False
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((result, save_path))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            result, save_path = self._queue.get()
+            try:
+                self._write(result.plot(), save_path)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"保存识别可视化失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _write(image, save_path):
+        # 先写临时文件再原子替换，读图的一方不会看到写了一半的文件
+        root, ext = os.path.splitext(save_path)
+        tmp_path = f"{root}.tmp{ext}"
+        if not cv2.imwrite(tmp_path, image):
+            raise IOError(f"无法写入 {tmp_path}")
+        os.replace(tmp_path, save_path)
+
+    def flush(self):
+        """阻塞等待队列中已提交的结果全部写完"""
+        self._queue.join()
+
+
+# 进程内共享的写盘线程
+plot_writer = PlotWriter()
@@ -0,0 +1,312 @@
+import json
+
+import numpy as np
+
+from Mahjong_YOLO.hypotheses import (CANDIDATE_CONF, HandHypotheses, confident_result, hand_slots, slots_from_rows,
+                                     slots_to_rows)
+from Mahjong_YOLO.layout_calibration import get_layout
+from Mahjong_YOLO.model_registry import DEFAULT_BACKEND, DEFAULT_WEIGHTS
+from Mahjong_YOLO.model_tiers import DEFAULT_TIER, resolve_model
+from Mahjong_YOLO.plot_writer import DEFAULT_PLOT_PATH, plot_writer
+from Mahjong_YOLO.test import HAND_REGION, MODEL_INPUT_SIZE, PREDICT_CONF, _detect_full_frame, to_bgr_array
+from Mahjong_YOLO.tile_lookup import counts_to_hand_string, get_class_lookup
+
+# 座位：0 本家（下方），1 下家（右侧），2 对家（上方），3 上家（左侧）
+SEATS = (0, 1, 2, 3)
+
+# 牌桌各区域 (x1, y1, x2, y2)，640x640 坐标系，默认值对应 16:9 全屏的常见布局（近似值），
+# 不同客户端/分辨率请按实际截图修改；
+# 检测框按中心点归入字典顺序中第一个包含它的区域，各区域之间不要重叠
+TABLE_REGIONS = {
+    "hand": HAND_REGION,
+    "river_0": (235, 375, 425, 470),
+    "river_1": (425, 215, 505, 400),
+    "river_2": (235, 125, 425, 210),
+    "river_3": (150, 215, 235, 400),
+    "meld_0": (610, 520, 640, 620),
+    "meld_1": (560, 60, 640, 380),
+    "meld_2": (160, 0, 420, 60),
+    "meld_3": (0, 260, 80, 530),
+    "dora": (0, 0, 160, 60),
+}
+
+
+def _reading_order(seat, centers, unit):
+    """
+    各家牌河/副露按该家视角的阅读顺序排序：
+    本家从左到右、从上到下；其余三家按牌桌旋转方向依次类推
+    unit 为牌的大致尺寸，用来把同一行/列的坐标量化到一起
+    """
+    cx, cy = centers[:, 0], centers[:, 1]
+    if seat == 0:
+        major, minor = np.round(cy / unit), cx
+    elif seat == 1:
+        major, minor = np.round(cx / unit), -cy
+    elif seat == 2:
+        major, minor = np.round(-cy / unit), -cx
+    else:
+        major, minor = np.round(-cx / unit), cy
+    return np.lexsort((minor, major))
+
+
+class TileAllocator:
+    """为 34 编码分配不重复的 136 编码；赤宝牌固定使用 RED_MAN/RED_PIN/RED_SOU 那一张"""
+
+    RED_136 = {4: 16, 13: 52, 22: 88}
+
+    def __init__(self):
+        self._used = set()
+
+    def take(self, tile_34, is_aka=False):
+        if is_aka and tile_34 in self.RED_136 and self.RED_136[tile_34] not in self._used:
+            tile_136 = self.RED_136[tile_34]
+        else:
+            red = self.RED_136.get(tile_34)
+            candidates = [t for t in range(tile_34 * 4, tile_34 * 4 + 4) if t != red] + \
+                ([red] if red is not None else [])
+            tile_136 = next((t for t in candidates if t not in self._used), tile_34 * 4)
+        self._used.add(tile_136)
+        return tile_136
+
+
+class TableState:
+    """
+    一帧截图识别出的完整牌桌状态（34 编码），
+    可以直接用于填充 world_model 中的 GameTable / Player
+    """
+
+    def __init__(self):
+        self.hand = []                       # 本家手牌（从左到右）
+        self.rivers = [[] for _ in SEATS]    # 各家牌河（按打出顺序的近似）
+        self.melds = [[] for _ in SEATS]     # 各家副露，每组为一个 34 编码列表
+        self.dora_indicators = []            # 宝牌指示牌
+        self.aka = {}                        # (区域名, 序号) -> 是否赤宝牌
+        self.unassigned = 0                  # 不在任何区域内的检测框数量
+        self.hand_hypotheses = None          # perceive_table(topk=...) 时手牌各槽位的候选（HandHypotheses）
+
+    @property
+    def hand_string(self):
+        return counts_to_hand_string(np.bincount(np.asarray(self.hand, dtype=np.intp), minlength=34))
+
+    def visible_counts(self, include_hand=True):
+        """所有可见牌（手牌、牌河、副露、宝牌指示牌）每种的数量，长度 34"""
+        tiles = list(self.dora_indicators)
+        for river in self.rivers:
+            tiles.extend(river)
+        for melds in self.melds:
+            for meld in melds:
+                tiles.extend(meld)
+        if include_hand:
+            tiles.extend(self.hand)
+        return np.bincount(np.asarray(tiles, dtype=np.intp), minlength=34)
+
+    def to_dict(self):
+        return {
+            "hand": self.hand_string,
+            "rivers": [list(r) for r in self.rivers],
+            "melds": [[list(m) for m in ms] for ms in self.melds],
+            "dora_indicators": list(self.dora_indicators),
+        }
+
+    def dumps(self):
+        """序列化为 JSON 字符串（识别缓存使用，不含 hand_hypotheses）"""
+        return json.dumps({
+            "hand": self.hand, "rivers": self.rivers, "melds": self.melds,
+            "dora_indicators": self.dora_indicators, "aka": [list(k) for k in self.aka],
+            "unassigned": self.unassigned,
+        })
+
+    @classmethod
+    def loads(cls, text):
+        data = json.loads(text)
+        state = cls()
+        state.hand = data["hand"]
+        state.rivers = data["rivers"]
+        state.melds = data["melds"]
+        state.dora_indicators = data["dora_indicators"]
+        state.aka = {(name, i): True for name, i in data["aka"]}
+        state.unassigned = data["unassigned"]
+        return state
+
+    def _is_aka(self, area, index):
+        return self.aka.get((area, index), False)
+
+    def apply_to_game_table(self, table, self_seat=0):
+        """
+        把识别结果写入 GameTable：river / meld / dora_indicators；
+        table.players 中座位为 self_seat 的玩家同时写入手牌
+
+        座位编号以本家为 0 逆时针排列，self_seat 用于换算到牌桌上的绝对座位
+        """
+        from world_model.mahjong_meld import Meld
+        from world_model.mahjong_tile import MahjongTile
+
+        allocator = TileAllocator()
+
+        def to_tile(tile_34, area, index):
+            return MahjongTile(allocator.take(tile_34, self._is_aka(area, index)))
+
+        hand = [to_tile(t, "hand", i) for i, t in enumerate(self.hand)]
+
+        table.river = [[] for _ in SEATS]
+        table.meld = [[] for _ in SEATS]
+        for seat in SEATS:
+            abs_seat = (seat + self_seat) % 4
+            table.river[abs_seat] = [to_tile(t, f"river_{seat}", i) for i, t in enumerate(self.rivers[seat])]
+            index = 0
+            for group in self.melds[seat]:
+                tiles_136 = []
+                for t in group:
+                    tiles_136.append(allocator.take(t, self._is_aka(f"meld_{seat}", index)))
+                    index += 1
+                table.meld[abs_seat].append(Meld(_guess_meld_type(group), tiles=tiles_136, by_whom=abs_seat))
+
+        table.dora_indicators = [to_tile(t, "dora", i) for i, t in enumerate(self.dora_indicators)]
+        table.dora_indicators_pointer = len(table.dora_indicators)
+
+        for player in getattr(table, "players", None) or []:
+            if player.seat == self_seat:
+                player.hand = hand
+            player.river = table.river[player.seat]
+            player.meld = table.meld[player.seat]
+        return table
+
+
+def _guess_meld_type(group):
+    from world_model.mahjong_meld import Meld
+
+    if len(group) == 4:
+        return Meld.KAN
+    if len(set(group)) == 1:
+        return Meld.PON
+    return Meld.CHI
+
+
+def _split_groups(seat, centers, unit, order):
+    """把一家副露区的牌按间隙切成若干组（组内紧挨，组间有明显空隙）"""
+    axis = 0 if seat in (0, 2) else 1
+    gaps = np.abs(np.diff(centers[order, axis]))
+    cuts = np.flatnonzero(gaps > unit * 1.5) + 1
+    return np.split(order, cuts)
+
+
+def classify_detections(xyxy, conf, cls, lookup, width, height, regions=None, min_conf=0.0):
+    """
+    把一帧的全部检测框按中心点归入各牌桌区域，得到 TableState
+
+    Args:
+        xyxy, conf, cls: perceive 内部得到的检测数组（原图坐标）
+        lookup: ClassLookup
+        width, height: 原图尺寸
+        regions: 区域配置（640 坐标系），默认 TABLE_REGIONS
+    """
+    regions = regions or TABLE_REGIONS
+    state = TableState()
+    keep = conf >= min_conf
+    tiles_34, aka = lookup.decode(cls)
+    keep &= tiles_34 >= 0
+
+    scale = np.array([width, height], dtype=np.float32) / MODEL_INPUT_SIZE
+    centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+    sizes = xyxy[:, 2:] - xyxy[:, :2]
+    assigned = np.zeros(len(xyxy), dtype=bool)
+
+    for name, (x1, y1, x2, y2) in regions.items():
+        rx1, ry1 = x1 * scale[0], y1 * scale[1]
+        rx2, ry2 = x2 * scale[0], y2 * scale[1]
+        mask = keep & ~assigned & (centers[:, 0] >= rx1) & (centers[:, 0] < rx2) \
+            & (centers[:, 1] >= ry1) & (centers[:, 1] < ry2)
+        idx = np.flatnonzero(mask)
+        assigned |= mask
+        if len(idx) == 0:
+            continue
+
+        area, _, seat = name.partition("_")
+        seat = int(seat) if seat else 0
+        unit = float(np.median(np.minimum(sizes[idx, 0], sizes[idx, 1]))) or 1.0
+
+        if area == "hand":
+            order = idx[np.argsort(centers[idx, 0], kind="stable")]
+            state.hand = tiles_34[order].tolist()
+        elif area == "dora":
+            order = idx[np.argsort(centers[idx, 0], kind="stable")]
+            state.dora_indicators = tiles_34[order].tolist()
+        elif area == "river":
+            order = idx[_reading_order(seat, centers[idx], unit)]
+            state.rivers[seat] = tiles_34[order].tolist()
+        elif area == "meld":
+            order = idx[_reading_order(seat, centers[idx], unit)]
+            groups = _split_groups(seat, centers, unit, order)
+            state.melds[seat] = [tiles_34[g].tolist() for g in groups]
+        else:
+            continue
+
+        for i, j in enumerate(order):
+            if aka[j]:
+                state.aka[(name, i)] = True
+
+    state.unassigned = int(np.count_nonzero(keep & ~assigned))
+    return state
+
+
+def perceive_table(image=None, model=None, weights=DEFAULT_WEIGHTS, regions=None, min_conf=0.0,
+                   plot=False, plot_path=DEFAULT_PLOT_PATH, backend=DEFAULT_BACKEND, tier=DEFAULT_TIER,
+                   layout=None, topk=0, cache=None, iou_thres=0.6, uncertain_ratio=0.5, low_conf=0.5):
+    """
+    一次推理识别整张牌桌：手牌、四家牌河、四家副露、宝牌指示牌
+
+    Args:
+        image: 同 perceive
+        regions: 区域配置；为 None 时使用布局标定结果（layout，或按分辨率读取缓存），
+            没有标定过时使用 TABLE_REGIONS
+        topk: 大于 0 时用同一次推理的结果按 perceive_topk 的方式给出手牌各槽位的前 topk 个候选，
+            存入 TableState.hand_hypotheses（iou_thres / uncertain_ratio / low_conf 含义同 perceive_topk）
+        cache: PerceptionCache；按整张截图的像素内容缓存，同一画面直接返回上次的结果
+
+    Returns:
+        TableState
+    """
+    if model is None:
+        model = resolve_model(weights, backend, tier)
+    img = to_bgr_array(image)
+    h, w = img.shape[:2]
+    if regions is None:
+        if layout is None:
+            layout = get_layout(w, h)
+        if layout is not None:
+            regions = layout.regions
+    regions = regions or TABLE_REGIONS
+
+    cache_key = None
+    if cache is not None:
+        cache_key, persistent = cache.key(model, img, table=True, regions=sorted(regions.items()),
+                                          min_conf=min_conf, topk=topk, iou_thres=iou_thres,
+                                          candidate_conf=CANDIDATE_CONF)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            rows, text = cached
+            state = TableState.loads(text)
+            if topk > 0:
+                state.hand_hypotheses = HandHypotheses(slots_from_rows(rows), uncertain_ratio, low_conf)
+            return state
+
+    if topk > 0:
+        # 手牌候选需要低于默认阈值的框；整桌的其余部分仍只用达到默认阈值的框
+        (xyxy, conf, cls), r = _detect_full_frame(model, img, conf=CANDIDATE_CONF)
+        state = classify_detections(xyxy, conf, cls, get_class_lookup(model), w, h, regions,
+                                    max(min_conf, PREDICT_CONF))
+        slots = hand_slots(model, xyxy, conf, cls, r, regions.get("hand", HAND_REGION), w, h, topk, min_conf,
+                           iou_thres)
+        state.hand_hypotheses = HandHypotheses(slots, uncertain_ratio, low_conf)
+        if r is not None:
+            r = confident_result(r, conf)
+    else:
+        (xyxy, conf, cls), r = _detect_full_frame(model, img)
+        state = classify_detections(xyxy, conf, cls, get_class_lookup(model), w, h, regions, min_conf)
+
+    if plot and r is not None:
+        plot_writer.submit(r, plot_path)
+    if cache_key is not None:
+        rows = slots_to_rows(state.hand_hypotheses.slots) if topk > 0 else []
+        cache.put(cache_key, (rows, state.dumps()), persistent)
+    return state
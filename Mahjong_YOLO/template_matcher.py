@@ -0,0 +1,361 @@
+"""
+级联手牌识别：同一客户端的牌面来自固定的贴图，先用模板匹配识别每个手牌槽位，
+只有匹配不确定的槽位（或手牌布局发生变化）才交给 YOLO 模型。
+
+贴图库（SpriteAtlas）不需要人工准备：每次 YOLO 高置信度识别出的手牌都会裁剪下来加入贴图库，
+并可保存到磁盘供下次启动复用。
+
+    capture = open_game_capture()
+    recognizer = CascadedRecognizer(layout=capture.layout)     # 只截取游戏区域时需要传入对应的布局
+    hand_tiles, hand_string = recognizer.recognize(capture.grab())
+    print(recognizer.stats())
+"""
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from Mahjong_YOLO.model_registry import DEFAULT_BACKEND, DEFAULT_WEIGHTS
+from Mahjong_YOLO.model_tiers import DEFAULT_TIER, resolve_model
+from Mahjong_YOLO.test import (MODEL_INPUT_SIZE, _detect_regions, perceive, resolve_hand_region,
+                               scale_region, to_bgr_array)
+from Mahjong_YOLO.tile_lookup import counts_to_hand_string, get_class_lookup
+
+# 贴图库默认保存位置
+ATLAS_PATH = "Mahjong_YOLO/sprite_atlas.npz"
+
+
+class SpriteAtlas:
+    """
+    牌面贴图库：每个 YOLO 类别保存若干张归一化后的彩色小图，
+    与槽位裁剪图做归一化互相关（零均值、单位范数后的点积），一次矩阵乘法匹配全部槽位
+    """
+
+    def __init__(self, names, size=(24, 32), max_per_class=4, novelty=0.98):
+        """
+        :param names: 模型类别名 {id: name}，贴图按类别 ID 存放
+        :param size: 匹配用的小图尺寸 (宽, 高)
+        :param max_per_class: 每个类别最多保存的贴图数（不同光效/选中状态等）
+        :param novelty: 与同类已有贴图的相关系数低于该值时才作为新贴图加入
+        """
+        self.names = dict(names) if isinstance(names, dict) else dict(enumerate(names))
+        self.size = size
+        self.max_per_class = max_per_class
+        self.novelty = novelty
+        self._vectors = np.zeros((0, size[0] * size[1] * 3), dtype=np.float32)
+        self._labels = np.zeros(0, dtype=np.intp)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._labels)
+
+    def normalize(self, crops):
+        """裁剪图列表 -> (N, D) 零均值、单位范数的向量"""
+        vectors = np.empty((len(crops), self._vectors.shape[1]), dtype=np.float32)
+        for i, crop in enumerate(crops):
+            small = cv2.resize(crop, self.size, interpolation=cv2.INTER_AREA)
+            vectors[i] = small.reshape(-1)
+        vectors -= vectors.mean(axis=1, keepdims=True)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-6
+        return vectors
+
+    def add(self, crops, cls_ids):
+        """加入一批已知类别的裁剪图，与已有贴图几乎相同的会被忽略"""
+        if len(crops) == 0:
+            return 0
+        vectors = self.normalize(crops)
+        added = 0
+        with self._lock:
+            for vec, cls_id in zip(vectors, np.asarray(cls_ids, dtype=np.intp)):
+                same = self._labels == cls_id
+                if np.count_nonzero(same) >= self.max_per_class:
+                    continue
+                if np.any(same) and float(np.max(self._vectors[same] @ vec)) >= self.novelty:
+                    continue
+                self._vectors = np.vstack([self._vectors, vec[None]])
+                self._labels = np.append(self._labels, cls_id)
+                added += 1
+        return added
+
+    def match(self, crops, tile34=None):
+        """
+        匹配一批槽位裁剪图
+
+        Args:
+            tile34: 类别 ID -> 34 编码的数组（ClassLookup.tile34）；给出时“次优”只在不同的牌之间比较，
+                同一种牌的赤/非赤贴图不会互相压低余量
+
+        Returns:
+            (cls_ids, scores, margins)：最佳类别、最佳相关系数、与次优（不同牌）的差值；贴图库为空时返回 None
+        """
+        with self._lock:
+            vectors, labels = self._vectors, self._labels
+        if len(labels) == 0 or len(crops) == 0:
+            return None
+
+        sims = self.normalize(crops) @ vectors.T
+        best = np.argmax(sims, axis=1)
+        rows = np.arange(len(crops))
+        cls_ids = labels[best]
+        scores = sims[rows, best]
+
+        keys = tile34[labels] if tile34 is not None else labels
+        other = keys[None, :] != keys[best][:, None]
+        runner_up = np.where(other, sims, -1.0).max(axis=1)
+        return cls_ids, scores, scores - runner_up
+
+    def save(self, path=ATLAS_PATH):
+        with self._lock:
+            np.savez_compressed(path, vectors=self._vectors, labels=self._labels,
+                                size=np.array(self.size),
+                                names=np.array([self.names[k] for k in sorted(self.names)]))
+
+    @classmethod
+    def load(cls, path, names, **kwargs):
+        """读取贴图库；类别名与当前模型不一致（换了模型）时返回空库"""
+        atlas = cls(names, **kwargs)
+        if not os.path.exists(path):
+            return atlas
+        data = np.load(path)
+        saved_names = data["names"].tolist()
+        if saved_names != [atlas.names[k] for k in sorted(atlas.names)] \
+                or tuple(data["size"].tolist()) != atlas.size:
+            return atlas
+        atlas._vectors = data["vectors"].astype(np.float32)
+        atlas._labels = data["labels"].astype(np.intp)
+        return atlas
+
+
+def _crop(img, box, pad=0):
+    h, w = img.shape[:2]
+    x1, y1, x2, y2 = box
+    return img[max(int(y1) - pad, 0):min(int(round(y2)) + pad, h),
+               max(int(x1) - pad, 0):min(int(round(x2)) + pad, w)]
+
+
+def _box_iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / (area + areas - inter + 1e-6)
+
+
+class CascadedRecognizer:
+    """
+    两级手牌识别器：
+    1. 槽位来自上一次 YOLO 识别出的手牌框；手牌区域中槽位以外的部分（牌与牌的间隙、摸牌位等）
+       与当时相比明显变化时，视为布局变化（摸切、副露、换分辨率），整帧交给 YOLO
+    2. 布局未变时逐槽位做模板匹配，相关系数和余量都达标的槽位直接采用
+    3. 不达标的槽位只把它们所在的条带裁剪出来交给 YOLO（roi 推理）；仍对不上的再整帧回退
+
+    每次 YOLO 的高置信度结果都会更新槽位和贴图库
+
+    计数：
+        frames          —— 识别的帧数
+        template_frames —— 完全由模板匹配完成的帧数
+        partial_frames  —— 只有部分槽位回退到 YOLO 的帧数
+        full_frames     —— 整帧回退到 YOLO 的帧数（fallback_reasons 中按原因细分）
+    """
+
+    def __init__(self, model=None, weights=DEFAULT_WEIGHTS, backend=DEFAULT_BACKEND, tier=DEFAULT_TIER,
+                 atlas_path=ATLAS_PATH, min_score=0.92, min_margin=0.04, learn_conf=0.7,
+                 region=None, thumb_size=(108, 16), pixel_threshold=24, min_changed_pixels=8, layout=None):
+        """
+        :param model: 已加载好的模型，为 None 时与 perceive() 一样按 weights/backend/tier 获取
+        :param atlas_path: 贴图库文件，为 None 时不读写磁盘
+        :param min_score: 模板匹配的最低相关系数
+        :param min_margin: 最佳匹配与次优（不同牌）之间的最小差值
+        :param learn_conf: YOLO 置信度达到该值的手牌才会加入贴图库
+        :param region: 手牌区域（640 坐标系），为 None 时使用布局标定结果（没有标定过时为 HAND_REGION）
+        :param thumb_size / pixel_threshold / min_changed_pixels: 布局变化检测参数，含义同 HandChangeGate
+        :param layout: 牌桌布局标定结果，同 perceive() 的 layout；截图只截取了游戏区域时必须传入，
+            否则按截图尺寸查不到标定结果，会退回整屏的 HAND_REGION
+        """
+        self.model = model if model is not None else resolve_model(weights, backend, tier)
+        self.lookup = get_class_lookup(self.model)
+        self.atlas_path = atlas_path
+        self.atlas = SpriteAtlas.load(atlas_path, self.model.names) if atlas_path \
+            else SpriteAtlas(self.model.names)
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.learn_conf = learn_conf
+        self.region = region
+        self.layout = layout
+        self.thumb_size = thumb_size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_pixels = min_changed_pixels
+
+        self._name_to_id = {name: int(k) for k, name in self.atlas.names.items()}
+        self._slots = None          # (N, 4) 原图坐标的槽位框，从左到右
+        self._frame_size = None
+        self._gap_mask = None       # 缩略图中槽位以外的像素
+        self._gap_reference = None
+        self._lock = threading.Lock()
+
+        self.frames = 0
+        self.template_frames = 0
+        self.partial_frames = 0
+        self.full_frames = 0
+        self.slots_matched = 0
+        self.slots_fallback = 0
+        self.fallback_reasons = {}
+
+    # ---------- 布局 ----------
+
+    def _hand_rect(self, w, h):
+        region = self.region if self.region is not None else resolve_hand_region(w, h, self.layout)
+        return scale_region(region, w, h, MODEL_INPUT_SIZE)
+
+    def _thumb(self, img):
+        h, w = img.shape[:2]
+        x1, y1, x2, y2 = self._hand_rect(w, h)
+        gray = cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA)
+
+    def _set_layout(self, img, boxes):
+        """以 YOLO 识别出的手牌框作为新的槽位，并记录槽位以外区域的参照缩略图"""
+        h, w = img.shape[:2]
+        x1, y1, x2, y2 = self._hand_rect(w, h)
+        sx = self.thumb_size[0] / max(x2 - x1, 1)
+        mask = np.ones(self.thumb_size[::-1], dtype=bool)
+        for bx1, _, bx2, _ in boxes:
+            c1 = max(int((bx1 - x1) * sx) - 1, 0)
+            c2 = min(int(np.ceil((bx2 - x1) * sx)) + 1, self.thumb_size[0])
+            mask[:, c1:c2] = False
+        self._slots = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self._frame_size = (w, h)
+        self._gap_mask = mask
+        self._gap_reference = self._thumb(img)
+
+    def _layout_changed(self, img):
+        h, w = img.shape[:2]
+        if self._slots is None or len(self._slots) == 0:
+            return "no_layout"
+        if self._frame_size != (w, h):
+            return "resolution"
+        diff = cv2.absdiff(self._thumb(img), self._gap_reference)
+        if np.count_nonzero((diff > self.pixel_threshold) & self._gap_mask) >= self.min_changed_pixels:
+            return "layout"
+        return None
+
+    # ---------- 识别 ----------
+
+    def _learn(self, img, boxes, cls_ids, confs):
+        keep = np.asarray(confs) >= self.learn_conf
+        if not np.any(keep):
+            return
+        crops = [_crop(img, b) for b, k in zip(boxes, keep) if k]
+        self.atlas.add(crops, np.asarray(cls_ids)[keep])
+
+    def _full_fallback(self, img, reason, perceive_kwargs):
+        self.full_frames += 1
+        self.fallback_reasons[reason] = self.fallback_reasons.get(reason, 0) + 1
+
+        perceive_kwargs.setdefault("plot", False)
+        perceive_kwargs.setdefault("layout", self.layout)
+        hand_tiles, hand_string = perceive(img, model=self.model, **perceive_kwargs)
+        if hand_tiles:
+            boxes = [t[3] for t in hand_tiles]
+            cls_ids = [self._name_to_id[t[1]] for t in hand_tiles]
+            self._learn(img, boxes, cls_ids, [t[2] for t in hand_tiles])
+            self._set_layout(img, boxes)
+        else:
+            self._slots = None
+        return hand_tiles, hand_string
+
+    def _yolo_slots(self, img, slot_idx):
+        """
+        只把低置信度槽位所在的条带交给 YOLO，按 IoU 把检测框对应回槽位
+
+        Returns:
+            (cls_ids, confs) 或 None（有槽位没有对应的检测框）
+        """
+        h, w = img.shape[:2]
+        boxes = self._slots[slot_idx]
+        x1, y1 = boxes[:, :2].min(axis=0)
+        x2, y2 = boxes[:, 2:].max(axis=0)
+        region = (x1 * MODEL_INPUT_SIZE / w, y1 * MODEL_INPUT_SIZE / h,
+                  x2 * MODEL_INPUT_SIZE / w, y2 * MODEL_INPUT_SIZE / h)
+        (xyxy, conf, cls), _ = _detect_regions(self.model, img, {"slots": region})
+        if len(xyxy) == 0:
+            return None
+
+        cls_ids = np.empty(len(boxes), dtype=np.intp)
+        confs = np.empty(len(boxes), dtype=np.float32)
+        for i, box in enumerate(boxes):
+            iou = _box_iou(box, xyxy)
+            j = int(np.argmax(iou))
+            if iou[j] < 0.5:
+                return None
+            cls_ids[i], confs[i] = cls[j], conf[j]
+        return cls_ids, confs
+
+    def recognize(self, image=None, **perceive_kwargs):
+        """
+        识别手牌，返回值与 perceive() 相同：(hand_tiles, hand_string)
+
+        perceive_kwargs 在整帧回退时原样传给 perceive()（默认 plot=False，layout 为构造时传入的布局）
+        """
+        img = to_bgr_array(image)
+        with self._lock:
+            self.frames += 1
+            reason = self._layout_changed(img)
+            if reason is None and len(self.atlas) == 0:
+                reason = "empty_atlas"
+            if reason is not None:
+                return self._full_fallback(img, reason, perceive_kwargs)
+
+            crops = [_crop(img, box) for box in self._slots]
+            cls_ids, scores, margins = self.atlas.match(crops, self.lookup.tile34)
+            confs = scores.astype(np.float32)
+            weak = np.flatnonzero((scores < self.min_score) | (margins < self.min_margin))
+
+            if len(weak):
+                found = self._yolo_slots(img, weak)
+                if found is None:
+                    return self._full_fallback(img, "slot_mismatch", perceive_kwargs)
+                cls_ids[weak], confs[weak] = found
+                self._learn(img, self._slots[weak], found[0], found[1])
+                self.partial_frames += 1
+            else:
+                self.template_frames += 1
+            self.slots_matched += len(self._slots) - len(weak)
+            self.slots_fallback += len(weak)
+
+            names = self.model.names
+            hand_tiles = [
+                (box[0], names[c], conf, tuple(box))
+                for box, c, conf in zip(self._slots.tolist(), cls_ids.tolist(), confs.tolist())
+            ]
+            return hand_tiles, counts_to_hand_string(self.lookup.counts(cls_ids))
+
+    __call__ = recognize
+
+    def save_atlas(self):
+        """把贴图库写到 atlas_path，下次启动时直接使用"""
+        if self.atlas_path:
+            self.atlas.save(self.atlas_path)
+
+    def reset(self):
+        """丢弃当前槽位，下一帧必定整帧交给 YOLO"""
+        with self._lock:
+            self._slots = None
+
+    def stats(self):
+        fallback = self.partial_frames + self.full_frames
+        slots = self.slots_matched + self.slots_fallback
+        return {
+            "frames": self.frames,
+            "template_frames": self.template_frames,
+            "partial_frames": self.partial_frames,
+            "full_frames": self.full_frames,
+            "fallback_rate": fallback / self.frames if self.frames else 0.0,
+            "slot_fallback_rate": self.slots_fallback / slots if slots else 0.0,
+            "atlas_size": len(self.atlas),
+            "fallback_reasons": dict(self.fallback_reasons),
+        }
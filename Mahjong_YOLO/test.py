@@ -1,63 +1,325 @@
-from ultralytics import YOLO
 import cv2
+import numpy as np
 import os
+import sys
+import threading
+
+if __package__ in (None, ""):
+    # 直接以脚本运行（python Mahjong_YOLO/test.py）时把仓库根目录加入搜索路径，使下面的包内导入可用
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Mahjong_YOLO.model_registry import DEFAULT_BACKEND, DEFAULT_WEIGHTS
+from Mahjong_YOLO.model_tiers import DEFAULT_TIER, resolve_model
+from Mahjong_YOLO.plot_writer import DEFAULT_PLOT_PATH, plot_writer
+from Mahjong_YOLO.tile_lookup import counts_to_hand_string, get_class_lookup, tile_name_to_34
+
+# 未传入图像时默认读取的截图
+DEFAULT_IMAGE_PATH = "Mahjong_YOLO/test.png"
+
+# 模型输入尺寸
+MODEL_INPUT_SIZE = 640
+# 玩家手牌区域 (x1, y1, x2, y2)，坐标基于缩放到 640x640 后的图像
+HAND_REGION = (70, 530, 610, 610)
+# roi 模式下需要裁剪推理的牌桌区域（640 坐标系），可按需加入其他区域
+INFERENCE_REGIONS = {
+    "hand": HAND_REGION,
+}
+# roi 模式裁剪时四周额外保留的边距（640 坐标系），避免边缘的牌被截断
+ROI_MARGIN = 6
+# 模型预测的默认置信度阈值（与 ultralytics 的默认值相同）
+PREDICT_CONF = 0.25
+
+
+def scale_region(region, width, height, ref_size=MODEL_INPUT_SIZE):
+    """把 ref_size x ref_size 坐标系下的区域换算到 width x height 的原图上（取整像素）"""
+    x1, y1, x2, y2 = region
+    sx = width / ref_size
+    sy = height / ref_size
+    return int(x1 * sx), int(y1 * sy), int(round(x2 * sx)), int(round(y2 * sy))
+
+
+def to_bgr_array(image):
+    """
+    将输入图像统一转换为 OpenCV 使用的 BGR uint8 数组
 
+    Args:
+        image: 以下任意一种
+            - None: 读取 DEFAULT_IMAGE_PATH
+            - str / os.PathLike: 图片路径
+            - numpy.ndarray: 约定为 BGR（或 BGRA / 灰度），三通道时原样返回，不复制
+            - PIL.Image.Image: RGB / RGBA 等，拷贝一次后原地转换为 BGR
 
-def perceive():
-    # 1. 加载模型
-    model = YOLO("Mahjong_YOLO/trained_models_v2/yolo11m_best.pt")
-    # model = YOLO("trained_models_v2/yolo11m_best.pt")
-    # 2. 读取图片并调整大小到640x640
-    img = cv2.imread("Mahjong_YOLO/test.png")
-    # img = cv2.imread("test.png")
-    img_resized = cv2.resize(img, (640, 640))
+    Returns:
+        numpy.ndarray: HxWx3 的 BGR 数组
+    """
+    if image is None:
+        image = DEFAULT_IMAGE_PATH
+
+    if isinstance(image, (str, os.PathLike)):
+        img = cv2.imread(str(image))
+        if img is None:
+            raise FileNotFoundError(f"无法读取图片: {image}")
+        return img
+
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        if image.shape[2] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        return image
+
+    # PIL 图片：np.array 只拷贝一次像素，之后在同一块内存上原地做 RGB -> BGR
+    if image.mode == "RGBA":
+        return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGBA2BGR)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    arr = np.array(image)
+    cv2.cvtColor(arr, cv2.COLOR_RGB2BGR, dst=arr)
+    return arr
+
+
+def save_frame_async(img, save_path=DEFAULT_IMAGE_PATH):
+    """
+    调试用：在后台线程把 BGR 帧写到磁盘，不阻塞识别流程
 
-    # 3. 模型预测
-    results = model.predict(source=img_resized, imgsz=640)  # imgsz可以显式指定
+    Returns:
+        threading.Thread: 写盘线程（daemon）
+    """
+    def _write():
+        try:
+            cv2.imwrite(str(save_path), img)
+        except Exception as e:
+            print(f"保存调试截图失败: {e}")
+
+    thread = threading.Thread(target=_write, name="frame-writer", daemon=True)
+    thread.start()
+    return thread
+
+
+def letterbox(img, size=MODEL_INPUT_SIZE, stride=32, color=(114, 114, 114)):
+    """
+    等比缩放并补边：长边缩放到 size，短边只补齐到 stride 的整数倍（不会补成正方形），
+    这样细长的手牌条带只需要很少的像素参与推理
+
+    Returns:
+        (boxed, ratio, (pad_x, pad_y))：补边后的图像、缩放比例、左侧/上侧补边像素
+    """
+    h, w = img.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    if (new_w, new_h) != (w, h):
+        interp = cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR
+        img = cv2.resize(img, (new_w, new_h), interpolation=interp)
+
+    pad_w = (-new_w) % stride
+    pad_h = (-new_h) % stride
+    left, top = pad_w // 2, pad_h // 2
+    boxed = cv2.copyMakeBorder(img, top, pad_h - top, left, pad_w - left,
+                               cv2.BORDER_CONSTANT, value=color)
+    return boxed, ratio, (left, top)
+
+
+def boxes_to_arrays(boxes):
+    """
+    把 ultralytics 的 Boxes 一次性转成 numpy 数组（不逐框访问张量）
 
-    # 4. 收集玩家手牌区域的麻将牌
+    Returns:
+        (xyxy, conf, cls)：形状分别为 (N, 4) float32、(N,) float32、(N,) intp
+    """
+    data = boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    data = np.asarray(data, dtype=np.float32)
+    if data.size == 0:
+        return _empty_detections()
+    # 每行为 x1, y1, x2, y2, [track_id,] conf, cls
+    return data[:, :4], data[:, -2], data[:, -1].astype(np.intp)
+
+
+def _detect_full_frame(model, img, imgsz=MODEL_INPUT_SIZE, conf=PREDICT_CONF):
+    """
+    整张截图缩放到 imgsz x imgsz（默认 640）推理，框坐标换算回原图
+    conf 为预测时的置信度阈值，多假设识别需要更低的阈值来保留第二候选
+    """
+    h, w = img.shape[:2]
+    img_resized = cv2.resize(img, (imgsz, imgsz))
+    results = model.predict(source=img_resized, imgsz=imgsz, conf=conf)  # imgsz可以显式指定
     r = results[0]
-    hand_tiles = []
 
-    for box in r.boxes:
-        cls = int(box.cls[0])  # 类别ID
-        conf = float(box.conf[0])  # 置信度
-        x1, y1, x2, y2 = box.xyxy[0].tolist()  # 左上角和右下角坐标
-        tile = model.names[cls]  # 对应牌型
+    xyxy, conf, cls = boxes_to_arrays(r.boxes)
+    scale = np.array([w, h, w, h], dtype=np.float32) / imgsz
+    return (xyxy * scale, conf, cls), r
+
+
+def _detect_regions(model, img, regions, imgsz=MODEL_INPUT_SIZE):
+    """
+    只裁剪配置的牌桌区域（原分辨率）分别推理，框坐标换算回原图
+    imgsz 为推理时裁剪图长边缩放到的尺寸
+    """
+    h, w = img.shape[:2]
+    all_xyxy, all_conf, all_cls = [], [], []
+    first_result = None
+    for region in regions.values():
+        x1, y1, x2, y2 = region
+        x1, y1, x2, y2 = scale_region(
+            (x1 - ROI_MARGIN, y1 - ROI_MARGIN, x2 + ROI_MARGIN, y2 + ROI_MARGIN), w, h)
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, w), min(y2, h)
+        if x2 <= x1 or y2 <= y1:
+            continue
+
+        crop = img[y1:y2, x1:x2]
+        boxed, ratio, (pad_x, pad_y) = letterbox(crop, imgsz)
+        r = model.predict(source=boxed, imgsz=list(boxed.shape[:2]))[0]
+        if first_result is None:
+            first_result = r
+
+        xyxy, conf, cls = boxes_to_arrays(r.boxes)
+        pad = np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)
+        origin = np.array([x1, y1, x1, y1], dtype=np.float32)
+        all_xyxy.append((xyxy - pad) / ratio + origin)
+        all_conf.append(conf)
+        all_cls.append(cls)
+
+    if not all_xyxy:
+        return _empty_detections(), first_result
+    return (np.concatenate(all_xyxy), np.concatenate(all_conf), np.concatenate(all_cls)), first_result
+
+
+def _empty_detections():
+    return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.intp)
+
+
+def resolve_hand_region(width, height, layout=None):
+    """
+    手牌区域（640 坐标系）：优先使用传入的 / 已缓存的布局标定结果，否则为 HAND_REGION
+    """
+    if layout is None:
+        from Mahjong_YOLO.layout_calibration import get_layout
+
+        layout = get_layout(width, height)
+    if layout is not None and "hand" in layout.regions:
+        return layout.regions["hand"]
+    return HAND_REGION
+
+
+def select_in_region(xyxy, conf, region, min_conf=0.0):
+    """
+    用数组运算筛出完整落在 region 内且置信度不低于 min_conf 的框，并按 x1 从左到右排序
+
+    Returns:
+        numpy.ndarray: 选中框的下标（已按 x1 排序）
+    """
+    x1, y1, x2, y2 = region
+    mask = (xyxy[:, 0] >= x1) & (xyxy[:, 2] <= x2) & (xyxy[:, 1] >= y1) & (xyxy[:, 3] <= y2)
+    if min_conf > 0:
+        mask &= conf >= min_conf
+    idx = np.flatnonzero(mask)
+    return idx[np.argsort(xyxy[idx, 0], kind="stable")]
 
-        # 判断是否在玩家手牌区域
-        if x1 >= 70 and x2 <= 610 and y1 >= 530 and y2 <= 610:
-            hand_tiles.append((x1, tile, conf, (x1, y1, x2, y2)))
 
-    # 5. 按 x 坐标从左到右排序
-    hand_tiles.sort(key=lambda x: x[0])
+def collect_hand(model, detections, width, height, hand_region=HAND_REGION, min_conf=0.0):
+    """
+    从一帧的检测数组中取出手牌
 
-    # print("=== 玩家手牌区域（从左到右） ===")
-    for _, tile, conf, box_coords in hand_tiles:
-        x1, y1, x2, y2 = box_coords
-        # print(f"Tile: {tile}, Conf: {conf:.3f}, Box: ({x1:.1f}, {y1:.1f}, {x2:.1f}, {y2:.1f})")
+    Args:
+        detections: (xyxy, conf, cls)，原图坐标
+        width, height: 原图尺寸
+        hand_region: 手牌区域（640 坐标系）
+
+    Returns:
+        (hand_tiles, hand_string)
+    """
+    # 收集玩家手牌区域的麻将牌（区域、置信度筛选和排序都是整批数组运算）
+    xyxy, confs, classes = detections
+    region = np.array(hand_region, dtype=np.float32) * np.array([width, height, width, height]) / MODEL_INPUT_SIZE
+    order = select_in_region(xyxy, confs, region, min_conf)
+    hand_cls = classes[order]
+
+    # 已按 x 坐标从左到右排序，组装成 (x1, 牌名, 置信度, 坐标框)
+    names = model.names
+    hand_tiles = [
+        (box[0], names[c], conf, tuple(box))
+        for box, c, conf in zip(xyxy[order].tolist(), hand_cls.tolist(), confs[order].tolist())
+    ]
+
+    # 将牌列表转换为麻将字符串表示（类别ID 直接查表得到 34 编码）
+    hand_string = counts_to_hand_string(get_class_lookup(model).counts(hand_cls))
+    return hand_tiles, hand_string
 
-    # print(f'玩家手牌区域总共识别到 {len(hand_tiles)} 张牌')
 
-    # 6. 将牌列表转换为麻将字符串表示
-    hand_string = convert_tiles_to_mahjong_string_generic(hand_tiles)
+def perceive(image=None, model=None, weights=DEFAULT_WEIGHTS, debug_save_path=None,
+             roi=False, regions=None, plot=True, plot_path=DEFAULT_PLOT_PATH, min_conf=0.0,
+             backend=DEFAULT_BACKEND, tier=DEFAULT_TIER, imgsz=MODEL_INPUT_SIZE, layout=None, cache=None):
+    """
+    识别截图中的玩家手牌
+
+    Args:
+        image: 待识别图像，可以是内存中的 PIL 图片 / numpy 数组（BGR），
+            也可以是图片路径；为 None 时读取 Mahjong_YOLO/test.png
+        model: 已加载好的模型，为 None 时从进程内模型注册表获取（只加载一次）
+        weights: model 为 None 时使用的权重路径
+        debug_save_path: 调试用，非空时在后台把输入帧另存到该路径
+        roi: True 时只裁剪 regions 中的区域按原分辨率等比推理，
+            False 时整张截图缩放到 640x640 推理
+        regions: roi 模式下的区域配置 {名称: (x1, y1, x2, y2)}（640 坐标系），
+            默认 INFERENCE_REGIONS
+        plot: 是否生成识别可视化图片；生成在后台线程进行，不阻塞返回，
+            写盘跟不上时会丢弃部分帧。连续识别时建议关闭
+        plot_path: 识别可视化图片的保存路径
+        min_conf: 手牌框的最低置信度（在模型自身的 conf 阈值之外再筛一次）
+        backend: model 为 None 时使用的推理后端（torch / onnx / openvino / auto）
+        tier: model 为 None 时使用的模型级别，auto 表示按测评结果选用满足准确率下限的最快级别，
+            见 model_tiers
+        imgsz: 推理输入尺寸，调小可以换取速度（区域坐标仍按 640 坐标系配置）
+        layout: 牌桌布局（layout_calibration.Layout），为 None 时按截图分辨率读取已缓存的标定结果；
+            没有标定过时使用 HAND_REGION / INFERENCE_REGIONS
+        cache: 识别结果缓存（perception_cache.PerceptionCache），按手牌区域像素内容命中时
+            直接返回上次的结果（不会生成可视化图片）；为 None 时不使用缓存
+
+    Returns:
+        (hand_tiles, hand_string)，hand_tiles 中的坐标均为原图坐标
+    """
+    # 1. 获取模型（注册表中已加载/预热过则直接复用）
+    if model is None:
+        model = resolve_model(weights, backend, tier)
+    # 2. 获取图片
+    img = to_bgr_array(image)
+    if debug_save_path:
+        save_frame_async(img, debug_save_path)
+    h, w = img.shape[:2]
+    hand_region = resolve_hand_region(w, h, layout)
+
+    # 同一画面（手牌区域像素完全相同）直接返回缓存的结果
+    cache_key = None
+    if cache is not None:
+        x1, y1, x2, y2 = scale_region(hand_region, w, h)
+        cache_key, persistent = cache.key(model, img[y1:y2, x1:x2], frame=(w, h), region=(x1, y1, x2, y2),
+                                          roi=roi, regions=regions, min_conf=min_conf, imgsz=imgsz)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # 3. 模型预测，得到 (xyxy, conf, cls) 三个数组，坐标为原图坐标
+    if roi:
+        if regions is None:
+            # 有标定结果时只裁剪标定出的手牌区域
+            regions = INFERENCE_REGIONS if hand_region == HAND_REGION else {"hand": hand_region}
+        detections, r = _detect_regions(model, img, regions, imgsz)
+    else:
+        detections, r = _detect_full_frame(model, img, imgsz)
+
+    # 4~6. 收集手牌区域的麻将牌并转换为麻将字符串
+    hand_tiles, hand_string = collect_hand(model, detections, w, h, hand_region, min_conf)
     # print(f'麻将字符串表示: {hand_string}')
 
-    # 7. 保存预测结果图片
+    # 7. 保存预测结果图片：交给后台线程绘制写盘，识别结果立即返回
     # r.show()
-    result_plot = r.plot()
-    save_path = "Mahjong_YOLO/prediction_result.jpg"
-    
-    # 如果文件已存在，先删除
-    if os.path.exists(save_path):
-        try:
-            os.remove(save_path)
-        except Exception as e:
-            print(f"删除旧文件失败: {e}")
-
-    cv2.imwrite(save_path, result_plot)
-    # print(f"预测结果图片已保存至: {save_path}")
+    if plot and r is not None:
+        plot_writer.submit(r, plot_path)
 
+    if cache_key is not None:
+        cache.put(cache_key, (hand_tiles, hand_string), persistent)
     return hand_tiles, hand_string
 
 
@@ -163,100 +425,16 @@ def convert_tiles_to_mahjong_string(hand_tiles):
 def convert_tiles_to_mahjong_string_generic(tiles_list):
     """
     通用版本：将各种格式的牌名转换为麻将字符串
+    牌名通过 tile_name_to_34 整名解析（结果有缓存），支持 1m / man1 / 0m(赤) / dong / east / ton 等写法
     """
-    # 定义牌名到标准格式的映射
-    tile_mapping = {
-        # red
-        '0m': '5m', '0s': '5s', '0p': '5p',
-        # 万子
-        '1m': '1m', '2m': '2m', '3m': '3m', '4m': '4m', '5m': '5m',
-        '6m': '6m', '7m': '7m', '8m': '8m', '9m': '9m',
-        'man1': '1m', 'man2': '2m', 'man3': '3m', 'man4': '4m', 'man5': '5m',
-        'man6': '6m', 'man7': '7m', 'man8': '8m', 'man9': '9m',
-
-        # 筒子
-        '1p': '1p', '2p': '2p', '3p': '3p', '4p': '4p', '5p': '5p',
-        '6p': '6p', '7p': '7p', '8p': '8p', '9p': '9p',
-        'pin1': '1p', 'pin2': '2p', 'pin3': '3p', 'pin4': '4p', 'pin5': '5p',
-        'pin6': '6p', 'pin7': '7p', 'pin8': '8p', 'pin9': '9p',
-
-        # 索子
-        '1s': '1s', '2s': '2s', '3s': '3s', '4s': '4s', '5s': '5s',
-        '6s': '6s', '7s': '7s', '8s': '8s', '9s': '9s',
-        'sou1': '1s', 'sou2': '2s', 'sou3': '3s', 'sou4': '4s', 'sou5': '5s',
-        'sou6': '6s', 'sou7': '7s', 'sou8': '8s', 'sou9': '9s',
-
-        # 字牌
-        '1z': '1z', '2z': '2z', '3z': '3z', '4z': '4z', '5z': '5z', '6z': '6z', '7z': '7z',
-        'dong': '1z', 'nan': '2z', 'xi': '3z', 'bei': '4z',
-        'bai': '5z', 'fa': '6z', 'zhong': '7z',
-        'east': '1z', 'south': '2z', 'west': '3z', 'north': '4z',
-        'white': '5z', 'green': '6z', 'red': '7z',
-        'ton': '1z', 'nan': '2z', 'sha': '3z', 'pei': '4z',
-        'haku': '5z', 'hatsu': '6z', 'chun': '7z'
-    }
-
-    # 分离不同花色的牌
-    man_tiles = []
-    pin_tiles = []
-    sou_tiles = []
-    honor_tiles = []
-
+    counts = [0] * 34
     for tile_info in tiles_list:
         if len(tile_info) >= 2:
-            tile_name = str(tile_info[1]).lower()
-
-            # 查找映射
-            mapped_tile = None
-            for key, value in tile_mapping.items():
-                if key in tile_name:
-                    mapped_tile = value
-                    break
-
-            if mapped_tile:
-                if mapped_tile.endswith('m'):
-                    man_tiles.append(int(mapped_tile[0]))
-                elif mapped_tile.endswith('p'):
-                    pin_tiles.append(int(mapped_tile[0]))
-                elif mapped_tile.endswith('s'):
-                    sou_tiles.append(int(mapped_tile[0]))
-                elif mapped_tile.endswith('z'):
-                    honor_tiles.append(mapped_tile[0])
-            else:
-                # 尝试直接提取数字和花色
-                import re
-                match = re.search(r'(\d+)([mpsz])', tile_name)
-                if match:
-                    num, suit = match.groups()
-                    if suit == 'm':
-                        man_tiles.append(int(num))
-                    elif suit == 'p':
-                        pin_tiles.append(int(num))
-                    elif suit == 's':
-                        sou_tiles.append(int(num))
-                    elif suit == 'z':
-                        honor_tiles.append(num)
-
-    # 排序并构建字符串
-    result_parts = []
-
-    if man_tiles:
-        man_tiles.sort()
-        result_parts.append(''.join(str(num) for num in man_tiles) + 'm')
-
-    if pin_tiles:
-        pin_tiles.sort()
-        result_parts.append(''.join(str(num) for num in pin_tiles) + 'p')
-
-    if sou_tiles:
-        sou_tiles.sort()
-        result_parts.append(''.join(str(num) for num in sou_tiles) + 's')
-
-    if honor_tiles:
-        honor_tiles.sort()
-        result_parts.append(''.join(honor_tiles) + 'z')
+            tile_34, _ = tile_name_to_34(tile_info[1])
+            if tile_34 >= 0:
+                counts[tile_34] += 1
 
-    return ''.join(result_parts)
+    return counts_to_hand_string(counts)
 
 
 # 使用示例
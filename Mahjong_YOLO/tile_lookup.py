@@ -0,0 +1,145 @@
+import re
+import weakref
+from functools import lru_cache
+
+import numpy as np
+
+# 34 编码：0-8 万子，9-17 筒子，18-26 索子，27-33 东南西北白发中
+SUIT_OFFSET = {'m': 0, 'p': 9, 's': 18, 'z': 27}
+
+# 字牌别名（整名精确匹配，不做子串匹配）
+HONOR_ALIASES = {
+    'dong': 27, 'east': 27, 'ton': 27,
+    'nan': 28, 'south': 28,
+    'xi': 29, 'west': 29, 'sha': 29,
+    'bei': 30, 'north': 30, 'pei': 30,
+    'bai': 31, 'white': 31, 'haku': 31, 'blank': 31,
+    'fa': 32, 'green': 32, 'hatsu': 32, 'fortune': 32,
+    'zhong': 33, 'red': 33, 'chun': 33, 'center': 33,
+}
+
+# 数字 + 花色，如 1m / 0p（赤五）/ 5sr / r5s / 5s_aka
+_NUM_SUIT = re.compile(r'^(?:r|aka|red)?[_-]?([0-9])([mpsz])(?:[_-]?(?:r|aka|red))?$')
+# 花色 + 数字，如 man1 / pin0 / sou5r / m5
+_SUIT_NUM = re.compile(r'^(man|pin|sou|m|p|s)[_-]?([0-9])(?:[_-]?(?:r|aka|red))?$')
+_SUIT_WORD = {'man': 'm', 'pin': 'p', 'sou': 's', 'm': 'm', 'p': 'p', 's': 's'}
+_AKA_MARK = re.compile(r'(?:^(?:r|aka|red)[_-]?\d)|(?:\d[mps]?[_-]?(?:r|aka|red)$)')
+
+
+@lru_cache(maxsize=None)
+def tile_name_to_34(tile_name):
+    """
+    把模型类别名解析为 (34 编码, 是否赤宝牌)，无法识别时返回 (-1, False)
+    只做整名匹配，不会出现 '1m' 误匹配进 'man1m' 这类子串问题
+    """
+    name = str(tile_name).strip().lower()
+
+    if name in HONOR_ALIASES:
+        return HONOR_ALIASES[name], False
+
+    match = _NUM_SUIT.match(name)
+    if match:
+        num, suit = int(match.group(1)), match.group(2)
+    else:
+        match = _SUIT_NUM.match(name)
+        if not match:
+            return -1, False
+        suit, num = _SUIT_WORD[match.group(1)], int(match.group(2))
+
+    is_aka = num == 0 or bool(_AKA_MARK.search(name))
+    if num == 0:
+        num = 5
+    if suit == 'z':
+        if not 1 <= num <= 7 or is_aka:
+            return -1, False
+    elif is_aka and num != 5:
+        return -1, False
+    return SUIT_OFFSET[suit] + num - 1, is_aka
+
+
+class ClassLookup:
+    """
+    YOLO 类别 ID -> (34 编码, 赤宝牌标记) 的查找表，
+    对一批检测框的类别数组做一次 numpy 索引即可得到全部牌，无需字符串匹配
+    """
+
+    def __init__(self, names):
+        """
+        :param names: 模型的类别名，dict {id: name} 或 list
+        """
+        if isinstance(names, dict):
+            items = names.items()
+        else:
+            items = enumerate(names)
+        items = list(items)
+        size = max((int(k) for k, _ in items), default=-1) + 1
+
+        self.tile34 = np.full(size, -1, dtype=np.int16)
+        self.is_aka = np.zeros(size, dtype=bool)
+        for cls_id, name in items:
+            self.tile34[int(cls_id)], self.is_aka[int(cls_id)] = tile_name_to_34(name)
+
+        self.unknown = [name for cls_id, name in items if self.tile34[int(cls_id)] < 0]
+
+    def decode(self, cls_ids):
+        """类别 ID 数组 -> (34 编码数组, 赤宝牌标记数组)，未知类别的 34 编码为 -1"""
+        cls_ids = np.asarray(cls_ids, dtype=np.intp)
+        return self.tile34[cls_ids], self.is_aka[cls_ids]
+
+    def counts(self, cls_ids):
+        """类别 ID 数组 -> 长度 34 的每种牌数量（忽略未知类别）"""
+        tiles, _ = self.decode(cls_ids)
+        return np.bincount(tiles[tiles >= 0], minlength=34)
+
+
+_lookups = weakref.WeakKeyDictionary()
+
+
+def get_class_lookup(model):
+    """获取模型对应的查找表，首次调用时根据 model.names 构建并缓存"""
+    lookup = _lookups.get(model)
+    if lookup is None:
+        lookup = ClassLookup(model.names)
+        _lookups[model] = lookup
+    return lookup
+
+
+def tile_to_34(tile, is_136):
+    """
+    单张牌转 34 编码：MahjongTile 按其 136 编码（id）换算；整数按 is_136 解释，
+    136 编码与 mahjong.tile 的约定相同（34 编码 = 136 编码 // 4）
+    """
+    if hasattr(tile, "id"):
+        return int(tile.id) // 4
+    return int(tile) // 4 if is_136 else int(tile)
+
+
+def counts_to_hand_string(counts):
+    """长度 34 的数量数组 -> 麻将字符串，如 123m456p11z（赤五按普通五处理）"""
+    parts = []
+    for suit, offset, size in (('m', 0, 9), ('p', 9, 9), ('s', 18, 9), ('z', 27, 7)):
+        digits = ''.join(str(i + 1) * int(counts[offset + i]) for i in range(size))
+        if digits:
+            parts.append(digits + suit)
+    return ''.join(parts)
+
+
+def hand_string_to_counts(hand_str):
+    """麻将字符串 -> 长度 34 的数量数组，如 123m456p11z；0 视为赤五"""
+    counts = np.zeros(34, dtype=np.int64)
+    digits = []
+    for ch in str(hand_str).strip().lower():
+        if ch.isdigit():
+            digits.append(int(ch))
+        elif ch in SUIT_OFFSET:
+            for num in digits:
+                num = 5 if num == 0 else num
+                if ch == 'z' and not 1 <= num <= 7:
+                    raise ValueError(f"无效的字牌: {num}z")
+                counts[SUIT_OFFSET[ch] + num - 1] += 1
+            digits = []
+        elif not ch.isspace():
+            raise ValueError(f"无法解析的字符: {ch!r}")
+    if digits:
+        raise ValueError(f"数字缺少花色: {hand_str}")
+    return counts
@@ -8,9 +8,13 @@ from mahjong.tile import TilesConverter
 from mahjong.hand_calculating.hand import HandCalculator
 from mahjong.hand_calculating.hand_config import HandConfig
 from mahjong.meld import Meld
-from mahjong.shanten import Shanten
 from mahjong.agari import Agari
 from cal_scores import calc_hand_score
+from shanten_table import shanten_engine
+from discard_advisor import discard_advisor
+from visible_tiles import remaining_counts
+from wait_finder import WAIT_SHAPE_NAMES, wait_finder
+from Mahjong_YOLO.perception_cache import perception_cache
 from Mahjong_YOLO.test import perceive
 from collections import Counter
 import numpy as np
@@ -21,7 +25,8 @@ class FixedMahjongAnalyzer:
     def __init__(self):
         self.calculator = HandCalculator()
         self.agari = Agari()
-        self.shanten = Shanten()
+        # 查表法向听数，接口与 mahjong.shanten.Shanten 相同
+        self.shanten = shanten_engine
 
     def _wind_to_str(self, wind):
         """将风编号转为中文"""
@@ -148,7 +153,7 @@ class FixedMahjongAnalyzer:
         return normalized
 
     def analyze(self, hand_str, dora_indicators=None, melds=None,
-                player_wind=0, round_wind=0, is_riichi=False):
+                player_wind=0, round_wind=0, is_riichi=False, visible=None):
         """
         分析手牌
 
@@ -159,6 +164,8 @@ class FixedMahjongAnalyzer:
             player_wind: 自风 (0=东, 1=南, 2=西, 3=北)
             round_wind: 场风 (0=东, 1=南, 2=西, 3=北)
             is_riichi: 是否立直
+            visible: 场上可见牌（VisibleTiles 或长度 34 的张数数组，不含本家手牌），
+                     用于计算进张 / 听牌的剩余张数；为 None 时只扣除手牌
         """
         print("=" * 70)
         print("🀄 麻将手牌分析报告")
@@ -189,8 +196,14 @@ class FixedMahjongAnalyzer:
         # 3. 向听数分析
         self._print_shanten_fixed(tiles_34_list)
 
+        # 每种牌还能摸到的张数，听牌分析和打牌推荐共用
+        remaining = remaining_counts(tiles_34_array, visible)
+
         # 4. 听牌分析
-        self._print_tenpai_fixed(tiles_34_list)
+        self._print_tenpai_fixed(tiles_34_list, remaining=remaining)
+
+        # 5. 打牌推荐（轮到自己打牌时）
+        self._print_discard_advice(tiles_34_list, remaining)
 
         print(f"\n" + "=" * 70)
         print("🎉 分析完成！")
@@ -277,9 +290,11 @@ class FixedMahjongAnalyzer:
             # 转换为数量数组用于shanten计算
             tiles_34_array = self._list_to_array(tiles_34_list)
 
-            # 普通和牌向听数
-            regular_shanten = self.shanten.calculate_shanten(tiles_34_array)
+            # 普通形 / 七对子 / 国士无双一次查表得到
+            regular, chiitoitsu, kokushi = self.shanten.shanten_detail(tiles_34_array)
+            regular_shanten = min(regular, chiitoitsu, kokushi)
             print(f"    普通和牌向听数: {regular_shanten}")
+            print(f"    （普通形 {regular} / 七对子 {chiitoitsu} / 国士无双 {kokushi}）")
 
             if regular_shanten == -1:
                 print("    ✅ 已经和牌！")
@@ -296,8 +311,8 @@ class FixedMahjongAnalyzer:
             print(f"    向听数计算失败: {e}")
 
     def _print_tenpai_fixed_with_score(self, tiles_34_list, tiles_136=None, melds=None, dora_indicators=None,
-                                       player_wind=0, round_wind=0, is_riichi=False):
-        """打印听牌分析并计算每个听牌张的点数"""
+                                       player_wind=0, round_wind=0, is_riichi=False, remaining=None):
+        """打印听牌分析并计算每个听牌张的点数；remaining 为每种牌剩余的张数，为 None 时按 4 - 手中张数计"""
         print(f"\n🎯 听牌分析:")
 
         if len(tiles_34_list) != 13:
@@ -307,26 +322,17 @@ class FixedMahjongAnalyzer:
         try:
             # 转换为数量数组用于agari判断
             tiles_34_array = self._list_to_array(tiles_34_list)
+            if remaining is None:
+                remaining = remaining_counts(tiles_34_array)
 
             # 检查是否已经和牌
             if self.agari.is_agari(tiles_34_array):
                 print("    ✅ 已经和牌！")
                 return
 
-            # 查找有效的听牌（添加后能形成和牌形的牌）
-            valid_waiting_tiles = []
-            for tile_34 in range(34):
-                # 跳过已经满4张的牌
-                if tiles_34_array[tile_34] >= 4:
-                    continue
-
-                # 模拟添加这张牌
-                temp_array = tiles_34_array.copy()
-                temp_array[tile_34] += 1
-
-                # 检查是否能和牌
-                if self.agari.is_agari(temp_array):
-                    valid_waiting_tiles.append(tile_34)
+            # 查找有效的听牌（按花色查表一次得到所有听牌张及听牌形状，已满4张的牌不算）
+            wait_shapes = wait_finder.classify_waits(tiles_34_array)
+            valid_waiting_tiles = list(wait_shapes)
 
             if not valid_waiting_tiles:
                 print("    ❌ 未听牌")
@@ -362,19 +368,20 @@ class FixedMahjongAnalyzer:
                         is_tsumo=False  # 听牌分析一般假设荣和
                     )
 
-                    # 获取牌名
+                    # 获取牌名和听牌形状
                     tile_name = self._tile_34_to_name(tile_34)
+                    shapes = "/".join(WAIT_SHAPE_NAMES[shape] for shape in wait_shapes[tile_34])
 
-                    # 获取牌在手牌中的数量和剩余牌数
+                    # 获取牌在手牌中的数量和剩余牌数（已扣除场上可见的牌）
                     in_hand = tiles_34_array[tile_34]
-                    remaining = 4 - in_hand
 
                     # 整理结果
                     score_results.append({
                         'tile_34': tile_34,
                         'tile_name': tile_name,
                         'in_hand': in_hand,
-                        'remaining': remaining,
+                        'remaining': int(remaining[tile_34]),
+                        'shapes': shapes,
                         'han': score_result['han'],
                         'fu': score_result['fu'],
                         'cost': score_result['cost']['main'],
@@ -384,7 +391,7 @@ class FixedMahjongAnalyzer:
                     })
 
                     print(
-                        f"    ✓ 听{tile_name}: {score_result['han']}翻{score_result['fu']}符 {score_result['cost']['main']}点")
+                        f"    ✓ 听{tile_name}({shapes}): {score_result['han']}翻{score_result['fu']}符 {score_result['cost']['main']}点")
 
                 except ValueError as e:
                     if "hand_not_winning" in str(e):
@@ -568,19 +575,8 @@ class FixedMahjongAnalyzer:
         return self._print_tenpai_fixed_with_score(tiles_34_list, *args, **kwargs)
 
     def _find_waiting_tiles_simple(self, tiles_34_list):
-        """简单方法查找听牌"""
-        waiting = []
-
-        # 检查添加每张牌后是否能和牌
-        for tile_34 in range(34):
-            # 检查是否还有剩余牌
-            if tiles_34_list.count(tile_34) < 4:
-                test_hand = tiles_34_list + [tile_34]
-                test_array = self._list_to_array(test_hand)
-                if self.agari.is_agari(test_array):
-                    waiting.append(tile_34)
-
-        return waiting
+        """查找听牌（手里已有4张的牌不算）"""
+        return wait_finder.find_waits(self._list_to_array(tiles_34_list))
 
     def _list_to_array(self, tiles_34_list):
         """将34编码列表转换为数量数组"""
@@ -589,6 +585,136 @@ class FixedMahjongAnalyzer:
             array[tile] += 1
         return array
 
+    def analyze_discards(self, hand_str, visible=None):
+        """
+        打牌推荐：逐一试打每种牌，给出打后的向听数和有效进张
+
+        参数:
+            hand_str: 3n+2 张的手牌字符串
+            visible: 场上可见牌（VisibleTiles 或长度 34 的张数数组，不含本家手牌），为 None 时只扣除手牌
+
+        返回:
+            [{"discard", "shanten", "effective", "ukeire"}, ...]，按 向听数从小到大、进张数从多到少 排序；
+            手牌格式错误或张数不是 3n+2 时返回空列表
+        """
+        tiles_136 = self._string_to_tiles(hand_str)
+        if not tiles_136 or len(tiles_136) % 3 != 2:
+            return []
+        tiles_34_array = self._list_to_array(self._tiles_136_to_34_list(tiles_136))
+        return discard_advisor.analyze(tiles_34_array, remaining_counts(tiles_34_array, visible))
+
+    def simulate_discards(self, hand_str, visible=None, **kwargs):
+        """
+        每种候选打法的和牌率 / 期望打点蒙特卡洛模拟（见 win_simulator.simulate_discards）
+
+        参数:
+            hand_str: 3n+2 张的手牌字符串
+            visible: 场上可见牌（VisibleTiles 或长度 34 的张数数组，不含本家手牌），模拟只从未见牌中抽牌
+            kwargs: 传给 simulate_discards 的参数（turns、time_budget、workers、seed、dora_indicators 等）
+
+        返回:
+            按期望打点从高到低排序的结果列表；手牌格式错误或张数不是 3n+2 时返回空列表
+        """
+        from win_simulator import simulate_discards
+
+        tiles_136 = self._string_to_tiles(hand_str)
+        if not tiles_136 or len(tiles_136) % 3 != 2:
+            return []
+        tiles_34_array = self._list_to_array(self._tiles_136_to_34_list(tiles_136))
+        return simulate_discards(tiles_34_array, remaining_counts(tiles_34_array, visible), **kwargs)
+
+    def _print_discard_advice(self, tiles_34_list, remaining=None, top=5):
+        """打印打牌推荐（只在 3n+2 张时）"""
+        if len(tiles_34_list) % 3 != 2:
+            return
+        print(f"\n🎯 打牌推荐:")
+        try:
+            options = discard_advisor.analyze(self._list_to_array(tiles_34_list), remaining)
+        except Exception as e:
+            print(f"    打牌推荐计算失败: {e}")
+            return
+        for option in options[:top]:
+            shanten = "和牌" if option["shanten"] < 0 else f"{option['shanten']}向听"
+            tiles = "、".join(self._tile_34_to_name(t) for t, _ in option["effective"])
+            suffix = f" ({tiles})" if tiles else ""
+            print(f"    打{self._tile_34_to_name(option['discard'])}: {shanten}，"
+                  f"进张 {len(option['effective'])} 种 {option['ukeire']} 张{suffix}")
+
+    def evaluate_candidates(self, candidates, visible=None):
+        """
+        一次性评估多个候选手牌（多假设识别的结果），按概率从高到低返回
+
+        参数:
+            candidates: 手牌字符串列表，或 [(手牌字符串, 概率), ...]
+            visible: 场上可见牌（VisibleTiles 或长度 34 的张数数组，不含本家手牌），为 None 时只扣除手牌
+
+        返回:
+            [{"hand", "prob", "shanten", "waits", "discard", "ukeire"}, ...]：
+            3n+2 张（摸牌后）的候选按打牌推荐的第一选择给出 discard、打后的向听、待牌和进张张数；
+            3n+1 张的候选 discard 为 None，ukeire 为听牌时待牌的剩余张数；
+            waits 为听牌时的待牌（34 编码），未听牌或已和牌时为空
+
+        候选之间通常只差一两张牌：按数量数组去重后每种牌型只计算一次；
+        向听、待牌和打牌推荐都按花色查表，没有变化的花色直接命中缓存
+        """
+        memo = {}
+
+        def evaluate(counts):
+            if counts in memo:
+                return memo[counts]
+            result = {"shanten": None, "waits": [], "discard": None, "ukeire": None}
+            memo[counts] = result
+            try:
+                shanten = self.shanten.calculate_shanten(counts)
+            except Exception:
+                return result
+            hand = np.array(counts)
+            remaining = remaining_counts(hand, visible)
+            if sum(counts) % 3 == 2 and shanten >= 0:
+                best = discard_advisor.analyze(hand, remaining)[0]
+                hand[best["discard"]] -= 1
+                result.update(shanten=best["shanten"], discard=best["discard"], ukeire=best["ukeire"])
+            else:
+                result.update(shanten=shanten)
+            if result["shanten"] == 0:
+                result["waits"] = list(wait_finder.find_waits(hand))
+                if result["ukeire"] is None:
+                    result["ukeire"] = int(sum(remaining[t] for t in result["waits"]))
+            return result
+
+        results = []
+        for item in candidates:
+            hand_str, prob = (item, None) if isinstance(item, str) else item
+            tiles_136 = self._string_to_tiles(hand_str)
+            if not tiles_136:
+                continue
+            counts = tuple(self._list_to_array(self._tiles_136_to_34_list(tiles_136)))
+            results.append({"hand": hand_str, "prob": prob, **evaluate(counts)})
+            results[-1]["waits"] = list(results[-1]["waits"])
+        if all(r["prob"] is not None for r in results):
+            results.sort(key=lambda r: r["prob"], reverse=True)
+        return results
+
+    def print_candidates(self, hypotheses, max_hands=8, visible=None):
+        """打印识别不确定的牌以及各候选手牌的推荐打法、向听和待牌"""
+        uncertain = hypotheses.describe_uncertain()
+        if not uncertain:
+            return
+        print(f"\n❓ 识别不确定的牌:")
+        for line in uncertain:
+            print(f"    {line}")
+
+        print(f"\n🔀 候选手牌:")
+        for r in self.evaluate_candidates(hypotheses.candidate_hands(max_hands), visible):
+            shanten = "未知" if r["shanten"] is None else ("和牌" if r["shanten"] < 0 else f"{r['shanten']}向听")
+            if r["discard"] is not None:
+                shanten = f"打{self._tile_34_to_name(r['discard'])} {shanten}"
+            waits = "、".join(self._tile_34_to_name(t) for t in r["waits"])
+            suffix = f"，听 {waits}" if waits else ""
+            if r["ukeire"] is not None:
+                suffix += f"，进张 {r['ukeire']} 张"
+            print(f"    {r['hand']}  概率 {r['prob']:.1%}  {shanten}{suffix}")
+
     def _wind_to_str(self, wind):
         """风向数字转字符串"""
         winds = ['东', '南', '西', '北']
@@ -665,10 +791,17 @@ def test_analyzer():
         )
 
 
-def run_analysis_to_file(output_path: str = "output.txt") -> str:
+def run_analysis_to_file(output_path: str = "output.txt", image=None, layout=None, hypotheses=None,
+                         visible=None) -> str:
     """
     一键从当前截图识别到牌谱分析，并将分析结果写入文本文件。
-    - 调用 YOLO 识别当前截图 (`Mahjong_YOLO/test.png`)，得到 hand_str
+    - 调用 YOLO 识别截图，得到 hand_str；image 可以直接传入内存中的
+      PIL 图片 / numpy 数组，为 None 时读取 `Mahjong_YOLO/test.png`；
+      只截取了部分区域时通过 layout 传入对应的牌桌布局
+    - 传入 perceive_topk() 的结果 hypotheses 时不再重新识别，按最可能的手牌分析，
+      并在报告末尾列出识别不确定的牌和各候选手牌的推荐打法、向听 / 待牌
+    - visible 为场上可见牌（VisibleTiles，可由 GameTable 或整桌识别的 TableState 得到），
+      传入时进张和听牌的剩余张数会扣除牌河、副露和宝牌指示牌中已出现的牌
     - 使用 FixedMahjongAnalyzer 进行分析
     - 将所有 print 输出重定向写入 output_path
 
@@ -678,7 +811,11 @@ def run_analysis_to_file(output_path: str = "output.txt") -> str:
     analyzer = FixedMahjongAnalyzer()
 
     # 1. 从 YOLO 识别得到手牌字符串
-    _, hand_str = perceive()
+    if hypotheses is not None:
+        hand_str = hypotheses.best_hand_string
+    else:
+        # 反复分析同一张截图时直接复用缓存的识别结果
+        _, hand_str = perceive(image=image, layout=layout, cache=perception_cache)
 
     # 暂时用默认参数，后面需要可以从 GUI 传入
     dora_indicators = None
@@ -698,7 +835,10 @@ def run_analysis_to_file(output_path: str = "output.txt") -> str:
             player_wind=player_wind,
             round_wind=round_wind,
             is_riichi=is_riichi,
+            visible=visible,
         )
+        if hypotheses is not None:
+            analyzer.print_candidates(hypotheses, visible=visible)
     finally:
         f.close()
         sys.stdout = original_stdout
@@ -6,9 +6,17 @@ from tkinter import ttk, messagebox
 from pathlib import Path
 import time
 
-from PIL import ImageGrab
 from openai import OpenAI
 from analyzer import run_analysis_to_file
+from Mahjong_YOLO.model_registry import warmup_async
+from Mahjong_YOLO.perception_cache import perception_cache
+from Mahjong_YOLO.table_state import perceive_table
+from Mahjong_YOLO.test import save_frame_async
+from screen_capture import open_game_capture
+from visible_tiles import VisibleTiles
+
+# 设置环境变量 MAHJONG_DEBUG_FRAMES=1 时，截图会额外保存到磁盘便于排查识别问题
+DEBUG_SAVE_FRAMES = os.environ.get("MAHJONG_DEBUG_FRAMES") == "1"
 
 
 class StreamingChatGUI:
@@ -66,6 +74,8 @@ class StreamingChatGUI:
         self.stream_thread: threading.Thread | None = None
         self.stop_flag = threading.Event()
         self.text_queue: queue.Queue[str] = queue.Queue()
+        # 截图源（首次截图时打开，有布局标定时只截取游戏区域）
+        self.capture = None
         # 对话历史（用于上下文聊天与牌局追问）
         self.chat_history = []
 
@@ -261,28 +271,38 @@ class StreamingChatGUI:
 
     def on_auto_flow_clicked(self) -> None:
         """
-        一键：截一张当前屏幕到 Mahjong_YOLO/test.png -> 分析写 output.txt -> 流式调用大模型。
+        一键：截一张当前屏幕（内存中）-> 分析写 output.txt -> 流式调用大模型。
         """
         if self.stream_thread and self.stream_thread.is_alive():
             messagebox.showinfo("提示", "当前已有一个分析任务在运行，请稍候。")
             return
 
-        # 1. 截图到 Mahjong_YOLO/test.png
-        save_path = Path("./Mahjong_YOLO/test.png")
-        save_path.parent.mkdir(parents=True, exist_ok=True)
+        # 1. 截图（直接保留在内存中，不再经过 PNG 编码/解码）
         try:
-            if save_path.exists():
-                save_path.unlink()
             # 稍微延迟，避免键盘/窗口切换干扰
             time.sleep(0.1)
-            ImageGrab.grab().save(str(save_path), "PNG")
+            if self.capture is None:
+                # 有布局标定时只截取游戏区域
+                self.capture = open_game_capture()
+            frame = self.capture.grab()
         except Exception as e:
-            messagebox.showerror("截图失败", f"保存截图失败：{e}")
+            messagebox.showerror("截图失败", f"截图失败：{e}")
             return
 
-        # 2. 调用分析器，写 output.txt
+        # 调试模式下在后台把截图另存到 Mahjong_YOLO/test.png
+        if DEBUG_SAVE_FRAMES:
+            save_path = Path("./Mahjong_YOLO/test.png")
+            save_path.parent.mkdir(parents=True, exist_ok=True)
+            save_frame_async(frame, str(save_path))
+            print(f"截图耗时: {self.capture.last_ms:.1f}ms，范围 {self.capture.bbox or '整屏'}")
+
+        # 2. 识别整桌（手牌每张保留前几个候选），调用分析器，写 output.txt
         try:
-            hand_str = run_analysis_to_file("output.txt")
+            # 一次推理同时得到手牌候选和牌河 / 副露 / 宝牌指示牌；同一画面复用缓存的识别结果，
+            # 新识别时在后台生成 prediction_result.jpg
+            table = perceive_table(frame, layout=self.capture.layout, topk=3, plot=True, cache=perception_cache)
+            hand_str = run_analysis_to_file("output.txt", hypotheses=table.hand_hypotheses,
+                                            visible=VisibleTiles.from_table_state(table))
         except Exception as e:
             messagebox.showerror("分析失败", f"调用牌局分析器失败：\n{e}")
             return
@@ -302,6 +322,9 @@ class StreamingChatGUI:
         # 展示识别到的手牌并开始解说（不清空历史）
         if hand_str:
             self._append_text(f"【系统】已识别手牌：{hand_str}\n\n", "system")
+        uncertain = hypotheses.describe_uncertain()
+        if uncertain:
+            self._append_text("【系统】以下牌识别不确定，请核对：\n" + "\n".join(uncertain) + "\n\n", "system")
         self._append_text("【系统】开始调用雀宝大模型进行解说……\n\n", "system")
         preview = pt.replace("\n", " ")[:100] + ("..." if len(pt) > 100 else "")
         self._append_text(f"【你】请分析这个牌局：{preview}\n\n", "user")
@@ -525,6 +548,9 @@ class StreamingChatGUI:
 
 
 def main() -> None:
+    # 后台加载并预热识别模型，首次点击“一键截图”时无需再等待权重加载
+    warmup_async()
+
     root = tk.Tk()
     app = StreamingChatGUI(root)
     root.mainloop()
@@ -0,0 +1,315 @@
+import threading
+import time
+from collections import deque
+
+from screen_capture import open_game_capture
+
+
+class FrameRingBuffer:
+    """
+    固定容量的帧环形缓冲区：
+    - 生产者 put() 永不阻塞，缓冲区满时最旧的帧被直接覆盖
+    - 消费者 get_latest() 只取最新一帧，比它旧的帧全部丢弃
+    这样推理比截图慢时不会排队积压，感知延迟始终有上界
+    """
+
+    def __init__(self, capacity=3):
+        if capacity < 1:
+            raise ValueError("capacity 至少为 1")
+        self.capacity = capacity
+        self._frames = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self.produced = 0   # 写入的帧数
+        self.consumed = 0   # 被消费者取走的帧数
+        self.dropped = 0    # 未被消费就被覆盖/跳过的帧数
+
+    def put(self, frame, timestamp=None):
+        """写入一帧，返回该帧的序号"""
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        with self._cond:
+            if len(self._frames) == self.capacity:
+                self.dropped += 1
+            self._seq += 1
+            self._frames.append((self._seq, timestamp, frame))
+            self.produced += 1
+            self._cond.notify_all()
+            return self._seq
+
+    def get_latest(self, after_seq=0, timeout=None):
+        """
+        取出序号大于 after_seq 的最新一帧，并丢弃缓冲区中所有更旧的帧
+
+        Args:
+            after_seq: 消费者上次处理的帧序号
+            timeout: 等待新帧的最长秒数，None 表示一直等待
+
+        Returns:
+            (seq, timestamp, frame)，超时返回 None
+        """
+        with self._cond:
+            ok = self._cond.wait_for(
+                lambda: self._frames and self._frames[-1][0] > after_seq,
+                timeout=timeout,
+            )
+            if not ok:
+                return None
+            latest = self._frames[-1]
+            self.dropped += len(self._frames) - 1
+            self._frames.clear()
+            self.consumed += 1
+            return latest
+
+    def stats(self):
+        with self._cond:
+            return {
+                "produced": self.produced,
+                "consumed": self.consumed,
+                "dropped": self.dropped,
+                "pending": len(self._frames),
+            }
+
+
+class ContinuousCaptureService:
+    """
+    固定频率截图服务（架构文档中的 10~15 Hz 截图）：
+    后台生产者线程按 rate_hz 截图写入 FrameRingBuffer，不做任何识别
+    """
+
+    def __init__(self, rate_hz=12, capacity=3, grab=None):
+        """
+        :param rate_hz: 截图频率（帧/秒）
+        :param capacity: 环形缓冲区容量
+        :param grab: 截图函数，返回一帧图像；默认使用 screen_capture.open_game_capture()，
+                     有布局标定时只截取标定区域
+        """
+        if rate_hz <= 0:
+            raise ValueError("rate_hz 必须为正数")
+        self.rate_hz = rate_hz
+        self.grab = grab or open_game_capture()
+        self.buffer = FrameRingBuffer(capacity)
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def layout(self):
+        """截图对应的牌桌布局（截图源未限制区域或不是 CaptureSource 时为 None）"""
+        return getattr(self.grab, "layout", None)
+
+    def capture_stats(self):
+        """截图耗时统计（仅 CaptureSource 提供）"""
+        stats = getattr(self.grab, "stats", None)
+        return stats() if stats is not None else None
+
+    def start(self):
+        """启动截图线程"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._produce, name="capture-producer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """停止截图线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _produce(self):
+        interval = 1.0 / self.rate_hz
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                frame = self.grab()
+                self.buffer.put(frame)
+            except Exception:
+                self.errors += 1
+
+            # 按固定节拍调度；截图本身超时则直接跳到下一个节拍，不补拍
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay < 0:
+                next_tick = time.perf_counter()
+                delay = 0
+            self._stop.wait(delay)
+
+
+class DetectorWorker:
+    """
+    检测消费者：循环从缓冲区取最新帧做识别，旧帧直接丢弃
+    """
+
+    def __init__(self, buffer, detect=None, on_result=None, poll_timeout=0.5, gate=None, layout=None,
+                 tracker=None):
+        """
+        :param buffer: FrameRingBuffer
+        :param detect: 识别函数 detect(frame) -> result，默认使用 perceive(image=frame, plot=False)
+        :param on_result: 回调 on_result(seq, result, latency)，latency 为从截图到识别完成的秒数
+        :param poll_timeout: 等待新帧的超时时间，用于及时响应 stop()
+        :param gate: 可选的变化检测门（如 HandChangeGate），gate.check(frame) 为 False 时跳过识别
+        :param layout: 默认 detect 使用的牌桌布局，区域截图时传入截图源的 layout
+        :param tracker: 可选的手牌跟踪器（HandTracker）；给出时 detect 的结果先交给 tracker 平滑，
+                        只有手牌稳定地变为新状态时才回调 on_result，result 为 HandState
+        """
+        if detect is None:
+            from Mahjong_YOLO.test import perceive
+
+            def detect(frame):
+                return perceive(image=frame, plot=False, layout=layout)
+
+        self.buffer = buffer
+        self.detect = detect
+        self.on_result = on_result
+        self.poll_timeout = poll_timeout
+        self.gate = gate
+        self.tracker = tracker
+        self.last_seq = 0
+        self._last_detection = None     # 最近一次识别的手牌检测结果，检测门跳过的帧沿用它喂给跟踪器
+        self.last_result = None
+        self.last_latency = None
+        self.processed = 0
+        self.errors = 0
+        self.callback_errors = 0    # on_result 回调抛出异常的次数（不影响识别线程继续运行）
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._consume, name="detector-consumer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _consume(self):
+        while not self._stop.is_set():
+            item = self.buffer.get_latest(self.last_seq, timeout=self.poll_timeout)
+            if item is None:
+                continue
+            self.handle(*item)
+
+    def handle(self, seq, timestamp, frame):
+        """处理一帧（识别线程对每个取到的帧调用；也可以直接调用以同步地驱动整条流程）"""
+        self.last_seq = seq
+        try:
+            if self.gate is not None and not self.gate.check(frame):
+                # 手牌区域没有变化时沿用上一次的识别结果；有跟踪器时仍把它作为新的一帧交给跟踪器，
+                # 否则跟踪器每次变化只收到一帧，永远凑不够 stable_frames
+                if self.tracker is None or self._last_detection is None:
+                    return
+                result = self.tracker.update(self._last_detection)
+            else:
+                result = self.detect(frame)
+                if self.tracker is not None:
+                    self._last_detection = result[0]
+                    result = self.tracker.update(result[0])
+        except Exception:
+            self.errors += 1
+            # 识别失败时清掉参照帧，下一帧重新识别
+            if self.gate is not None:
+                self.gate.reset()
+            self._last_detection = None
+            return
+
+        self.processed += 1
+        if result is None:
+            # 跟踪器认为手牌还没有稳定到新状态
+            return
+        self.last_result = result
+        self.last_latency = time.perf_counter() - timestamp
+        if self.on_result is not None:
+            try:
+                self.on_result(seq, result, self.last_latency)
+            except Exception:
+                self.callback_errors += 1
+
+
+def check_gate_with_tracker(frames=20, changes=(0, 10)):
+    """
+    变化检测门 + 手牌跟踪器同时启用时的自检：模拟 frames 帧画面，只在 changes 中的帧手牌发生变化，
+    检测门在其余帧全部跳过识别。每次变化后跟踪器都应在 stable_frames 帧内输出新的手牌
+
+    Returns:
+        (输出的 HandState 列表, 检测门统计, 跟踪器统计)
+    """
+    from Mahjong_YOLO.hand_tracker import HandTracker
+
+    hands = [[("0", "1m", 0.9, (10 + 20 * i, 0, 28 + 20 * i, 30)) for i in range(3)],
+             [("0", "2m", 0.9, (10 + 20 * i, 0, 28 + 20 * i, 30)) for i in range(3)]]
+
+    class FakeGate:
+        def __init__(self):
+            self.hits = self.skips = 0
+
+        def check(self, frame):
+            changed = frame in changes
+            self.hits += changed
+            self.skips += not changed
+            return changed
+
+        def reset(self):
+            pass
+
+        def stats(self):
+            return {"hits": self.hits, "skips": self.skips}
+
+    def detect(frame):
+        hand = hands[sum(1 for c in changes if c <= frame) - 1]
+        return hand, None
+
+    emitted = []
+    gate, tracker = FakeGate(), HandTracker()
+    worker = DetectorWorker(FrameRingBuffer(), detect=detect, gate=gate, tracker=tracker,
+                            on_result=lambda seq, state, latency: emitted.append(state))
+    for frame in range(frames):
+        worker.handle(frame + 1, time.perf_counter(), frame)
+    return emitted, gate.stats(), tracker.stats()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--check" in sys.argv:
+        states, gate_stats, tracker_stats = check_gate_with_tracker()
+        print(f"输出 {[s.hand_string for s in states]}；检测门 {gate_stats}；跟踪器 {tracker_stats}")
+        raise SystemExit(0 if len(states) == 2 else 1)
+
+    # 简单演示：12 Hz 截图，识别结果打印到控制台
+    from Mahjong_YOLO.change_gate import HandChangeGate
+    from Mahjong_YOLO.hand_tracker import HandTracker
+
+    capture = ContinuousCaptureService(rate_hz=12)
+    layout = capture.layout
+    gate = HandChangeGate(region=layout.hand_region if layout is not None else None)
+    tracker = HandTracker()
+    worker = DetectorWorker(
+        capture.buffer,
+        gate=gate,
+        layout=layout,
+        tracker=tracker,
+        on_result=lambda seq, state, latency: print(f"#{seq} {state.hand_string} ({latency * 1000:.0f}ms)"),
+    )
+    capture.start()
+    worker.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        worker.stop()
+        capture.stop()
+        print(capture.buffer.stats())
+        print(capture.capture_stats())
+        print(gate.stats())
+        print(tracker.stats())
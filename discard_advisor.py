@@ -0,0 +1,365 @@
+"""
+打牌推荐：14 张（副露后 11 / 8 / 5 / 2 张）手牌逐一试打每种牌，给出打后的向听数和有效进张（受け入れ）。
+
+朴素做法要对每种打法、每种摸牌各算一次向听（最多 14 x 34 次）。这里利用向听表按花色拆分的结构：
+    - 打出 / 摸进只改变一两个花色；每个花色分布的 本身 / 摸一张 / 打一张 / 打一张再摸一张 的表转成定长数组缓存
+    - 不变的花色先合并好，再把“打某花色 x 摸某花色”的所有组合放在一次 numpy 运算里求向听
+七对子、国士无双同样按张数矩阵一次算出。
+
+    from discard_advisor import discard_advisor
+    for option in discard_advisor.analyze(tiles_34_array):
+        print(option["discard"], option["shanten"], option["ukeire"])
+
+与逐手调用 mahjong.shanten 的结果对拍：python discard_advisor.py --check 300
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from shanten_table import AGARI_STATE, ISO_MERGE, ISO_QUAD, shanten_engine
+
+# 定长表：下标 = 散牌状态 * 10 + 雀头 * 5 + 面子数，值为最多搭子数；_NEG 表示该组合不存在
+_WIDTH = 30
+_NEG = -64
+_SUITS = ((0, 9), (9, 18), (18, 27), (27, 34))
+_YAOCHU = np.array([0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33])
+
+
+def _index_parts(k):
+    iso, rest = divmod(k, 10)
+    h, m = divmod(rest, 5)
+    return iso, h, m
+
+
+def _build_combine_plan():
+    """两张定长表合并时，每对下标落到的结果下标；按结果下标排好序，用 reduceat 一次取最大值"""
+    target = np.full((_WIDTH, _WIDTH), _WIDTH, dtype=np.intp)
+    for i in range(_WIDTH):
+        iso_a, ha, ma = _index_parts(i)
+        for j in range(_WIDTH):
+            iso_b, hb, mb = _index_parts(j)
+            if ha + hb <= 1 and ma + mb <= 4:
+                target[i, j] = ISO_MERGE[iso_a][iso_b] * 10 + (ha + hb) * 5 + ma + mb
+    flat = target.ravel()
+    order = np.argsort(flat, kind="stable")
+    starts = np.searchsorted(flat[order], np.arange(_WIDTH + 1))
+    return order, starts
+
+
+_COMBINE_ORDER, _COMBINE_STARTS = _build_combine_plan()
+
+
+def _build_eval_tables(melds):
+    """
+    两张定长表的每对下标对应的 (基础值, 搭子上限)：向听 = 基础值 - min(搭子数, 搭子上限)；
+    不合法的组合基础值取很大的数
+    """
+    base = np.full((_WIDTH, _WIDTH), 99, dtype=np.int16)
+    cap = np.full((_WIDTH, _WIDTH), -100, dtype=np.int16)
+    for i in range(_WIDTH):
+        iso_a, ha, ma = _index_parts(i)
+        for j in range(_WIDTH):
+            iso_b, hb, mb = _index_parts(j)
+            h, mentsu = ha + hb, ma + mb + melds
+            if h > 1 or mentsu > 4:
+                continue
+            penalty = 1 if not h and ISO_MERGE[iso_a][iso_b] == ISO_QUAD else 0
+            base[i, j] = 8 - 2 * mentsu - h + penalty
+            cap[i, j] = 4 - mentsu
+    return base, cap
+
+
+class DiscardAdvisor:
+    """
+    打牌推荐
+
+    计数：
+        queries  —— analyze 的调用次数
+        bundles  —— 已缓存的花色分布数（每个分布缓存 本身 / 摸一张 / 打一张 / 打一张再摸一张 的定长表）
+    """
+
+    def __init__(self, engine=shanten_engine, max_bundles=20000):
+        """
+        :param engine: 提供花色表的 ShantenEngine
+        :param max_bundles: 最多缓存的花色分布数，超过后清空重来
+        """
+        self.engine = engine
+        self.max_bundles = max_bundles
+        self._bundles = {}
+        self._dense_cache = {}
+        self._eval_tables = {}
+        self.queries = 0
+
+    # ---------- 定长表 ----------
+
+    def _dense(self, suit, counts):
+        key = (suit == 3, tuple(counts))
+        arr = self._dense_cache.get(key)
+        if arr is None:
+            value = self.engine.honor_table(counts) if suit == 3 else self.engine.suit_table(counts)
+            arr = np.full(_WIDTH, _NEG, dtype=np.int16)
+            for iso, h, m, t in value:
+                arr[iso * 10 + h * 5 + m] = t
+            self._dense_cache[key] = arr
+        return arr
+
+    def _bundle(self, suit, counts):
+        """
+        一个花色分布的全部变化：
+            base  (30,)          本身
+            draw  (n, 30)        摸进第 t 张
+            cut   (n, 30)        打出第 d 张
+            swap  (n, n, 30)     打出第 d 张再摸进第 t 张
+        做不到的变化（没有这张牌可打、已经 4 张）整行为 _NEG
+        """
+        key = (suit, tuple(counts))
+        bundle = self._bundles.get(key)
+        if bundle is not None:
+            return bundle
+
+        n = len(counts)
+        base = self._dense(suit, counts)
+        draw = np.full((n, _WIDTH), _NEG, dtype=np.int16)
+        cut = np.full((n, _WIDTH), _NEG, dtype=np.int16)
+        swap = np.full((n, n, _WIDTH), _NEG, dtype=np.int16)
+        changed = list(counts)
+        for t in range(n):
+            if counts[t] < 4:
+                changed[t] += 1
+                draw[t] = self._dense(suit, changed)
+                changed[t] -= 1
+        for d in range(n):
+            if not counts[d]:
+                continue
+            changed[d] -= 1
+            cut[d] = self._dense(suit, changed)
+            for t in range(n):
+                if changed[t] < 4:
+                    changed[t] += 1
+                    swap[d, t] = base if t == d else self._dense(suit, changed)
+                    changed[t] -= 1
+            changed[d] += 1
+
+        bundle = (base, draw, cut, swap)
+        if len(self._bundles) >= self.max_bundles:
+            self._bundles.clear()
+            self._dense_cache.clear()
+        self._bundles[key] = bundle
+        return bundle
+
+    @staticmethod
+    def _combine(rows, other):
+        """rows 的每一行分别与 other 合并（两个花色的表合成一张）"""
+        sums = (rows[:, :, None] + other[None, None, :]).reshape(len(rows), -1)
+        # 不合法的组合排在最后（结果下标为 _WIDTH），不参与取最大值
+        sums = sums[:, _COMBINE_ORDER[:_COMBINE_STARTS[-1]]]
+        out = np.maximum.reduceat(sums, _COMBINE_STARTS[:-1], axis=1)
+        out[out < 0] = _NEG
+        return out
+
+    def _evaluate(self, left, right, melds):
+        """
+        left 的每一行与 right 的每一行合并后的普通形向听数，形状 (len(left), len(right))；
+        只取两边实际出现过的下标参与运算
+        """
+        tables = self._eval_tables.get(melds)
+        if tables is None:
+            tables = self._eval_tables[melds] = _build_eval_tables(melds)
+        base, cap = tables
+        cols_l = np.flatnonzero((left >= 0).any(axis=0))
+        cols_r = np.flatnonzero((right >= 0).any(axis=0))
+        if not len(cols_l) or not len(cols_r):
+            return np.full((len(left), len(right)), 99, dtype=np.int16)
+        sums = left[:, None, cols_l, None] + right[None, :, None, cols_r]
+        grid = np.ix_(cols_l, cols_r)
+        shanten = base[grid] - np.minimum(sums, cap[grid])
+        return shanten.reshape(len(left), len(right), -1).min(axis=2)
+
+    # ---------- 七对子 / 国士无双 ----------
+
+    @staticmethod
+    def _special(rows):
+        """张数数组（最后一维为 34）的七对子、国士无双向听中较小的一个"""
+        pairs = (rows >= 2).sum(axis=-1)
+        kinds = (rows > 0).sum(axis=-1)
+        chiitoitsu = np.where(pairs == 7, AGARI_STATE, 6 - pairs + np.maximum(7 - kinds, 0))
+        yaochu = rows[..., _YAOCHU]
+        kokushi = 13 - (yaochu > 0).sum(axis=-1) - (yaochu >= 2).any(axis=-1)
+        return np.minimum(chiitoitsu, kokushi)
+
+    # ---------- 打牌推荐 ----------
+
+    def analyze(self, tiles_34, remaining=None):
+        """
+        逐一试打每种牌
+
+        Args:
+            tiles_34: 14 张（副露后 11 / 8 / 5 / 2 张）手牌的张数数组
+            remaining: 每种牌剩余可摸到的张数（长度 34），为 None 时按 4 - 手中张数计
+
+        Returns:
+            list[dict]: {"discard", "shanten", "effective": [(牌, 剩余张数), ...], "ukeire"}，
+            按 打后向听数从小到大、进张数从多到少 排序；effective 只列剩余张数大于 0 的牌（已经摸不到的不算进张）
+        """
+        self.queries += 1
+        hand = np.asarray(tiles_34, dtype=np.int16)
+        total = int(hand.sum())
+        if total % 3 != 2:
+            raise ValueError(f"打牌推荐需要 3n+2 张手牌，当前 {total} 张")
+        if remaining is None:
+            remaining = 4 - hand
+        remaining = np.maximum(np.asarray(remaining, dtype=np.int16), 0)
+        melds = (14 - total) // 3
+
+        bundles = [self._bundle(s, hand[lo:hi].tolist()) for s, (lo, hi) in enumerate(_SUITS)]
+        bases = [b[0] for b in bundles]
+
+        # 打后 13 张的向听 shanten_13[d]，打 d 摸 t 后的向听 shanten_14[d, t]
+        shanten_13 = np.full(34, 99, dtype=np.int16)
+        shanten_14 = np.full((34, 34), 99, dtype=np.int16)
+        for a, (lo, hi) in enumerate(_SUITS):
+            cuts = np.flatnonzero(hand[lo:hi])
+            if not len(cuts):
+                continue
+            _, _, cut, swap = bundles[a]
+            others = [s for s in range(4) if s != a]
+            rest = bases[others[0]]
+            for s in others[1:]:
+                rest = self._combine(rest[None, :], bases[s])[0]
+
+            shanten_13[lo + cuts] = self._evaluate(cut[cuts], rest[None, :], melds)[:, 0]
+            same = self._evaluate(swap[cuts].reshape(-1, _WIDTH), rest[None, :], melds)
+            shanten_14[lo + cuts, lo:hi] = same.reshape(len(cuts), hi - lo)
+
+            for b in others:
+                pair = [s for s in others if s != b]
+                pair_rest = self._combine(bases[pair[0]][None, :], bases[pair[1]])[0]
+                left = self._combine(cut[cuts], pair_rest)
+                b_lo, b_hi = _SUITS[b]
+                shanten_14[lo + cuts, b_lo:b_hi] = self._evaluate(left, bundles[b][1], melds)
+
+        discards = np.flatnonzero(hand)
+        eye = np.eye(34, dtype=np.int16)
+        after_cut = hand[None, :] - eye[discards]                     # (nd, 34)
+        drawable = after_cut < 4                                      # 打后还能摸进的牌
+
+        # 与 ShantenEngine 一致：4 张的字牌要额外进张（14 张时减一）
+        quads_13 = (after_cut[:, 27:] == 4).sum(axis=1)
+        honor_quads_14 = quads_13[:, None] + np.pad(after_cut[:, 27:] == 3, ((0, 0), (27, 0)))
+        honor_quads_14 = np.maximum(honor_quads_14 - 1, 0)
+        s13 = shanten_13[discards]
+        s13 = np.where((s13 != AGARI_STATE) & (s13 < quads_13), quads_13, s13)
+        s14 = shanten_14[discards]
+        s14 = np.where((s14 != AGARI_STATE) & (s14 < honor_quads_14), honor_quads_14, s14)
+
+        if total == 14:
+            s13 = np.minimum(s13, self._special(after_cut))
+            s14 = np.minimum(s14, self._special(after_cut[:, None, :] + eye[None, :, :]))
+
+        improving = drawable & (s14 < s13[:, None]) & (remaining > 0)[None, :]
+        options = []
+        for n, discard in enumerate(discards.tolist()):
+            effective = [(t, int(remaining[t])) for t in np.flatnonzero(improving[n]).tolist()]
+            options.append({
+                "discard": discard,
+                "shanten": int(s13[n]),
+                "effective": effective,
+                "ukeire": sum(c for _, c in effective),
+            })
+
+        options.sort(key=lambda o: (o["shanten"], -o["ukeire"], o["discard"]))
+        return options
+
+    def stats(self):
+        return {
+            "queries": self.queries,
+            "bundles": len(self._bundles),
+        }
+
+
+# 进程内共享的打牌推荐
+discard_advisor = DiscardAdvisor()
+
+
+# ---------- 与 mahjong 库对拍 ----------
+
+def brute_force(tiles_34, remaining=None):
+    """对每种打法、每种摸牌逐一调用 mahjong.shanten 的参考实现"""
+    from mahjong.shanten import Shanten
+
+    reference = Shanten()
+    hand = list(tiles_34)
+    closed = sum(hand) == 14
+    if remaining is None:
+        remaining = [4 - c for c in hand]
+    options = []
+    for discard in range(34):
+        if not hand[discard]:
+            continue
+        hand[discard] -= 1
+        current = reference.calculate_shanten(hand, closed, closed)
+        effective = []
+        for t in range(34):
+            if hand[t] >= 4 or remaining[t] <= 0:
+                continue
+            hand[t] += 1
+            if reference.calculate_shanten(hand, closed, closed) < current:
+                effective.append((t, remaining[t]))
+            hand[t] -= 1
+        hand[discard] += 1
+        options.append({"discard": discard, "shanten": current, "effective": effective,
+                        "ukeire": sum(n for _, n in effective)})
+    options.sort(key=lambda o: (o["shanten"], -o["ukeire"], o["discard"]))
+    return options
+
+
+def differential_check(n=300, seed=0):
+    """
+    Returns:
+        (不一致的手牌列表, 本模块平均耗时毫秒, 逐手调用 mahjong 库平均耗时毫秒)
+    """
+    from shanten_table import random_hand
+
+    advisor = DiscardAdvisor()
+    rng = random.Random(seed)
+    mismatches = []
+    ours_s = theirs_s = 0.0
+    for _ in range(n):
+        tiles = random_hand(rng, rng.choice((14, 14, 14, 11, 8, 5, 2)))
+        # 一半的手牌带上随机的场上可见牌，覆盖剩余张数为 0 的牌不计入进张的情况
+        remaining = None
+        if rng.random() < 0.5:
+            remaining = [max(4 - c - rng.choice((0, 0, 1, 2, 4)), 0) for c in tiles]
+
+        t = time.perf_counter()
+        ours = advisor.analyze(tiles, remaining)
+        ours_s += time.perf_counter() - t
+
+        t = time.perf_counter()
+        theirs = brute_force(tiles, remaining)
+        theirs_s += time.perf_counter() - t
+
+        if ours != theirs:
+            mismatches.append((tiles, ours, theirs))
+    return mismatches, ours_s / n * 1000, theirs_s / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="打牌推荐：与逐手调用 mahjong 库对拍")
+    parser.add_argument("--check", type=int, default=300, help="随机对拍的手牌数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mismatches, ours_ms, theirs_ms = differential_check(args.check, args.seed)
+    print(f"对拍 {args.check} 手：不一致 {len(mismatches)} 手；"
+          f"本模块 {ours_ms:.2f}ms/手，逐手调用 mahjong 库 {theirs_ms:.2f}ms/手")
+    for tiles, ours, theirs in mismatches[:3]:
+        print(f"    {tiles}\n      本模块={ours[:3]}\n      mahjong={theirs[:3]}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,31 @@
 import keyboard
 import os
 import datetime
+import cv2
 from PIL import ImageGrab
 from pathlib import Path
+import threading
 import time
 
+from screen_capture import open_capture, open_game_capture
+
 
 class ScreenshotService:
-    def __init__(self, save_dir='./Mahjong_YOLO', filename="test.png"):
+    def __init__(self, save_dir='./Mahjong_YOLO', filename="test.png", persist=False):
         """
         后台截图服务
-        默认热键：Ctrl+Alt+S
+        默认热键：Ctrl+Alt+S，触发 capture_and_analyze（截图在内存中直接交给识别和分析，不落盘）
+        persist: capture_and_analyze 时是否额外把截图保存到磁盘（调试用）
+        capture_and_analyze 只截取布局标定过的游戏区域（见 screen_capture.open_game_capture），
+        capture_and_save 只用于调试时单独保存整屏截图
         """
         self.save_dir = Path(save_dir)
         self.filename = filename
         self.hotkey = "ctrl+alt+s"  # 修改为 Ctrl+Alt+S
+        self.persist = persist
         self.running = False
+        self._screen = None     # 整屏截图源
+        self._game = None       # 游戏区域截图源
 
     def setup_save_dir(self):
         """设置保存目录"""
@@ -24,7 +34,7 @@ class ScreenshotService:
         # print(f"📁 截图将保存到: {self.save_dir}")
 
     def capture_and_save(self):
-        """截图并保存，如果文件已存在则覆盖"""
+        """截图并保存，如果文件已存在则覆盖（调试用，热键不再走这条路径）"""
         try:
             # 构建完整文件路径
             filepath = self.save_dir / self.filename
@@ -34,8 +44,10 @@ class ScreenshotService:
             # 稍微延迟，确保热键释放
             time.sleep(0.1)
 
-            # 截图
-            screenshot = ImageGrab.grab()
+            # 截图（整屏，保存下来的文件由 perceive 按整屏布局读取）
+            if self._screen is None:
+                self._screen = open_capture()
+            screenshot = self._screen.grab()
 
             # 检查文件是否存在
             if filepath.exists():
@@ -58,7 +70,7 @@ class ScreenshotService:
                         return None
 
             # 保存新截图
-            screenshot.save(filepath, "PNG")
+            cv2.imwrite(str(filepath), screenshot)
 
             # 验证文件是否保存成功
             if filepath.exists():
@@ -76,6 +88,43 @@ class ScreenshotService:
             # print(f"❌ 截图失败: {e}")
             return None
 
+    def capture_frame(self):
+        """截取游戏区域并直接返回内存中的 BGR 数组，不落盘"""
+        try:
+            if self._game is None:
+                self._game = open_game_capture()
+            # 稍微延迟，确保热键释放
+            time.sleep(0.1)
+            return self._game.grab()
+        except Exception as e:
+            # print(f"❌ 截图失败: {e}")
+            return None
+
+    def capture_and_analyze(self, output_path="output.txt"):
+        """
+        截图后直接把内存中的图片交给识别和分析流程，跳过 PNG 编码/解码和文件读写
+        persist 为 True 时才在后台把截图另存到 save_dir/filename
+        """
+        frame = self.capture_frame()
+        if frame is None:
+            return None
+
+        if self.persist:
+            self.setup_save_dir()
+            threading.Thread(
+                target=cv2.imwrite,
+                args=(str(self.save_dir / self.filename), frame),
+                daemon=True,
+            ).start()
+
+        # 热键回调中的异常不向 keyboard 的监听线程抛出
+        try:
+            from analyzer import run_analysis_to_file
+            return run_analysis_to_file(output_path, image=frame, layout=self._game.layout)
+        except Exception as e:
+            # print(f"❌ 分析失败: {e}")
+            return None
+
     def capture_and_save_robust(self):
         """
         更健壮的截图保存，支持多种重试策略
@@ -113,7 +162,7 @@ class ScreenshotService:
         # 注册热键 Ctrl+Alt+S
         # keyboard.add_hotkey(self.hotkey, self.capture_and_save_robust)
 
-        keyboard.add_hotkey(self.hotkey, self.capture_and_save)
+        keyboard.add_hotkey(self.hotkey, self.capture_and_analyze)
 
         # 可选：注册其他备用热键
         # keyboard.add_hotkey("ctrl+shift+s", self.capture_and_save_robust)
@@ -135,6 +184,8 @@ class ScreenshotService:
     def stop(self):
         """停止服务"""
         self.running = False
+        self._screen = None     # 整屏截图源
+        self._game = None       # 游戏区域截图源
         keyboard.unhook_all_hotkeys()
         # print("\n🛑 截图服务已停止")
 
@@ -142,7 +193,7 @@ class ScreenshotService:
         """更改热键"""
         keyboard.unhook_all_hotkeys()
         self.hotkey = new_hotkey
-        keyboard.add_hotkey(self.hotkey, self.capture_and_save)
+        keyboard.add_hotkey(self.hotkey, self.capture_and_analyze)
         # print(f"🔄 热键已更改为: {new_hotkey}")
 
 
@@ -0,0 +1,252 @@
+import glob
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from PIL import ImageGrab
+
+try:
+    import mss
+except ImportError:  # 可选依赖：pip install mss
+    mss = None
+
+# 截图后端：auto / mss / pil
+DEFAULT_CAPTURE_BACKEND = os.environ.get("MAHJONG_CAPTURE_BACKEND", "auto")
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class CaptureSource:
+    """
+    截图源基类：grab() 返回 BGR uint8 数组，并记录每次截图耗时
+
+    bbox: 只截取的像素范围 (left, top, right, bottom)，相对主屏幕左上角；None 表示整个主屏幕
+    layout: 与截图对应的牌桌布局（已按 bbox 换算），可直接传给 perceive(layout=...)
+    """
+
+    name = "base"
+
+    def __init__(self, bbox=None, history=100):
+        self.bbox = tuple(int(v) for v in bbox) if bbox is not None else None
+        self.layout = None
+        self.captures = 0
+        self.last_ms = None
+        self._times = deque(maxlen=history)
+
+    def _grab(self):
+        raise NotImplementedError
+
+    def grab(self):
+        start = time.perf_counter()
+        frame = self._grab()
+        elapsed = (time.perf_counter() - start) * 1000
+        self.captures += 1
+        self.last_ms = elapsed
+        self._times.append(elapsed)
+        return frame
+
+    __call__ = grab
+
+    def screen_size(self):
+        """完整截图（不限制 bbox 时）的尺寸 (宽, 高)"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def stats(self):
+        times = list(self._times)
+        return {
+            "backend": self.name,
+            "bbox": self.bbox,
+            "captures": self.captures,
+            "last_ms": self.last_ms,
+            "avg_ms": sum(times) / len(times) if times else None,
+            "max_ms": max(times) if times else None,
+        }
+
+
+class MssSource(CaptureSource):
+    """
+    mss 截图：Linux 下使用 X11 共享内存（XShm）/ XGetImage，Windows 下为 GDI BitBlt，
+    只拷贝 bbox 范围内的像素，比 PIL 截全屏快得多
+
+    mss 实例不能跨线程使用，这里每个线程各建一个
+    """
+
+    name = "mss"
+
+    def __init__(self, bbox=None, monitor=1, history=100):
+        if mss is None:
+            raise RuntimeError("未安装 mss，请先 pip install mss")
+        super().__init__(bbox, history)
+        self.monitor = monitor
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = mss.mss()
+            self._local.sct = sct
+        return sct
+
+    def _region(self):
+        mon = self._sct().monitors[self.monitor]
+        if self.bbox is None:
+            return mon
+        left, top, right, bottom = self.bbox
+        return {"left": mon["left"] + left, "top": mon["top"] + top,
+                "width": right - left, "height": bottom - top}
+
+    def _grab(self):
+        shot = self._sct().grab(self._region())
+        # BGRA -> BGR，顺带拷贝出 mss 内部缓冲区
+        return cv2.cvtColor(np.asarray(shot), cv2.COLOR_BGRA2BGR)
+
+    def screen_size(self):
+        mon = self._sct().monitors[self.monitor]
+        return mon["width"], mon["height"]
+
+    def close(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class PilSource(CaptureSource):
+    """PIL.ImageGrab 截图（没有 mss 时的兜底）；给出 bbox 时只截取该范围"""
+
+    name = "pil"
+
+    def _grab(self):
+        img = ImageGrab.grab(bbox=self.bbox)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        arr = np.array(img)
+        cv2.cvtColor(arr, cv2.COLOR_RGB2BGR, dst=arr)
+        return arr
+
+    def screen_size(self):
+        return ImageGrab.grab().size
+
+
+class FileSequenceSource(CaptureSource):
+    """
+    测试用截图源：按顺序循环读取图片文件（目录、通配符或路径列表），给出 bbox 时同样裁剪，
+    可以在没有游戏画面的环境下复现截图流程
+    """
+
+    name = "file"
+
+    def __init__(self, paths, bbox=None, loop=True, preload=True, history=100):
+        """
+        :param paths: 目录 / 通配符 / 图片路径列表
+        :param loop: 读完后是否从头循环；为 False 时读完抛出 StopIteration
+        :param preload: 是否提前把所有图片解码到内存（排除磁盘读取耗时）
+        """
+        super().__init__(bbox, history)
+        if isinstance(paths, (str, os.PathLike)):
+            paths = str(paths)
+            if os.path.isdir(paths):
+                paths = [os.path.join(paths, n) for n in sorted(os.listdir(paths))
+                         if n.lower().endswith(IMAGE_EXTS)]
+            else:
+                paths = sorted(glob.glob(paths))
+        self.paths = list(paths)
+        if not self.paths:
+            raise ValueError("没有找到图片文件")
+        self.loop = loop
+        self._index = 0
+        self._lock = threading.Lock()
+        self._frames = [self._read(p) for p in self.paths] if preload else None
+
+    @staticmethod
+    def _read(path):
+        img = cv2.imread(str(path))
+        if img is None:
+            raise FileNotFoundError(f"无法读取图片: {path}")
+        return img
+
+    def _grab(self):
+        with self._lock:
+            if self._index >= len(self.paths):
+                if not self.loop:
+                    raise StopIteration("图片序列已读完")
+                self._index = 0
+            i = self._index
+            self._index += 1
+        img = self._frames[i] if self._frames is not None else self._read(self.paths[i])
+        if self.bbox is not None:
+            left, top, right, bottom = self.bbox
+            img = img[top:bottom, left:right].copy()
+        return img
+
+    def screen_size(self):
+        img = self._frames[0] if self._frames is not None else self._read(self.paths[0])
+        return img.shape[1], img.shape[0]
+
+
+def open_capture(bbox=None, backend=DEFAULT_CAPTURE_BACKEND):
+    """
+    打开截图源
+
+    Args:
+        bbox: 只截取的像素范围，None 表示整个主屏幕
+        backend: auto（有 mss 时用 mss，否则 PIL）/ mss / pil
+    """
+    if backend == "auto":
+        backend = "mss" if mss is not None else "pil"
+    if backend == "mss":
+        return MssSource(bbox)
+    if backend == "pil":
+        return PilSource(bbox)
+    raise ValueError(f"未知的截图后端: {backend}")
+
+
+def restrict_to_layout(source, layout, names=None, window=False):
+    """
+    把截图源限制到布局中的区域：names 中各区域的外接矩形（默认全部区域），
+    window=True 时截取整个游戏窗口；source.layout 同步换算为裁剪后的布局
+
+    Returns:
+        source（原地修改）
+    """
+    bbox = layout.window if window else layout.capture_bbox(names)
+    source.bbox = tuple(int(v) for v in bbox)
+    source.layout = layout.cropped(source.bbox)
+    return source
+
+
+def open_game_capture(client=None, names=None, window=False, backend=DEFAULT_CAPTURE_BACKEND):
+    """
+    打开只截取游戏画面的截图源：按屏幕分辨率读取布局标定结果，
+    有标定时只截取标定区域（或游戏窗口），没有标定时截取整个主屏幕
+
+    Returns:
+        CaptureSource；source.layout 为 None 表示未标定
+    """
+    from Mahjong_YOLO.layout_calibration import DEFAULT_CLIENT, get_layout
+
+    source = open_capture(None, backend)
+    width, height = source.screen_size()
+    layout = get_layout(width, height, client or DEFAULT_CLIENT)
+    if layout is not None:
+        restrict_to_layout(source, layout, names, window)
+    return source
+
+
+if __name__ == "__main__":
+    # 对比整屏截图和区域截图的耗时
+    full = open_capture()
+    for _ in range(20):
+        full.grab()
+    print("整屏:", full.stats())
+
+    game = open_game_capture()
+    for _ in range(20):
+        game.grab()
+    print("游戏区域:", game.stats())
@@ -0,0 +1,158 @@
+"""
+可见牌计数：原来的进张 / 听牌剩余张数按 4 - 手中张数计，忽略了牌河、副露和宝牌指示牌中已经看得到的牌。
+
+VisibleTiles 维护一个长度 34 的可见张数向量（不含本家手牌）：
+    - 打牌、副露、翻开宝牌指示牌时逐张累加（sync_game_table 只处理上次同步之后新增的牌）
+    - 每次查询剩余张数只做一次 O(34) 的减法
+
+    visible = VisibleTiles.from_game_table(table)       # 或 VisibleTiles.from_table_state(state)
+    visible.on_discard(5)                               # 之后逐张更新（34 编码；136 编码传 is_136=True）
+    remaining = visible.remaining(hand_34_array)        # 4 - 可见 - 手牌，不小于 0
+"""
+import numpy as np
+
+from Mahjong_YOLO.tile_lookup import tile_to_34
+
+
+class VisibleTiles:
+    """
+    场上可见牌的张数（不含本家手牌）
+
+    计数：
+        updates —— 累加 / 扣减可见牌的次数
+        queries —— remaining 的调用次数
+    """
+
+    def __init__(self, counts=None):
+        self.counts = np.zeros(34, dtype=np.int16)
+        if counts is not None:
+            self.counts += np.asarray(counts, dtype=np.int16)
+        # sync_game_table 已处理到的位置：各家牌河长度、各家副露组数、已翻开的宝牌指示牌数
+        self._synced = None
+        self.updates = 0
+        self.queries = 0
+
+    # ---------- 逐张更新 ----------
+
+    def add(self, tile_34, n=1):
+        self.counts[tile_34] += n
+        self.updates += 1
+
+    def remove(self, tile_34, n=1):
+        self.counts[tile_34] = max(int(self.counts[tile_34]) - n, 0)
+        self.updates += 1
+
+    # 以下 tile 可以是 MahjongTile 或整数；整数默认为 34 编码，is_136=True 时为 136 编码
+
+    def on_discard(self, tile, is_136=False):
+        """有人打出一张牌"""
+        self.add(tile_to_34(tile, is_136))
+
+    def on_meld(self, tiles, called=None, is_136=False):
+        """
+        有人副露：tiles 为副露的全部牌；called 为从牌河中叫来的那张，
+        它在打出时已经计入，这里不再重复计数
+        """
+        tiles = [tile_to_34(t, is_136) for t in tiles]
+        if called is not None:
+            called = tile_to_34(called, is_136)
+            if called in tiles:
+                tiles.remove(called)
+        for t in tiles:
+            self.add(t)
+
+    def on_dora_indicator(self, tile, is_136=False):
+        """翻开一张宝牌指示牌（开杠后新翻的指示牌）"""
+        self.add(tile_to_34(tile, is_136))
+
+    def reset(self):
+        """新的一局"""
+        self.counts[:] = 0
+        self._synced = None
+
+    # ---------- 从牌桌同步 ----------
+
+    @staticmethod
+    def _revealed_indicators(table):
+        indicators = list(getattr(table, "dora_indicators", None) or [])
+        pointer = getattr(table, "dora_indicators_pointer", 0)
+        # dora_indicators_pointer 指向最后一张已翻开的指示牌；开局时为 0，即翻开了第一张
+        return indicators[:min(pointer + 1, len(indicators))]
+
+    def sync_game_table(self, table):
+        """
+        与 GameTable 的 river / meld / dora_indicators 同步，只累加上次同步之后新增的牌；
+        列表变短（新的一局、整桌重新识别）时整体重算
+
+        Player.call_discard 打出的牌会一直留在 river 中，被别家叫走后也不移除，
+        所以副露里的被叫牌（meld.called_tile）按 on_meld 的规则不再计数
+        """
+        rivers = table.river
+        melds = table.meld
+        indicators = self._revealed_indicators(table)
+        if self._synced is not None:
+            river_seen, meld_seen, dora_seen = self._synced
+            shrunk = (any(len(r) < n for r, n in zip(rivers, river_seen))
+                      or any(len(m) < n for m, n in zip(melds, meld_seen))
+                      or len(indicators) < dora_seen)
+            if shrunk:
+                self.reset()
+        if self._synced is None:
+            self.counts[:] = 0
+            self._synced = ([0] * len(rivers), [0] * len(melds), 0)
+
+        # GameTable 中的牌为 MahjongTile 或 136 编码
+        river_seen, meld_seen, dora_seen = self._synced
+        for seat, river in enumerate(rivers):
+            for tile in river[river_seen[seat]:]:
+                self.on_discard(tile, is_136=True)
+        for seat, seat_melds in enumerate(melds):
+            for meld in seat_melds[meld_seen[seat]:]:
+                self.on_meld(meld.tiles or [], getattr(meld, "called_tile", None), is_136=True)
+        for tile in indicators[dora_seen:]:
+            self.on_dora_indicator(tile, is_136=True)
+        self._synced = ([len(r) for r in rivers], [len(m) for m in melds], len(indicators))
+        return self
+
+    @classmethod
+    def from_game_table(cls, table):
+        return cls().sync_game_table(table)
+
+    @classmethod
+    def from_table_state(cls, state):
+        """由整桌识别的 TableState 得到（不含本家手牌）"""
+        return cls(state.visible_counts(include_hand=False))
+
+    # ---------- 查询 ----------
+
+    def remaining(self, hand_34=None):
+        """
+        每种牌还可能摸到的张数：4 - 可见张数 - 手中张数
+
+        可见张数中每张牌只计一次（被叫的牌只算在牌河里），结果正常不会小于 0；
+        截断到 0 只防御识别错误（例如把同一张牌识别了两次）
+        """
+        self.queries += 1
+        remaining = 4 - self.counts
+        if hand_34 is not None:
+            remaining = remaining - np.asarray(hand_34, dtype=np.int16)
+        return np.maximum(remaining, 0)
+
+    def stats(self):
+        return {
+            "visible": int(self.counts.sum()),
+            "updates": self.updates,
+            "queries": self.queries,
+        }
+
+
+def remaining_counts(hand_34, visible=None):
+    """
+    剩余张数向量；visible 可以是 VisibleTiles、长度 34 的可见张数数组，或 None（只扣除手牌）
+    """
+    if visible is None:
+        visible = np.zeros(34, dtype=np.int16)
+    if isinstance(visible, VisibleTiles):
+        return visible.remaining(hand_34)
+    remaining = 4 - np.asarray(visible, dtype=np.int16) - np.asarray(hand_34, dtype=np.int16)
+    return np.maximum(remaining, 0)
@@ -0,0 +1,284 @@
+"""
+听牌（待牌）查找：原来对 34 种牌逐一“加一张再调用 Agari.is_agari”，每手牌 34 次完整的和牌判定。
+
+按花色拆开：每个花色的张数分布预先求出
+    - 自身能否完全拆成面子（不带雀头 / 带一个雀头）
+    - 加上本花色的哪张牌后能完全拆开，以及这张牌补上的是什么形状（两面、嵌张、边张、双碰、单骑）
+结果按分布缓存；一手牌只需查 4 次表，再看其余花色能否凑出恰好一个雀头。七对子、国士无双单独判断。
+
+    from wait_finder import wait_finder
+    wait_finder.find_waits(tiles_34_array)        # [3, 6]
+    wait_finder.classify_waits(tiles_34_array)    # {3: ("ryanmen",), 6: ("ryanmen",)}
+
+副露后的 10 / 7 / 4 张手牌同样适用（只看手里的牌）。
+与逐张 is_agari 对拍：python wait_finder.py --check 20000
+"""
+import argparse
+import random
+import time
+
+RYANMEN, KANCHAN, PENCHAN, SHANPON, TANKI = "ryanmen", "kanchan", "penchan", "shanpon", "tanki"
+WAIT_SHAPES = (RYANMEN, KANCHAN, PENCHAN, SHANPON, TANKI)
+WAIT_SHAPE_NAMES = {RYANMEN: "两面", KANCHAN: "嵌张", PENCHAN: "边张", SHANPON: "双碰", TANKI: "单骑"}
+_SHAPE_ORDER = {shape: n for n, shape in enumerate(WAIT_SHAPES)}
+_YAOCHU = (0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33)
+_SUIT_OFFSETS = (0, 9, 18, 27)
+# 拆解过程的中间缓存只在生成花色表时用到，超过该条目数时清空，避免长时间运行内存持续增长
+_DECOMPOSITION_CACHE_LIMIT = 200000
+
+
+def _sequence_shape(start, tile):
+    """顺子 (start, start+1, start+2) 由 tile 补齐时的听牌形状"""
+    if tile == start + 1:
+        return KANCHAN
+    if (tile == start and start == 6) or (tile == start + 2 and start == 0):
+        return PENCHAN
+    return RYANMEN
+
+
+class WaitFinder:
+    """
+    查表法待牌查找
+
+    计数：
+        suit_patterns —— 已缓存的花色分布数
+        queries       —— find_waits / classify_waits 的调用次数
+    """
+
+    def __init__(self):
+        # 花色分布 -> (能完全拆开的雀头数位掩码, ((牌, 雀头数, 形状), ...))
+        self._suit = {}
+        # (分布, 是否字牌, 标记牌) -> {雀头数: 标记牌所在块的形状集合}
+        self._decompositions = {}
+        self.queries = 0
+
+    # ---------- 单花色 ----------
+
+    def _decompose(self, counts, honors, tile):
+        """
+        枚举 counts 完全拆成面子（至多一个雀头）的所有方式
+
+        Returns:
+            dict: 雀头数(0/1) -> 含有 tile 的块对应的听牌形状集合（tile 为 -1 时集合为空）
+        """
+        key = (tuple(counts), honors, tile)
+        result = self._decompositions.get(key)
+        if result is not None:
+            return result
+
+        i = next((k for k, c in enumerate(counts) if c), -1)
+        if i < 0:
+            result = {0: frozenset()}
+            self._decompositions[key] = result
+            return result
+
+        merged = {}
+
+        def branch(removal, head, shape):
+            sub = list(counts)
+            for j in removal:
+                sub[j] -= 1
+            for state, shapes in self._decompose(sub, honors, tile).items():
+                state += head
+                if state > 1:
+                    continue
+                if shape is not None:
+                    shapes = shapes | {shape}
+                merged[state] = merged.get(state, frozenset()) | shapes
+
+        if counts[i] >= 3:
+            branch((i, i, i), 0, SHANPON if i == tile else None)
+        if counts[i] >= 2:
+            branch((i, i), 1, TANKI if i == tile else None)
+        if not honors and i < 7 and counts[i + 1] and counts[i + 2]:
+            shape = _sequence_shape(i, tile) if i <= tile <= i + 2 else None
+            branch((i, i + 1, i + 2), 0, shape)
+
+        result = {state: frozenset(shapes) for state, shapes in merged.items()}
+        self._decompositions[key] = result
+        return result
+
+    def _suit_entry(self, counts, honors):
+        key = (tuple(counts), honors)
+        entry = self._suit.get(key)
+        if entry is not None:
+            return entry
+
+        complete = 0
+        for state in self._decompose(counts, honors, -1):
+            complete |= 1 << state
+
+        waits = []
+        if sum(counts) % 3 != 0:
+            for t in range(len(counts)):
+                if counts[t] >= 4:
+                    continue
+                # 只有与已有牌相邻（或相同）的牌才可能补成完整的块
+                if honors and not counts[t]:
+                    continue
+                if not honors and not any(counts[j] for j in range(max(t - 2, 0), min(t + 3, 9))):
+                    continue
+                test = list(counts)
+                test[t] += 1
+                for state, shapes in self._decompose(test, honors, t).items():
+                    waits.append((t, state, shapes))
+
+        entry = (complete, tuple(waits))
+        self._suit[key] = entry
+        if len(self._decompositions) > _DECOMPOSITION_CACHE_LIMIT:
+            self._decompositions.clear()
+        return entry
+
+    # ---------- 整手牌 ----------
+
+    def classify_waits(self, tiles_34):
+        """
+        听牌张及形状（手里已有 4 张的牌不算）
+
+        Returns:
+            dict: 34 编码 -> 形状元组（按 两面、嵌张、边张、双碰、单骑 的顺序），按牌排序；未听牌时为空
+        """
+        self.queries += 1
+        tiles = [int(c) for c in tiles_34]
+        total = sum(tiles)
+        if total % 3 != 1:
+            return {}
+
+        entries = [self._suit_entry(tiles[o:o + 9] if o < 27 else tiles[27:34], o == 27) for o in _SUIT_OFFSETS]
+        found = {}
+        for x, offset in enumerate(_SUIT_OFFSETS):
+            # 其余花色都能完全拆开时，可能的雀头总数
+            heads = {0}
+            for y, (complete, _) in enumerate(entries):
+                if y == x:
+                    continue
+                heads = {h + s for h in heads for s in (0, 1) if complete >> s & 1 and h + s <= 1}
+                if not heads:
+                    break
+            if not heads:
+                continue
+            for t, state, shapes in entries[x][1]:
+                if 1 - state in heads:
+                    found.setdefault(offset + t, set()).update(shapes)
+
+        if total == 13:
+            self._special_waits(tiles, found)
+        return {t: tuple(sorted(found[t], key=_SHAPE_ORDER.get)) for t in sorted(found)}
+
+    @staticmethod
+    def _special_waits(tiles, found):
+        """七对子（单骑）和国士无双"""
+        singles = [t for t, c in enumerate(tiles) if c == 1]
+        if len(singles) == 1 and tiles.count(2) == 6:
+            found.setdefault(singles[0], set()).add(TANKI)
+
+        if sum(tiles[t] for t in _YAOCHU) == 13:
+            missing = [t for t in _YAOCHU if not tiles[t]]
+            if not missing:
+                for t in _YAOCHU:
+                    found.setdefault(t, set()).add(TANKI)
+            elif len(missing) == 1:
+                found.setdefault(missing[0], set()).add(TANKI)
+
+    def find_waits(self, tiles_34):
+        """听牌张的 34 编码列表（从小到大）"""
+        return list(self.classify_waits(tiles_34))
+
+    def stats(self):
+        return {
+            "suit_patterns": len(self._suit),
+            "decompositions": len(self._decompositions),
+            "queries": self.queries,
+        }
+
+
+# 进程内共享的待牌查找器
+wait_finder = WaitFinder()
+
+
+# ---------- 与逐张 is_agari 对拍 ----------
+
+def random_tenpai_biased_hand(rng):
+    """随机手牌：一半为“和牌形去掉一张”（多为听牌），一半为随机牌（多为未听牌），张数为 13 / 10 / 7 / 4"""
+    size = rng.choice((13, 13, 10, 7, 4))
+    tiles = [0] * 34
+    if rng.random() < 0.5:
+        suits = rng.sample(range(4), rng.choice((1, 2, 4)))
+        pool = [t for s in suits for t in range(s * 9, min(s * 9 + 9, 34))]
+        for t in rng.sample([t for t in pool for _ in range(4)], size):
+            tiles[t] += 1
+        return tiles
+
+    # 凑出 (size + 1) 张的和牌形，再随机拿掉一张
+    def add(block):
+        if all(tiles[t] + block.count(t) <= 4 for t in block):
+            for t in block:
+                tiles[t] += 1
+            return True
+        return False
+
+    while not add([rng.randrange(34)] * 2):
+        pass
+    while sum(tiles) < size + 1:
+        t = rng.randrange(34)
+        if t < 27 and t % 9 < 7 and rng.random() < 0.6:
+            add([t, t + 1, t + 2])
+        else:
+            add([t] * 3)
+    tiles[rng.choice([t for t in range(34) if tiles[t]])] -= 1
+    return tiles
+
+
+def differential_check(n=20000, seed=0):
+    """
+    与原来的做法（对 34 种牌逐一加一张调用 Agari.is_agari）逐手比较待牌
+
+    Returns:
+        (不一致的手牌列表, 本模块总耗时秒, 逐张 is_agari 总耗时秒)
+    """
+    from mahjong.agari import Agari
+
+    agari = Agari()
+    finder = WaitFinder()
+    rng = random.Random(seed)
+    mismatches = []
+    ours_s = theirs_s = 0.0
+    for _ in range(n):
+        tiles = random_tenpai_biased_hand(rng)
+
+        t = time.perf_counter()
+        ours = finder.find_waits(tiles)
+        ours_s += time.perf_counter() - t
+
+        t = time.perf_counter()
+        theirs = []
+        for tile in range(34):
+            if tiles[tile] < 4:
+                test = list(tiles)
+                test[tile] += 1
+                if agari.is_agari(test):
+                    theirs.append(tile)
+        theirs_s += time.perf_counter() - t
+
+        if ours != theirs:
+            mismatches.append((tiles, ours, theirs))
+    return mismatches, ours_s, theirs_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查表法待牌查找：与逐张 is_agari 对拍")
+    parser.add_argument("--check", type=int, default=20000, help="随机对拍的手牌数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mismatches, ours_s, theirs_s = differential_check(args.check, args.seed)
+    print(f"对拍 {args.check} 手：不一致 {len(mismatches)} 手；"
+          f"查表 {ours_s / args.check * 1e6:.1f}us/手，逐张 is_agari {theirs_s / args.check * 1e6:.1f}us/手")
+    for tiles, ours, theirs in mismatches[:10]:
+        print(f"    {tiles} 查表={ours} is_agari={theirs}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+和牌率 / 期望打点模拟：对每种候选打法，从未见牌（牌山 + 他家手牌）中随机抽出之后若干巡的摸牌和他家打牌，
+模拟本家按简单策略打到和牌或流局，统计和牌率、期望打点以及最可能和出的牌型（设计文档中的“概率树 + 期望”、
+“top10 可能荣和的牌型以及其概率”）。
+
+模拟策略：
+    - 摸牌后向听数不变则摸切；向听数前进时在向听最小的打法中打出与其余手牌关联最少的牌
+    - 门前清的手牌一听牌就立直（declare_riichi=False 时默听），之后手牌不再变化，不和的牌一律摸切；
+      is_riichi=True 表示模拟开始时已经立直
+    - 和牌时用 cal_scores.calc_hand_score 计算点数（自摸 / 荣和分别计，立直后按立直计），无役的和牌不算和牌；
+      不计一发、里宝牌，也不扣立直棒
+    - 听牌时他家打出的待牌可以荣和（振听时不能）
+点数按 (手牌, 和牌张, 自摸, 立直) 在各进程内缓存。
+
+计算分批在进程池中进行；每批的随机种子由 (seed, 打法, 批次序号) 决定，与进程数和调度顺序无关，
+跑满相同批数时结果完全一致。每轮为尚未收敛的打法各加一批，全部收敛（和牌率、期望打点的标准误
+都低于阈值）、达到 max_trials 或超出 time_budget 时停止。
+
+    from win_simulator import simulate_discards
+    for r in simulate_discards(tiles_34_array, remaining=visible.remaining(tiles_34_array)):
+        print(r["discard"], r["win_rate"], r["expected_points"])
+
+命令行：python win_simulator.py 123456m4567p1289s --turns 12 --time-budget 5
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 默认时间预算（秒）、每批模拟局数、进程数（0 表示 CPU 核数）
+SIM_TIME_BUDGET_S = float(os.environ.get("MAHJONG_SIM_TIME_BUDGET", "5"))
+SIM_BATCH = int(os.environ.get("MAHJONG_SIM_BATCH", "200"))
+SIM_WORKERS = int(os.environ.get("MAHJONG_SIM_WORKERS", "0"))
+# 每种打法保留的最可能和牌牌型数
+TOP_HANDS = 10
+
+# 工作进程内的点数缓存：(手牌, 和牌张, 是否自摸, 是否立直) -> 点数，无役时为 0
+_worker = {"scores": {}}
+
+
+def _suit_links(hand, tile):
+    """tile 与其余手牌的关联数：同一花色内距离 2 以内的张数（字牌只看同种牌）"""
+    if tile >= 27:
+        return hand[tile] - 1
+    lo, hi = tile // 9 * 9, tile // 9 * 9 + 9
+    return sum(hand[t] for t in range(max(tile - 2, lo), min(tile + 3, hi))) - 1
+
+
+def _score(hand, win_tile, is_tsumo, is_riichi, context):
+    """和牌点数（cost["total"]），无役或无法和牌时为 0"""
+    key = (tuple(hand), win_tile, is_tsumo, is_riichi)
+    cache = _worker["scores"]
+    if key in cache:
+        return cache[key]
+
+    from cal_scores import calc_hand_score
+
+    melds = context.get("melds") or []
+    used = {t for meld in melds for t in meld.tiles}
+    tiles_136 = [t for meld in melds for t in meld.tiles]
+    win_136 = None
+    for tile, count in enumerate(hand):
+        codes = [c for c in range(tile * 4, tile * 4 + 4) if c not in used][:count]
+        tiles_136.extend(codes)
+        if tile == win_tile and codes:
+            win_136 = codes[-1]
+    try:
+        result = calc_hand_score(tiles_136, win_136, melds=melds, dora_indicators=context.get("dora_indicators"),
+                                 player_wind=context.get("player_wind", 0), round_wind=context.get("round_wind", 0),
+                                 is_riichi=is_riichi, is_tsumo=is_tsumo)
+        points = int(result["cost"]["total"])
+    except Exception:
+        points = 0
+    cache[key] = points
+    return points
+
+
+def _best_discard(hand, target, calculate):
+    """向听数为 target 的打法中，与其余手牌关联最少的一张（同分时打编号大的）"""
+    best, best_key = None, None
+    for tile in range(34):
+        if not hand[tile]:
+            continue
+        hand[tile] -= 1
+        shanten = calculate(hand)
+        hand[tile] += 1
+        if shanten != target:
+            continue
+        key = (_suit_links(hand, tile), -tile)
+        if best_key is None or key < best_key:
+            best, best_key = tile, key
+    return best
+
+
+def _simulate_batch(hand, remaining, discard, turns, trials, seed_key, ron, context):
+    """
+    在工作进程中模拟一批：打出 discard 后的 trials 局
+
+    Returns:
+        dict: trials / wins / tsumo / points / points_sq / hands（(牌型, 和牌张, 是否自摸) -> [次数, 点数]）
+    """
+    from mahjong.tile import TilesConverter
+    from shanten_table import shanten_engine
+    from wait_finder import wait_finder
+
+    rng = np.random.default_rng(seed_key)
+    pool = np.repeat(np.arange(34), remaining)
+    start = [int(c) for c in hand]
+    start[discard] -= 1
+    closed = not context.get("melds") and sum(start) == 13
+    declare = closed and context.get("declare_riichi", True)
+    turns = min(turns, len(pool) // 4)
+
+    def calculate(h):
+        return shanten_engine.calculate_shanten(h, closed, closed)
+
+    wins = tsumo = 0
+    points_sum = points_sq = 0.0
+    hands = {}
+    for _ in range(trials):
+        wall = rng.permutation(pool)[:turns * 4].tolist()
+        current = list(start)
+        river = {discard}
+        shanten = calculate(current)
+        waits = wait_finder.find_waits(current) if shanten == 0 else []
+        # 打出 discard 即听牌时就在这一巡立直
+        riichi = context.get("is_riichi", False) or (declare and shanten == 0)
+        win = None
+        for turn in range(turns):
+            draw = wall[turn * 4]
+            current[draw] += 1
+            after = calculate(current)
+            if after < 0:
+                points = _score(current, draw, True, riichi, context)
+                if points:
+                    win = (draw, points, True)
+                    break
+            # 和牌形但无役（副露后）时按听牌继续
+            target = max(after, 0)
+            # 立直后 shanten 为 0，target 不会更小，总是摸切
+            if target < shanten:
+                out = _best_discard(current, target, calculate)
+                shanten = target
+                riichi = riichi or (declare and shanten == 0)
+            else:
+                out = draw
+            current[out] -= 1
+            river.add(out)
+            if out != draw:
+                waits = wait_finder.find_waits(current) if shanten == 0 else []
+
+            # 他家三人各打出一张
+            if ron and waits and not river.intersection(waits):
+                for tile in wall[turn * 4 + 1:turn * 4 + 4]:
+                    if tile in waits:
+                        current[tile] += 1
+                        points = _score(current, tile, False, riichi, context)
+                        current[tile] -= 1
+                        if points:
+                            win = (tile, points, False)
+                            break
+                if win:
+                    current[win[0]] += 1
+                    break
+
+        if win is None:
+            continue
+        tile, points, is_tsumo = win
+        wins += 1
+        tsumo += is_tsumo
+        points_sum += points
+        points_sq += points * points
+        key = (TilesConverter.to_one_line_string([t * 4 for t, c in enumerate(current) for _ in range(c)]), tile,
+               is_tsumo)
+        entry = hands.setdefault(key, [0, points])
+        entry[0] += 1
+
+    return {"trials": trials, "wins": wins, "tsumo": tsumo, "points": points_sum,
+            "points_sq": points_sq, "hands": hands}
+
+
+class _Tally:
+    """一种打法的累计结果"""
+
+    def __init__(self, discard):
+        self.discard = discard
+        self.batches = 0
+        self.trials = self.wins = self.tsumo = 0
+        self.points = self.points_sq = 0.0
+        self.hands = Counter()
+        self.hand_points = {}
+
+    def add(self, batch):
+        self.batches += 1
+        self.trials += batch["trials"]
+        self.wins += batch["wins"]
+        self.tsumo += batch["tsumo"]
+        self.points += batch["points"]
+        self.points_sq += batch["points_sq"]
+        for key, (count, points) in batch["hands"].items():
+            self.hands[key] += count
+            self.hand_points[key] = points
+
+    def win_rate_se(self):
+        p = self.wins / self.trials
+        return math.sqrt(p * (1 - p) / self.trials)
+
+    def expected_points_se(self):
+        mean = self.points / self.trials
+        var = max(self.points_sq / self.trials - mean * mean, 0.0)
+        return math.sqrt(var / self.trials)
+
+    def result(self):
+        n = self.trials
+        return {
+            "discard": self.discard,
+            "trials": n,
+            "win_rate": self.wins / n,
+            "win_rate_se": self.win_rate_se(),
+            "tsumo_rate": self.tsumo / n,
+            "expected_points": self.points / n,
+            "expected_points_se": self.expected_points_se(),
+            "average_win_points": self.points / self.wins if self.wins else 0.0,
+            "top_hands": [{"hand": hand, "win_tile": tile, "tsumo": is_tsumo, "prob": count / n,
+                           "points": self.hand_points[(hand, tile, is_tsumo)]}
+                          for (hand, tile, is_tsumo), count in self.hands.most_common(TOP_HANDS)],
+        }
+
+
+def candidate_discards(tiles_34, remaining=None, max_candidates=6):
+    """默认的候选打法：打牌推荐中向听数不超过最小值 + 1 的前 max_candidates 种"""
+    from discard_advisor import discard_advisor
+
+    options = discard_advisor.analyze(tiles_34, remaining)
+    best = options[0]["shanten"]
+    return [o["discard"] for o in options if o["shanten"] <= best + 1][:max_candidates]
+
+
+def simulate_discards(tiles_34, remaining=None, discards=None, turns=12, melds=None, dora_indicators=None,
+                      player_wind=0, round_wind=0, is_riichi=False, declare_riichi=True, ron=True,
+                      time_budget=SIM_TIME_BUDGET_S,
+                      tolerance=0.01, ev_tolerance=100.0, max_trials=20000, batch=SIM_BATCH, workers=None,
+                      seed=0):
+    """
+    模拟每种候选打法之后 turns 巡的和牌率和期望打点
+
+    Args:
+        tiles_34: 3n+2 张手牌的张数数组（不含副露）
+        remaining: 每种牌未见的张数（长度 34，如 VisibleTiles.remaining(手牌)），为 None 时按 4 - 手中张数计
+        discards: 要比较的打法（34 编码），为 None 时取 candidate_discards
+        turns: 剩余巡数（本家摸牌次数）
+        melds, dora_indicators, player_wind, round_wind: 点数计算参数，同 calc_hand_score
+        is_riichi: 模拟开始时是否已经立直
+        declare_riichi: 门前清听牌时是否立直（False 为默听，无役时只能自摸）
+        ron: 是否计入他家打出待牌时的荣和
+        time_budget: 时间预算（秒），每轮结束时检查；至少跑完一轮
+        tolerance, ev_tolerance: 和牌率、期望打点标准误的收敛阈值
+        max_trials: 每种打法最多模拟的局数
+        batch: 每批局数
+        workers: 进程数，默认 SIM_WORKERS（0 为 CPU 核数）；为 1 时在当前进程内计算
+        seed: 随机种子
+
+    Returns:
+        list[dict]: 每种打法的 discard / trials / win_rate / win_rate_se / tsumo_rate / expected_points /
+        expected_points_se / average_win_points / top_hands，按期望打点从高到低排序
+    """
+    hand = [int(c) for c in tiles_34]
+    if sum(hand) % 3 != 2:
+        raise ValueError(f"模拟需要 3n+2 张手牌，当前 {sum(hand)} 张")
+    if remaining is None:
+        remaining = [4 - c for c in hand]
+    remaining = [max(int(c), 0) for c in remaining]
+    if discards is None:
+        discards = candidate_discards(hand, remaining)
+    context = {"melds": melds, "dora_indicators": dora_indicators, "player_wind": player_wind,
+               "round_wind": round_wind, "is_riichi": is_riichi, "declare_riichi": declare_riichi}
+
+    tallies = {d: _Tally(d) for d in discards if hand[d]}
+    workers = workers or SIM_WORKERS or os.cpu_count() or 1
+    pool = None
+    if workers > 1:
+        # spawn 与 Windows 行为一致，也避免 fork 时复制主进程中的线程状态
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def converged(tally):
+        if tally.trials >= max_trials:
+            return True
+        return (tally.batches >= 2 and tally.win_rate_se() <= tolerance
+                and tally.expected_points_se() <= ev_tolerance)
+
+    start = time.perf_counter()
+    try:
+        while True:
+            active = [t for t in tallies.values() if not converged(t)]
+            if not active:
+                break
+            # 每轮为每种未收敛的打法各加 workers 批（不少于一批），让进程池保持满载
+            per_discard = max(1, workers // len(active))
+            jobs = [(t, (hand, remaining, t.discard, turns, batch, (seed, t.discard, t.batches + k), ron, context))
+                    for t in active for k in range(per_discard)]
+            if pool is None:
+                results = [_simulate_batch(*args) for _, args in jobs]
+            else:
+                results = [f.result() for f in [pool.submit(_simulate_batch, *args) for _, args in jobs]]
+            for (tally, _), result in zip(jobs, results):
+                tally.add(result)
+            if time.perf_counter() - start >= time_budget:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    results = [t.result() for t in tallies.values()]
+    results.sort(key=lambda r: (-r["expected_points"], -r["win_rate"], r["discard"]))
+    return results
+
+
+def _tile_name(tile_34):
+    from mahjong.tile import TilesConverter
+
+    return TilesConverter.to_one_line_string([tile_34 * 4])
+
+
+def main():
+    from mahjong.tile import TilesConverter
+
+    parser = argparse.ArgumentParser(description="每种打法的和牌率 / 期望打点蒙特卡洛模拟")
+    parser.add_argument("hand", help="3n+2 张手牌，如 123456m4567p1289s")
+    parser.add_argument("--turns", type=int, default=12, help="剩余巡数")
+    parser.add_argument("--time-budget", type=float, default=SIM_TIME_BUDGET_S, help="时间预算（秒）")
+    parser.add_argument("--max-trials", type=int, default=20000, help="每种打法最多模拟的局数")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--riichi", action="store_true", help="已经立直")
+    parser.add_argument("--dama", action="store_true", help="听牌后不立直（默听）")
+    args = parser.parse_args()
+
+    tiles_34 = TilesConverter.one_line_string_to_34_array(args.hand)
+    start = time.perf_counter()
+    results = simulate_discards(tiles_34, turns=args.turns, is_riichi=args.riichi, declare_riichi=not args.dama,
+                                time_budget=args.time_budget, max_trials=args.max_trials, workers=args.workers,
+                                seed=args.seed)
+    print(f"用时 {time.perf_counter() - start:.1f}s")
+    for r in results:
+        print(f"打{_tile_name(r['discard'])}: 和牌率 {r['win_rate']:.1%}±{r['win_rate_se']:.1%}  "
+              f"期望 {r['expected_points']:.0f}±{r['expected_points_se']:.0f}点  "
+              f"（自摸 {r['tsumo_rate']:.1%}，和牌平均 {r['average_win_points']:.0f}点，{r['trials']}局）")
+        for h in r["top_hands"][:3]:
+            how = "自摸" if h["tsumo"] else "荣和"
+            print(f"        {h['hand']} {how}{_tile_name(h['win_tile'])}  {h['prob']:.1%}  {h['points']}点")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from world_model.entities.mahjong_tile import Tile
+from world_model.mahjong_tile import Tile
 
 class Meld:
     """
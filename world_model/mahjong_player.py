@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 from copy import deepcopy
 
-from world_model.entities.mahjong_meld import Meld
-from world_model.entities.mahjong_tile import MahjongTile
-from world_model.entities.mahjong_tile import MahjongTileSet
-from world_model.entities.mahjong_table import GameTable
+from world_model.mahjong_meld import Meld
+from world_model.mahjong_tile import MahjongTile
+from world_model.mahjong_tile import MahjongTileSet
+from world_model.mahjong_table import GameTable
 
 
 class Player:
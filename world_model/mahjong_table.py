@@ -1,8 +1,7 @@
 # -*- coding: utf-8 -*-
-from mitmproxy.addons import default_addons
 
-from world_model.entities.mahjong_meld import Meld
-from world_model.entities.mahjong_tile import MahjongTile, MahjongTileSet
+from world_model.mahjong_meld import Meld
+from world_model.mahjong_tile import MahjongTile, MahjongTileSet
 
 
 class GameTable: